@@ -0,0 +1,78 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse
+from pydantic import ValidationError
+
+from app.core.worker_pool import PoolSaturated
+from app.models.job_models import JobRequest, JobStatus
+from app.services.job_service import PAYLOAD_MODELS, job_progress, job_service
+
+router = APIRouter()
+
+
+def _status(job: dict) -> JobStatus:
+    return JobStatus(**{k: v for k, v in job.items() if k in JobStatus.model_fields}, progress=job_progress(job))
+
+
+async def submit_job(kind: str, payload: dict) -> JobStatus:
+    # SQLite (compartilhado com as threads que relatam etapas): fora do event loop
+    try:
+        job = await run_in_threadpool(job_service.submit, kind, payload)
+    except PoolSaturated as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    return _status(job)
+
+
+@router.post("/api/jobs", status_code=202, response_model=JobStatus)
+async def create_job(request: JobRequest):
+    """
+    Queues a scenario generation (simple, advanced or expert) and returns its job ID.
+    """
+    try:
+        payload = PAYLOAD_MODELS[request.kind](**request.payload)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False))
+
+    return await submit_job(request.kind, payload.model_dump())
+
+
+@router.get("/api/jobs/{job_id}", response_model=JobStatus)
+async def get_job(job_id: str):
+    """
+    Returns the state and per-stage progress of a generation job.
+    """
+    job = await run_in_threadpool(job_service.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return _status(job)
+
+
+@router.post("/api/jobs/{job_id}/cancel", status_code=202, response_model=JobStatus)
+async def cancel_job(job_id: str):
+    """
+    Cancels a queued or running job (a running netconvert is killed).
+    """
+    job = await run_in_threadpool(job_service.cancel, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    if job["status"] in ("succeeded", "failed"):
+        raise HTTPException(status_code=409, detail=f"Job already {job['status']}")
+    return _status(job)
+
+
+@router.get("/api/jobs/{job_id}/artifact")
+async def get_job_artifact(job_id: str):
+    """
+    Downloads the ZIP produced by a finished job.
+    """
+    job = await run_in_threadpool(job_service.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    if job["status"] in ("failed", "cancelled"):
+        raise HTTPException(status_code=409, detail=f"Job {job['status']}: {job['error']}")
+
+    path = job_service.artifact_path(job)
+    if path is None:
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}, artifact not ready")
+    media_type = "application/xml" if job["kind"] == "map" else "application/x-zip-compressed"
+    return FileResponse(path, media_type=media_type, filename=job["filename"])
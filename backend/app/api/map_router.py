@@ -1,6 +1,17 @@
-from fastapi import APIRouter, HTTPException
-from typing import List
+import gzip
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse
+from pathlib import Path
+from typing import List, Optional
 from app.core.config import settings
+from app.core.deflate_cache import deflate_cache
+from app.core.disk_cache import content_hash
+from app.core.geojson_cache import LEVELS, geojson_cache, level_for_zoom
+from app.core.map_catalog import map_catalog
+from app.core.net_cache import net_cache
+from app.core.tile_cache import LAYER_NAME, tile_cache
+from app.models.map_models import MapCatalogPage, MapMeta
 
 router = APIRouter()
 
@@ -13,10 +24,235 @@ async def get_available_maps():
     if not maps_dir.is_dir():
         raise HTTPException(status_code=500, detail="SUMO maps directory not configured correctly.")
         
-    # Lista os mapas que você já tem
-    map_files = [f.name for f in maps_dir.glob("*.net.xml")]
-    
-    # Adiciona os .geojson para o "Advanced Map Viewer"
-    # map_files.extend([f.name for f in maps_dir.glob("*.geojson")])
-    
-    return map_files
\ No newline at end of file
+    # Descarta do cache redes cujo arquivo mudou ou foi removido
+    net_cache.sweep()
+
+    # Nomes lidos do diretório; o catálogo é atualizado em segundo plano
+    # (no máximo a cada MAP_CATALOG_SCAN_SECONDS)
+    return await run_in_threadpool(map_catalog.names)
+
+_CATALOG_SORT_KEYS = {"name", "size", "mtime", "num_edges", "num_lanes", "num_junctions", "road_length_m"}
+
+@router.get("/api/maps/catalog", response_model=MapCatalogPage)
+async def get_map_catalog(
+    offset: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=500),
+    q: Optional[str] = Query(None, description="Substring of the map name (case-insensitive)"),
+    min_edges: Optional[int] = Query(None, ge=0),
+    max_edges: Optional[int] = Query(None, ge=0),
+    bbox: Optional[str] = Query(None, description="west,south,east,north; maps intersecting it"),
+    sort: str = Query("name", description="Field to sort by, prefixed with '-' for descending"),
+):
+    """
+    Paginated list of maps with their indexed metadata (size, hash, bounds,
+    counts, road length, projection), filtered by name, edge count or area.
+    """
+    if sort.lstrip("-") not in _CATALOG_SORT_KEYS:
+        raise HTTPException(status_code=422, detail=f"sort must be one of {sorted(_CATALOG_SORT_KEYS)}")
+    area = None
+    if bbox is not None:
+        try:
+            area = [float(v) for v in bbox.split(",")]
+        except ValueError:
+            area = []
+        if len(area) != 4:
+            raise HTTPException(status_code=422, detail="bbox must be west,south,east,north")
+
+    items = await run_in_threadpool(map_catalog.items)
+    if q:
+        needle = q.lower()
+        items = [m for m in items if needle in m["name"].lower()]
+    if min_edges is not None:
+        items = [m for m in items if m["num_edges"] >= min_edges]
+    if max_edges is not None:
+        items = [m for m in items if m["num_edges"] <= max_edges]
+    if area is not None:
+        west, south, east, north = area
+        items = [m for m in items if m["bounds"] is not None
+                 and m["bounds"][0] <= east and m["bounds"][2] >= west
+                 and m["bounds"][1] <= north and m["bounds"][3] >= south]
+    if sort != "name":
+        items = sorted(items, key=lambda m: m[sort.lstrip("-")], reverse=sort.startswith("-"))
+    elif sort.startswith("-"):
+        items = items[::-1]
+    return {"total": len(items), "offset": offset, "limit": limit, "items": items[offset:offset + limit]}
+
+@router.get("/api/maps/catalog/stats")
+async def get_map_catalog_stats():
+    """
+    Returns scan/index counters of the map catalog.
+    """
+    return map_catalog.stats()
+
+@router.get("/api/maps/cache/stats")
+async def get_net_cache_stats():
+    """
+    Returns hit/miss counters and memory usage of the shared SUMO network cache.
+    """
+    return net_cache.stats()
+
+@router.get("/api/maps/cache/deflated/stats")
+async def get_deflate_cache_stats():
+    """
+    Returns hit/miss counters and disk usage of the pre-compressed map copies.
+    """
+    return deflate_cache.stats()
+
+@router.get("/api/maps/{name}/meta", response_model=MapMeta)
+async def get_map_meta(name: str):
+    """
+    Indexed metadata of one map, served from memory (one stat() to detect changes).
+    """
+    meta = map_catalog.lookup(name) if _is_map_name(name) else None
+    if meta is not None:
+        return meta
+    map_file = _map_file(name)
+    # Mapa novo ou alterado: indexa fora do event loop
+    meta = await run_in_threadpool(map_catalog.get, map_file.name)
+    if meta is None:
+        raise HTTPException(status_code=422, detail=f"Map {name} could not be indexed")
+    return meta
+
+@router.get("/api/maps/{name}/blob")
+async def get_map_blob(name: str, request: Request, sha256: Optional[str] = None):
+    """
+    Serves the raw .net.xml referenced by reference-mode packages.
+    With ?sha256= the URL pins one version of the map and is cacheable forever;
+    without it the response must be revalidated through its ETag.
+    """
+    map_file = _map_file(name)
+
+    # Primeira leitura do hash percorre o arquivo inteiro: fora do event loop
+    digest = await run_in_threadpool(content_hash, map_file)
+    if sha256 is not None and sha256 != digest:
+        raise HTTPException(status_code=409, detail=f"Map {name} changed (current sha256 {digest})")
+
+    headers = {
+        "ETag": f'"{digest}"',
+        "Cache-Control": "public, max-age=31536000, immutable" if sha256 else "no-cache",
+    }
+    if _not_modified(request, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(map_file, media_type="application/xml", filename=name, headers=headers)
+
+@router.get("/api/maps/cache/geojson/stats")
+async def get_geojson_cache_stats():
+    """
+    Returns hit/miss counters and disk usage of the cached GeoJSON levels.
+    """
+    return geojson_cache.stats()
+
+@router.get("/api/maps/{name}/geojson")
+async def get_map_geojson(
+    name: str,
+    request: Request,
+    level: Optional[int] = Query(None, ge=0, le=len(LEVELS) - 1),
+    zoom: Optional[float] = Query(None, ge=0),
+):
+    """
+    Serves the road network of a map as GeoJSON, derived from its .net.xml.
+    Level 0 is full resolution; higher levels are Douglas-Peucker simplified.
+    With ?zoom= the level is chosen for that Leaflet zoom. The body is
+    precompressed (br/gzip) and revalidated through its ETag.
+    """
+    map_file = _map_file(name)
+    if level is None:
+        level = level_for_zoom(zoom) if zoom is not None else 0
+
+    encoding = geojson_cache.negotiate(_accepted_encodings(request.headers.get("accept-encoding", "")))
+    etag = await run_in_threadpool(geojson_cache.etag, map_file, level, encoding)
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    try:
+        variant = await run_in_threadpool(geojson_cache.variant, map_file, level, encoding)
+    except ValueError as e:
+        # Rede sem projeção geográfica (ex.: gerada pelo netgenerate)
+        raise HTTPException(status_code=422, detail=str(e))
+    if variant.encoding:
+        headers["Content-Encoding"] = variant.encoding
+    if variant.path is not None:
+        return FileResponse(variant.path, media_type="application/geo+json", headers=headers)
+    return Response(variant.data, media_type="application/geo+json", headers=headers)
+
+@router.get("/api/maps/cache/tiles/stats")
+async def get_tile_cache_stats():
+    """
+    Returns memory/disk hit counters and usage of the vector tile cache.
+    """
+    return tile_cache.stats()
+
+@router.get("/api/maps/{name}/tiles.json")
+async def get_map_tilejson(name: str):
+    """
+    TileJSON describing the vector tiles of a map (URL template, bounds, zooms).
+    """
+    map_file = _map_file(name)
+    try:
+        source = await run_in_threadpool(tile_cache.source, map_file)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=f"Map {name}: {e}")
+    return {
+        "tilejson": "3.0.0",
+        "name": name,
+        "tiles": [f"{settings.PUBLIC_BASE_URL}/api/maps/{name}/tiles/{{z}}/{{x}}/{{y}}.pbf"],
+        "bounds": source.bounds,
+        "minzoom": 0,
+        "maxzoom": settings.TILE_MAX_ZOOM,
+        "vector_layers": [{
+            "id": LAYER_NAME,
+            "fields": {"id": "String", "lanes": "Number", "speed": "Number", "type": "String", "length": "Number"},
+        }],
+    }
+
+@router.get("/api/maps/{name}/tiles/{z}/{x}/{y}.pbf")
+async def get_map_tile(name: str, z: int, x: int, y: int, request: Request):
+    """
+    Serves one Mapbox Vector Tile (layer "roads") clipped from the map's edges.
+    Tiles are built on first request and kept in memory and on disk.
+    """
+    map_file = _map_file(name)
+    if not (0 <= z <= settings.TILE_MAX_ZOOM and 0 <= x < (1 << z) and 0 <= y < (1 << z)):
+        raise HTTPException(status_code=404, detail=f"Tile {z}/{x}/{y} out of range")
+
+    gzipped = "gzip" in _accepted_encodings(request.headers.get("accept-encoding", ""))
+    key = await run_in_threadpool(tile_cache.tile_key, map_file, z, x, y)
+    etag = f'"{key}-gzip"' if gzipped else f'"{key}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    try:
+        data = await run_in_threadpool(tile_cache.tile, map_file, z, x, y)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=f"Map {name}: {e}")
+    if gzipped:
+        headers["Content-Encoding"] = "gzip"
+    else:
+        data = gzip.decompress(data)
+    return Response(data, media_type="application/vnd.mapbox-vector-tile", headers=headers)
+
+def _is_map_name(name: str) -> bool:
+    return Path(name).name == name and name.endswith(".net.xml")
+
+def _map_file(name: str) -> Path:
+    map_file = settings.SUMO_MAPS_DIR / name
+    if not _is_map_name(name) or not map_file.is_file():
+        raise HTTPException(status_code=404, detail=f"Map {name} not found")
+    return map_file
+
+def _not_modified(request: Request, etag: str) -> bool:
+    return etag in [t.strip() for t in request.headers.get("if-none-match", "").split(",")]
+
+def _accepted_encodings(header: str) -> List[str]:
+    """Codificações do Accept-Encoding, sem as marcadas com q=0."""
+    accepted = []
+    for item in header.split(","):
+        token, _, params = item.strip().partition(";")
+        q = params.strip()
+        if q.startswith("q=") and q[2:].strip() in ("0", "0.0", "0.00", "0.000"):
+            continue
+        if token:
+            accepted.append(token.strip().lower())
+    return accepted
@@ -1,22 +1,71 @@
-from fastapi import APIRouter, HTTPException, Depends
-from fastapi.responses import StreamingResponse
-import io
+from fastapi import APIRouter, HTTPException, Depends, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, StreamingResponse
 import logging
 
 # Importa os Modelos (Simples e Avançado)
 from app.models.simulation import SimulationPayload, AdvancedSimulationPayload
 from app.models.expert_models import ExpertSimulationPayload # Import novo 
+from app.models.sweep_models import SweepRequest
 
 # Importa os Serviços
 from app.services.simulation_service import SimulationService
 from app.services.advanced_simulation_service import AdvancedSimulationService
 from app.services.expert_simulation_service import ExpertSimulationService
+from app.services.od_check import UnroutableODError
+from app.services.sweep_service import SweepService
+from app.services.trip_generator import generator_options
+from app.core import metrics
+from app.core.artifact_store import artifact_store
+from app.core.route_cache import route_cache
+from app.core.worker_pool import PoolSaturated, worker_pool
+from app.core.zip_stream import iter_zip
 
 router = APIRouter()
 
+
+def _saturated(e: PoolSaturated) -> HTTPException:
+    return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+
+def _generate(kind: str, build_members, payload):
+    with metrics.generation(kind):
+        return build_members(payload)
+
+
+async def _zip_response(request: Request, kind: str, payload, build_members, filename: str) -> Response:
+    """
+    Serve o ZIP do artifact store quando o mesmo payload já foi gerado (com ETag forte);
+    senão gera os arquivos no worker pool e transmite o ZIP, gravando uma cópia no store.
+    """
+    headers = {'Content-Disposition': f'attachment; filename="{filename}"'}
+    # Hash do mapa envolve leitura do arquivo na primeira vez: fora do event loop
+    key = await run_in_threadpool(artifact_store.scenario_key, kind, payload, generator_options())
+
+    if key is not None:
+        # Mesma chave na geração: os bytes transmitidos são os gravados no store
+        headers["ETag"] = artifact_store.etag(key)
+        path = artifact_store.lookup(key)
+        if path is not None:
+            if headers["ETag"] in [t.strip() for t in request.headers.get("if-none-match", "").split(",")]:
+                return Response(status_code=304, headers={"ETag": headers["ETag"]})
+            return FileResponse(path, media_type="application/x-zip-compressed", headers=headers)
+        artifact_store.record_miss()
+
+    # Arquivos gerados no worker pool; a compressão (também no pool, em lotes) acontece
+    # enquanto a resposta é enviada
+    members = await worker_pool.run(_generate, kind, build_members, payload)
+    chunks = iter_zip(members)
+    if key is not None:
+        chunks = artifact_store.tee(key, chunks)
+    chunks = metrics.packaged(kind, chunks)
+    return StreamingResponse(worker_pool.stream(chunks), media_type="application/x-zip-compressed", headers=headers)
+
+
 # --- Endpoint Simples (Random/Legacy) ---
 @router.post("/api/simulations/generate_zip")
 async def create_simulation(
+    request: Request,
     payload: SimulationPayload,
     service: SimulationService = Depends(SimulationService)
 ):
@@ -24,15 +73,10 @@ async def create_simulation(
     Gera simulação simples (aleatória).
     """
     try:
-        zip_buffer: io.BytesIO = service.create_simulation_zip(payload)
         zip_filename = f"{payload.simulation_name}.zip"
-        headers = {'Content-Disposition': f'attachment; filename="{zip_filename}"'}
-        
-        return StreamingResponse(
-            zip_buffer,
-            media_type="application/x-zip-compressed",
-            headers=headers
-        )
+        return await _zip_response(request, "simple", payload, service.create_simulation_members, zip_filename)
+    except PoolSaturated as e:
+        raise _saturated(e)
     except Exception as e:
         logging.error(f"Erro no Simple Sim: {e}")
         raise HTTPException(status_code=500, detail=f"Internal Error: {str(e)}")
@@ -41,6 +85,7 @@ async def create_simulation(
 # --- Endpoint Avançado (NED Dinâmico + RSUs + Jammers) ---
 @router.post("/api/simulations/generate_advanced_zip")
 async def create_advanced_simulation(
+    request: Request,
     payload: AdvancedSimulationPayload,
     service: AdvancedSimulationService = Depends(AdvancedSimulationService)
 ):
@@ -49,34 +94,75 @@ async def create_advanced_simulation(
     """
     try:
         # Chama o serviço avançado que gera o .NED e .INI
-        zip_buffer: io.BytesIO = service.create_advanced_simulation_zip(payload)
-        
         zip_filename = f"{payload.simulation_name}.zip"
-        headers = {'Content-Disposition': f'attachment; filename="{zip_filename}"'}
-        
-        return StreamingResponse(
-            zip_buffer,
-            media_type="application/x-zip-compressed",
-            headers=headers
+        return await _zip_response(
+            request, "advanced", payload, service.create_advanced_simulation_members, zip_filename
         )
         
+    except PoolSaturated as e:
+        raise _saturated(e)
     except FileNotFoundError as e:
         raise HTTPException(status_code=404, detail=str(e))
+    except UnroutableODError as e:
+        raise HTTPException(status_code=422, detail=e.problems)
     except Exception as e:
         logging.error(f"Erro no Advanced Sim: {e}")
         # Retorna o erro detalhado para o frontend ver o alerta
         raise HTTPException(status_code=500, detail=f"Internal Error: {str(e)}")
 @router.post("/api/simulations/generate_expert_zip")
-async def create_expert_simulation(payload: ExpertSimulationPayload):
+async def create_expert_simulation(request: Request, payload: ExpertSimulationPayload):
     try:
         service = ExpertSimulationService()
-        zip_buffer = service.generate_zip(payload)
         filename = f"{payload.simulation_name}_EXPERT.zip"
-        return StreamingResponse(
-            zip_buffer,
-            media_type="application/x-zip-compressed",
-            headers={'Content-Disposition': f'attachment; filename="{filename}"'}
-        )
+        return await _zip_response(request, "expert", payload, service.generate_members, filename)
+    except PoolSaturated as e:
+        raise _saturated(e)
+    except UnroutableODError as e:
+        raise HTTPException(status_code=422, detail=e.problems)
     except Exception as e:
         logging.error(f"Expert Sim Error: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# --- Varredura de parâmetros (várias variantes num único pacote) ---
+@router.post("/api/simulations/generate_sweep_zip")
+async def create_sweep_simulation(request: Request, sweep: SweepRequest):
+    """
+    Gera um pacote com uma [Config] do omnetpp.ini por combinação dos eixos da varredura.
+    """
+    try:
+        sim_name = sweep.base.get("simulation_name", "sweep")
+        return await _zip_response(request, "sweep", sweep, SweepService().create_sweep_members, f"{sim_name}_SWEEP.zip")
+    except PoolSaturated as e:
+        raise _saturated(e)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except Exception as e:
+        logging.error(f"Sweep Sim Error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/api/simulations/cache/routes/stats")
+async def get_route_cache_stats():
+    """
+    Returns hit/miss counters and disk usage of the background-traffic route cache.
+    """
+    return route_cache.stats()
+
+
+@router.get("/api/simulations/cache/artifacts/stats")
+async def get_artifact_store_stats():
+    """
+    Returns hit/miss counters and disk usage of the generated-package store.
+    """
+    return artifact_store.stats()
+
+
+@router.get("/api/simulations/pool/stats")
+async def get_worker_pool_stats():
+    """
+    Returns queue depth, in-flight count and wait times of the generation worker pool.
+    """
+    return worker_pool.stats()
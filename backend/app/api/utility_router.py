@@ -1,23 +1,37 @@
-from fastapi import APIRouter, HTTPException, Depends, Query
-from app.services.map_generator_service import MapGeneratorService
+from fastapi import APIRouter, Query
+from fastapi.concurrency import run_in_threadpool
+from app.api.job_router import submit_job
+from app.core.worker_pool import map_pool
+from app.models.job_models import JobStatus, MapGenerationPayload
+from app.services.osm_cache import osm_cache
 
 router = APIRouter()
 
-@router.post("/api/utils/generate-map")
+@router.post("/api/utils/generate-map", status_code=202, response_model=JobStatus)
 async def generate_new_map(
-    city_name: str = Query(..., description="Name of the city (e.g., 'Porto Alegre')"),
-    size_km: float = Query(2.0, description="Side length of the square area in KM"),
-    service: MapGeneratorService = Depends(MapGeneratorService)
+    city_name: str = Query(..., min_length=1, description="Name of the city (e.g., 'Porto Alegre')"),
+    size_km: float = Query(2.0, gt=0, description="Side length of the square area in KM"),
 ):
     """
-    Generates a new .net.xml map from OpenStreetMap data.
+    Queues the generation of a new .net.xml map from OpenStreetMap data.
+    Follow it (and cancel it) through /api/jobs/{id}; when it succeeds the map is
+    already indexed and precomputed for scenario generation.
     """
-    try:
-        result = service.generate_map(city_name, size_km)
-        if result["status"] == "error":
-            raise HTTPException(status_code=500, detail=result["message"])
-        
-        return {"message": f"Map {result['file_name']} generated successfully!"}
-        
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+    payload = MapGenerationPayload(city_name=city_name, size_km=size_km)
+    return await submit_job("map", payload.model_dump())
+
+
+@router.get("/api/utils/map-pool/stats")
+async def get_map_pool_stats():
+    """
+    Returns queue depth, in-flight count and wait times of the map generation pool.
+    """
+    return map_pool.stats()
+
+
+@router.get("/api/utils/map-cache/stats")
+async def get_map_generator_cache_stats():
+    """
+    Returns counters and disk usage of the map generator cache (geocodes, OSM extracts, nets).
+    """
+    return await run_in_threadpool(osm_cache.stats)
@@ -0,0 +1,47 @@
+from pathlib import Path
+from typing import Optional
+
+from pydantic import BaseModel
+
+from app.core.config import settings
+from app.core.disk_cache import DiskCache
+
+# Incrementar sempre que o conteúdo gerado (NED/INI/sumocfg/rotas) mudar para o mesmo payload
+ARTIFACT_VERSION = 2
+
+
+class ArtifactStore(DiskCache):
+    """Pacotes ZIP já gerados, endereçados pelo hash de (tipo de cenário, payload
+    canônico, conteúdo do mapa, versão do gerador, configurações de empacotamento).
+
+    Um payload repetido é servido direto do disco, com a própria chave como
+    ETag forte.
+    """
+
+    suffix = ".zip"
+
+    def __init__(self, cache_dir: Optional[Path] = None, max_bytes: Optional[int] = None):
+        super().__init__(
+            cache_dir if cache_dir is not None else settings.ARTIFACT_STORE_DIR,
+            max_bytes if max_bytes is not None else settings.ARTIFACT_STORE_MAX_MB * 1024 * 1024,
+        )
+
+    def scenario_key(self, kind: str, payload: BaseModel, generator: dict) -> Optional[str]:
+        """Chave do pacote, ou None se o cache estiver desativado ou o mapa não existir."""
+        map_file = settings.SUMO_MAPS_DIR / payload.map_name
+        if not self.enabled or not map_file.is_file():
+            return None
+        return self.key_for(
+            map_file, kind=kind, payload=payload.model_dump(mode="json"),
+            generator=generator, version=ARTIFACT_VERSION,
+            # Mudam os bytes do ZIP: compressão dos membros e URL gravada no map.json (modo referência)
+            packaging={"compression": settings.ZIP_COMPRESSION, "public_base_url": settings.PUBLIC_BASE_URL},
+        )
+
+    @staticmethod
+    def etag(key: str) -> str:
+        return f'"{key}"'
+
+
+# Instância única do processo, usada pelos endpoints de geração
+artifact_store = ArtifactStore()
@@ -1,4 +1,5 @@
 import os
+from typing import Dict, Optional
 from pydantic_settings import BaseSettings, SettingsConfigDict 
 from pathlib import Path
 from dotenv import load_dotenv
@@ -11,6 +12,85 @@ class Settings(BaseSettings):
     SUMO_HOME: str = "/usr/share/sumo"
     SUMO_MAPS_DIR: Path = Path("./maps")
     MAP_GENERATOR_OUTPUT_DIR: Path = Path("./maps")
+    # Origem dos dados do gerador de mapas: "online" (Nominatim + Overpass) ou "local"
+    # (recorte de OSM_EXTRACT_PATH e cidades do GAZETTEER_PATH, sem acesso à rede)
+    MAP_SOURCE: str = "online"
+    # Extrato regional .osm, .osm.gz, .osm.bz2 ou .osm.pbf
+    OSM_EXTRACT_PATH: Optional[Path] = None
+    # CSV (name, lat, lon[, population]) ou dump do GeoNames; também usado no modo online, antes do Nominatim
+    GAZETTEER_PATH: Optional[Path] = None
+    # Cache do gerador (geocodificações, extratos OSM por bbox, redes geradas); padrão:
+    # <MAP_GENERATOR_OUTPUT_DIR>/.cache (0 desativa)
+    MAP_GENERATOR_CACHE_DIR: Optional[Path] = None
+    MAP_GENERATOR_CACHE_MAX_MB: int = 2048
+    # Processos netconvert simultâneos (as demais gerações de mapa aguardam vaga)
+    NETCONVERT_MAX_PROCS: int = 2
+    # Prioridade (nice) e limites de memória (MB) e de tempo de CPU (s) de cada netconvert (0 = sem limite)
+    NETCONVERT_NICE: int = 10
+    NETCONVERT_MEMORY_MB: int = 0
+    NETCONVERT_CPU_SECONDS: int = 0
+
+    # Cache de redes SUMO (compartilhado entre requisições)
+    NET_CACHE_MAX_MB: int = 1024
+    # Estimativa de memória ocupada pela rede carregada em relação ao tamanho do .net.xml
+    NET_CACHE_SIZE_FACTOR: float = 6.0
+    # Diretório dos arquivos .netpack (padrão: ao lado de cada .net.xml)
+    NETPACK_DIR: Optional[Path] = None
+
+    # Gerador de tráfego de fundo: "native" (em processo) ou "randomtrips" (subprocesso do SUMO)
+    TRIP_GENERATOR: str = "native"
+    # Cache em disco dos arquivos de tráfego gerados (0 desativa)
+    ROUTE_CACHE_DIR: Path = Path("./cache/routes")
+    ROUTE_CACHE_MAX_MB: int = 256
+    # Pacotes ZIP já gerados, reaproveitados para payloads idênticos (0 desativa)
+    ARTIFACT_STORE_DIR: Path = Path("./cache/artifacts")
+    ARTIFACT_STORE_MAX_MB: int = 2048
+    # Compressão dos membros do ZIP por sufixo do nome ("*" = demais), "método[:nível]"
+    # com método stored, deflated, bzip2 ou lzma
+    ZIP_COMPRESSION: Dict[str, str] = {"*": "deflated", ".net.xml": "deflated:9"}
+    # Cópias pré-comprimidas dos mapas, emendadas no ZIP sem recompressão (0 desativa)
+    DEFLATE_CACHE_DIR: Path = Path("./cache/deflated")
+    DEFLATE_CACHE_MAX_MB: int = 1024
+    # GeoJSON das redes (vários níveis de simplificação, já comprimidos) servido ao frontend
+    GEOJSON_CACHE_DIR: Path = Path("./cache/geojson")
+    GEOJSON_CACHE_MAX_MB: int = 512
+    # Vector tiles (MVT) das redes: LRU em memória sobre o cache em disco
+    TILE_CACHE_DIR: Path = Path("./cache/tiles")
+    TILE_CACHE_MAX_MB: int = 1024
+    TILE_MEMORY_MAX_MB: int = 64
+    # Redes mantidas em memória já projetadas para o recorte dos tiles
+    TILE_SOURCES_MAX: int = 4
+    TILE_MAX_ZOOM: int = 20
+    # Zoom máximo pré-gerado quando um mapa é adicionado (-1 desativa)
+    TILE_SEED_MAX_ZOOM: int = 14
+    # URL pública da API, usada pelos pacotes em modo referência para baixar o mapa
+    PUBLIC_BASE_URL: str = "http://localhost:8000"
+
+    # Catálogo persistente dos mapas (metadados) e intervalo mínimo entre varreduras do diretório
+    MAP_CATALOG_DB_PATH: Path = Path("./cache/maps.sqlite3")
+    MAP_CATALOG_SCAN_SECONDS: float = 5.0
+
+    # Pool de geração de cenários (fora do event loop)
+    WORKER_POOL_SIZE: int = 4
+    # Pedidos aguardando além dos que estão em execução; acima disso a API responde 503
+    WORKER_QUEUE_MAX: int = 16
+    # Valor mínimo do cabeçalho Retry-After (segundos)
+    WORKER_RETRY_AFTER: int = 5
+    # Threads dos estágios independentes de cada geração (0 executa em sequência)
+    PIPELINE_STAGE_WORKERS: int = 8
+    # Número máximo de variantes numa varredura de parâmetros
+    SWEEP_MAX_VARIANTS: int = 256
+
+    # Jobs assíncronos de geração (estado em SQLite, ZIPs em disco)
+    JOBS_DB_PATH: Path = Path("./cache/jobs.sqlite3")
+    JOBS_ARTIFACT_DIR: Path = Path("./cache/jobs")
+    # Tempo que um job terminado (e seu ZIP) fica disponível
+    JOB_TTL_HOURS: float = 24.0
+    # Intervalo da limpeza de jobs expirados, em segundo plano (segundos)
+    JOB_CLEANUP_INTERVAL_SECONDS: float = 600.0
+
+    # Métricas em /metrics (formato Prometheus) e cabeçalho Server-Timing nas respostas
+    METRICS_ENABLED: bool = True
     
     # Ferramentas do SUMO
     @property
@@ -24,4 +104,4 @@ class Settings(BaseSettings):
     class Config:
         case_sensitive = True
 
-settings = Settings()
\ No newline at end of file
+settings = Settings()
@@ -0,0 +1,117 @@
+import logging
+import os
+import struct
+import time
+import zipfile
+import zlib
+from pathlib import Path
+from typing import BinaryIO, Optional
+
+from app.core.config import settings
+from app.core.disk_cache import DiskCache
+from app.core.zip_stream import CHUNK_SIZE, Compression, Precompressed, ZipContent, compression_for, compressor_for
+
+# Cabeçalho de cada entrada: crc32, tamanho original, tamanho comprimido
+_HEADER = struct.Struct("<IQQ")
+
+
+class DeflateCache(DiskCache):
+    """Cópias já comprimidas dos mapas, copiadas cruas para os ZIPs.
+
+    A chave é o hash de (conteúdo do mapa, método, nível): quando o mapa muda,
+    a próxima requisição gera uma cópia nova e a antiga sai pelo LRU.
+    """
+
+    suffix = ".zraw"
+
+    def __init__(self, cache_dir: Optional[Path] = None, max_bytes: Optional[int] = None):
+        super().__init__(
+            cache_dir if cache_dir is not None else settings.DEFLATE_CACHE_DIR,
+            max_bytes if max_bytes is not None else settings.DEFLATE_CACHE_MAX_MB * 1024 * 1024,
+        )
+
+    def member(self, path: Path, arcname: str) -> ZipContent:
+        """Conteúdo do membro `arcname`: a cópia pré-comprimida de `path`, ou o
+        próprio caminho se o cache estiver desativado ou o método for stored."""
+        compression = compression_for(arcname)
+        if not self.enabled or compression[0] == zipfile.ZIP_STORED:
+            return path
+        key = self.key_for(path, method=compression[0], level=compression[1])
+
+        entry = self._read(key, path, compression)
+        if entry is not None:
+            return entry
+        with self._single_flight(key):
+            entry = self._read(key, path, compression)
+            if entry is not None:
+                return entry
+            self.record_miss()
+            sizes = []
+            stored = self.store(key, lambda f: sizes.append(self._compress(path, f, compression)))
+            if stored is None:
+                return path
+            return self._entry(path, stored, compression, *sizes[0])
+
+    # --- Internos ---
+
+    @staticmethod
+    def _compress(path: Path, f: BinaryIO, compression: Compression):
+        """Grava cabeçalho + fluxo comprimido (como o zipfile o produziria) e devolve (crc, tamanhos)."""
+        compressor = compressor_for(compression)
+        f.write(_HEADER.pack(0, 0, 0))
+        crc = file_size = compress_size = 0
+        with open(path, "rb") as src:
+            for block in iter(lambda: src.read(CHUNK_SIZE), b""):
+                crc = zlib.crc32(block, crc)
+                file_size += len(block)
+                data = compressor.compress(block)
+                compress_size += len(data)
+                f.write(data)
+        data = compressor.flush()
+        compress_size += len(data)
+        f.write(data)
+        f.seek(0)
+        f.write(_HEADER.pack(crc, file_size, compress_size))
+        return crc, file_size, compress_size
+
+    def _read(self, key: str, source: Path, compression: Compression) -> Optional[Precompressed]:
+        path = self.lookup(key)
+        if path is None:
+            return None
+        try:
+            with open(path, "rb") as f:
+                crc, file_size, compress_size = _HEADER.unpack(f.read(_HEADER.size))
+            complete = os.path.getsize(path) == _HEADER.size + compress_size
+        except (OSError, struct.error) as e:
+            logging.warning(f"Deflate cache: failed to read {path.name}: {e}")
+            complete = False
+        if not complete:
+            # Entrada truncada ou removida: descarta e gera de novo
+            path.unlink(missing_ok=True)
+            with self._lock:
+                self.hits -= 1
+                self.errors += 1
+            return None
+        return self._entry(source, path, compression, crc, file_size, compress_size)
+
+    @staticmethod
+    def _entry(source: Path, data_path: Path, compression: Compression, crc: int, file_size: int,
+               compress_size: int) -> Precompressed:
+        # Mesmos metadados que ZipInfo.from_file daria ao arquivo original
+        st = source.stat()
+        return Precompressed(
+            source=source,
+            data_path=data_path,
+            offset=_HEADER.size,
+            compress_type=compression[0],
+            compress_level=compression[1],
+            crc=crc,
+            file_size=file_size,
+            compress_size=compress_size,
+            date_time=time.localtime(st.st_mtime)[:6],
+            external_attr=(st.st_mode & 0xFFFF) << 16,
+        )
+
+
+# Instância única do processo, usada no empacotamento dos mapas
+deflate_cache = DeflateCache()
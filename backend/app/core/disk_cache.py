@@ -0,0 +1,255 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import BinaryIO, Callable, Dict, Iterator, Optional, Tuple
+
+_HASH_CHUNK = 1024 * 1024
+
+# (caminho, mtime_ns, tamanho) -> sha256, para não reler o mapa a cada pedido
+_content_hashes: Dict[Tuple[str, int, int], str] = {}
+_content_hashes_lock = threading.Lock()
+
+
+def file_sha256(path: Path) -> str:
+    """SHA-256 do conteúdo do arquivo."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def content_hash(path: Path) -> str:
+    """SHA-256 do arquivo, memorizado enquanto mtime e tamanho não mudarem."""
+    path = Path(path)
+    st = path.stat()
+    file_key = (str(path.resolve()), st.st_mtime_ns, st.st_size)
+    with _content_hashes_lock:
+        cached = _content_hashes.get(file_key)
+    if cached is None:
+        cached = file_sha256(path)
+        with _content_hashes_lock:
+            # Descarta hashes de versões antigas do mesmo arquivo
+            for old in [k for k in _content_hashes if k[0] == file_key[0]]:
+                del _content_hashes[old]
+            _content_hashes[file_key] = cached
+    return cached
+
+
+class DiskCache:
+    """Base dos caches em disco endereçados por conteúdo.
+
+    Cada entrada é um arquivo `<dir>/<2 primeiros hex>/<chave><suffix>`. As
+    gravações são atômicas (arquivo temporário + os.replace), então vários
+    workers podem compartilhar o diretório. O limite de tamanho é aplicado com
+    LRU pelo mtime dos arquivos, atualizado a cada acerto. `max_bytes` igual a
+    zero desativa o cache.
+    """
+
+    suffix = ""
+
+    def __init__(self, cache_dir: Path, max_bytes: int):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+
+        self._lock = threading.Lock()
+        # Tamanho total estimado do diretório; None até a primeira varredura
+        self._current_bytes: Optional[int] = None
+        # Chave -> lock da geração em andamento (uma única geração por chave)
+        self._building: Dict[str, threading.Lock] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.errors = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def key_for(self, net_file: Path, **params) -> str:
+        """Chave a partir do conteúdo do mapa e de `params` (serializáveis em JSON)."""
+        payload = json.dumps({"map": content_hash(Path(net_file)), **params}, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def path_for(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}{self.suffix}"
+
+    def lookup(self, key: str) -> Optional[Path]:
+        """Caminho da entrada, se existir (conta como acerto e a marca como recente)."""
+        path = self.path_for(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logging.warning(f"{type(self).__name__}: failed to touch {path.name}: {e}")
+            with self._lock:
+                self.errors += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return path
+
+    def record_miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def store(self, key: str, write: Callable[[BinaryIO], None]) -> Optional[Path]:
+        """Grava a entrada com `write(arquivo)`. Falhas de disco só geram log."""
+        try:
+            fd, tmp = self._new_tmp(key)
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    write(f)
+            except BaseException:
+                Path(tmp).unlink(missing_ok=True)
+                raise
+            return self._install(key, tmp)
+        except OSError as e:
+            self._store_failed(key, e)
+            return None
+
+    def tee(self, key: str, chunks: Iterator[bytes]) -> Iterator[bytes]:
+        """Repassa `chunks` e grava uma cópia como entrada `key` ao final.
+
+        Se a iteração for interrompida (cliente desconectou), nada é gravado.
+        """
+        try:
+            fd, tmp = self._new_tmp(key)
+        except OSError as e:
+            self._store_failed(key, e)
+            yield from chunks
+            return
+
+        f = os.fdopen(fd, "wb")
+        installed = False
+        try:
+            for chunk in chunks:
+                try:
+                    if f is not None:
+                        f.write(chunk)
+                except OSError as e:
+                    # Sem espaço em disco etc.: continua respondendo sem gravar
+                    self._store_failed(key, e)
+                    f.close()
+                    f = None
+                yield chunk
+            if f is not None:
+                f.close()
+                f = None
+                self._install(key, tmp)
+                installed = True
+        finally:
+            if f is not None:
+                f.close()
+            if not installed:
+                Path(tmp).unlink(missing_ok=True)
+
+    def clear(self):
+        """Apaga todas as entradas do diretório de cache."""
+        with self._lock:
+            for path in self._entries():
+                path.unlink(missing_ok=True)
+            self._current_bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            if self._current_bytes is None:
+                self._rescan()
+            total = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "directory": str(self.cache_dir),
+                "entries": sum(1 for _ in self._entries()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / total) if total else 0.0,
+                "evictions": self.evictions,
+                "errors": self.errors,
+                "current_bytes": self._current_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+    # --- Internos ---
+
+    @contextmanager
+    def _single_flight(self, key: str):
+        """Serializa a geração de uma mesma chave; quem esperou deve reler o cache."""
+        with self._lock:
+            build_lock = self._building.setdefault(key, threading.Lock())
+        with build_lock:
+            try:
+                yield
+            finally:
+                with self._lock:
+                    self._building.pop(key, None)
+
+    def _new_tmp(self, key: str) -> Tuple[int, str]:
+        path = self.path_for(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        return tempfile.mkstemp(dir=path.parent, prefix=f".{key}.", suffix=".tmp")
+
+    def _install(self, key: str, tmp: str) -> Path:
+        path = self.path_for(key)
+        size = os.path.getsize(tmp)
+        with self._lock:
+            # Entrada regravada (ex.: GeoJsonCache refaz todas as codificações): conta só a diferença
+            try:
+                old_size = path.stat().st_size
+            except FileNotFoundError:
+                old_size = 0
+            os.replace(tmp, path)
+            if self._current_bytes is None:
+                self._rescan()
+            else:
+                self._current_bytes += size - old_size
+            if self._current_bytes > self.max_bytes:
+                self._evict(keep=path)
+        return path
+
+    def _store_failed(self, key: str, error: Exception):
+        # Falha de disco não deve impedir a geração da simulação
+        logging.warning(f"{type(self).__name__}: failed to store {key[:12]}: {error}")
+        with self._lock:
+            self.errors += 1
+
+    def _entries(self):
+        if not self.cache_dir.is_dir():
+            return iter(())
+        return self.cache_dir.glob(f"*/*{self.suffix}")
+
+    def _rescan(self):
+        total = 0
+        for path in self._entries():
+            try:
+                total += path.stat().st_size
+            except FileNotFoundError:
+                pass
+        self._current_bytes = total
+
+    def _evict(self, keep: Path):
+        # Outros workers também gravam no diretório: recalcula a partir do disco
+        files = []
+        for path in self._entries():
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue
+            files.append((st.st_mtime_ns, st.st_size, path))
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        for _, size, path in files:
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            path.unlink(missing_ok=True)
+            total -= size
+            self.evictions += 1
+        self._current_bytes = total
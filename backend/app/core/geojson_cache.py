@@ -0,0 +1,220 @@
+"""Camada GeoJSON das redes SUMO, derivada do .netpack.
+
+Cada mapa tem vários níveis de detalhe (Douglas–Peucker com tolerância por
+faixa de zoom do Leaflet). Os níveis são gerados sob demanda e guardados em
+disco já comprimidos (gzip e, se o pacote `brotli` estiver instalado, br).
+"""
+import gzip
+import json
+import math
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.disk_cache import DiskCache
+from app.core.net_cache import net_cache
+
+try:
+    import brotli  # Opcional: pip install brotli
+except ImportError:
+    brotli = None
+
+# Muda quando o formato gerado muda (invalida as entradas antigas)
+GEOJSON_VERSION = 1
+
+# (tolerância em metros, menor zoom do Leaflet que usa o nível). A tolerância
+# fica abaixo de ~1 pixel no maior zoom da faixa, em latitudes médias.
+LEVELS = ((0.0, 17), (1.0, 15), (4.0, 13), (16.0, 0))
+
+GZIP = "gzip"
+BROTLI = "br"
+
+
+def level_for_zoom(zoom: float) -> int:
+    """Nível mais simplificado que ainda é fiel no zoom dado."""
+    for level, (_, min_zoom) in enumerate(LEVELS):
+        if zoom >= min_zoom:
+            return level
+    return len(LEVELS) - 1
+
+
+def douglas_peucker(points: np.ndarray, tolerance: float) -> np.ndarray:
+    """Máscara dos vértices de `points` (N x 2, metros) mantidos pela simplificação."""
+    n = len(points)
+    keep = np.zeros(n, dtype=np.bool_)
+    if tolerance <= 0 or n <= 2:
+        keep[:] = True
+        return keep
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        a = points[first]
+        dx, dy = points[last] - a
+        inner = points[first + 1:last] - a
+        norm = math.hypot(dx, dy)
+        if norm == 0.0:
+            # Polilinha fechada: distância ao ponto inicial
+            dist = np.hypot(inner[:, 0], inner[:, 1])
+        else:
+            dist = np.abs(dx * inner[:, 1] - dy * inner[:, 0]) / norm
+        i = int(np.argmax(dist))
+        if dist[i] > tolerance:
+            mid = first + 1 + i
+            keep[mid] = True
+            stack.append((first, mid))
+            stack.append((mid, last))
+    return keep
+
+
+def edge_properties(net, edge_idx: int) -> dict:
+    """Propriedades de uma edge na camada (as mesmas dos .geojson estáticos do frontend)."""
+    lane_offsets = net.arrays["edge_lane_offsets"]
+    return {
+        "id": net.edge_ids[edge_idx],
+        "lanes": int(lane_offsets[edge_idx + 1] - lane_offsets[edge_idx]),
+        "speed": round(float(net.arrays["edge_speed"][edge_idx]) * 3.6, 1),
+        "type": net.edge_types[edge_idx].split(".")[0],
+        "length": round(float(net.arrays["edge_length"][edge_idx]), 1),
+    }
+
+
+def build_geojson(net_file: Path, level: int) -> bytes:
+    """FeatureCollection com uma LineString por edge (id, lanes, speed em km/h, type, length)."""
+    net = net_cache.get(net_file)
+    if not net.has_geo_proj():
+        raise ValueError(f"{Path(net_file).name} has no geo-projection")
+    tolerance = LEVELS[level][0]
+    # ~0,1 m de precisão nos níveis finos, ~1 m nos grossos
+    decimals = 6 if tolerance < 4.0 else 5
+
+    shapes: List[np.ndarray] = []
+    edges: List[int] = []
+    for e in range(net.num_edges):
+        shape = net.edge_shape(e)
+        if len(shape) < 2:
+            continue
+        shapes.append(shape[douglas_peucker(shape, tolerance)])
+        edges.append(e)
+
+    # Uma única chamada ao PROJ para todos os vértices
+    features = []
+    bbox = None
+    if shapes:
+        xy = np.concatenate(shapes)
+        lons, lats = net.convert_xy_to_lonlat_batch(xy[:, 0], xy[:, 1])
+        lonlat = np.round(np.column_stack((lons, lats)), decimals)
+        bbox = [float(lons.min()), float(lats.min()), float(lons.max()), float(lats.max())]
+        bounds = np.cumsum([0] + [len(s) for s in shapes]).tolist()
+        for k, e in enumerate(edges):
+            features.append({
+                "type": "Feature",
+                "properties": edge_properties(net, e),
+                "geometry": {"type": "LineString", "coordinates": lonlat[bounds[k]:bounds[k + 1]].tolist()},
+            })
+
+    name = Path(net_file).name
+    collection = {
+        "type": "FeatureCollection",
+        "properties": {
+            "name": name[: -len(".net.xml")] if name.endswith(".net.xml") else name,
+            "total_edges": len(features),
+            "level": level,
+            "tolerance_m": tolerance,
+        },
+        "features": features,
+    }
+    if bbox is not None:
+        collection["bbox"] = [round(v, decimals) for v in bbox]
+    return json.dumps(collection, separators=(",", ":")).encode("utf-8")
+
+
+def _encode(data: bytes, encoding: str) -> bytes:
+    if encoding == BROTLI:
+        return brotli.compress(data, quality=11)
+    # mtime=0: a mesma entrada gera sempre os mesmos bytes
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+@dataclass(frozen=True)
+class GeoJsonVariant:
+    etag: str
+    encoding: Optional[str]         # "br", "gzip" ou None (sem compressão)
+    path: Optional[Path] = None     # entrada do cache a ser enviada como está
+    data: Optional[bytes] = None    # corpo em memória (cache desativado ou identidade)
+
+
+class GeoJsonCache(DiskCache):
+    """Níveis de GeoJSON de cada mapa, um arquivo por (conteúdo, nível, codificação)."""
+
+    suffix = ".geojson"
+
+    def __init__(self, cache_dir: Optional[Path] = None, max_bytes: Optional[int] = None):
+        super().__init__(
+            cache_dir if cache_dir is not None else settings.GEOJSON_CACHE_DIR,
+            max_bytes if max_bytes is not None else settings.GEOJSON_CACHE_MAX_MB * 1024 * 1024,
+        )
+
+    @property
+    def encodings(self) -> List[str]:
+        """Codificações pré-comprimidas disponíveis, da preferida para a menos preferida."""
+        return [BROTLI, GZIP] if brotli is not None else [GZIP]
+
+    def negotiate(self, accepted: Iterable[str]) -> Optional[str]:
+        """Melhor codificação aceita pelo cliente (None = sem compressão)."""
+        accepted = set(accepted)
+        return next((e for e in self.encodings if e in accepted or "*" in accepted), None)
+
+    def etag(self, net_file: Path, level: int, encoding: Optional[str]) -> str:
+        """ETag da representação (conteúdo do mapa, nível, codificação); não gera o GeoJSON."""
+        base = self.key_for(net_file, level=level, version=GEOJSON_VERSION)
+        return f'"{base}-{encoding}"' if encoding else f'"{base}"'
+
+    def variant(self, net_file: Path, level: int, encoding: Optional[str]) -> GeoJsonVariant:
+        etag = self.etag(net_file, level, encoding)
+        if not self.enabled:
+            return self._in_memory(build_geojson(net_file, level), etag, encoding)
+
+        # Sem compressão (raro): descomprime a entrada gzip
+        key = self._key(net_file, level, encoding or GZIP)
+        path = self.lookup(key)
+        if path is None:
+            with self._single_flight(self._key(net_file, level, None)):
+                path = self.lookup(key)
+                if path is None:
+                    self.record_miss()
+                    data, stored = self._build(net_file, level)
+                    path = stored.get(encoding or GZIP)
+                    if path is None:
+                        # Falha ao gravar: responde mesmo assim
+                        return self._in_memory(data, etag, encoding)
+        if encoding is None:
+            return GeoJsonVariant(etag, None, data=gzip.decompress(path.read_bytes()))
+        return GeoJsonVariant(etag, encoding, path=path)
+
+    # --- Internos ---
+
+    def _key(self, net_file: Path, level: int, encoding: Optional[str]) -> str:
+        return self.key_for(net_file, level=level, version=GEOJSON_VERSION, encoding=encoding)
+
+    def _build(self, net_file: Path, level: int) -> Tuple[bytes, Dict[str, Optional[Path]]]:
+        """Gera o nível uma vez e grava todas as codificações."""
+        data = build_geojson(net_file, level)
+        stored = {}
+        for encoding in self.encodings:
+            body = _encode(data, encoding)
+            stored[encoding] = self.store(self._key(net_file, level, encoding), lambda f: f.write(body))
+        return data, stored
+
+    @staticmethod
+    def _in_memory(data: bytes, etag: str, encoding: Optional[str]) -> GeoJsonVariant:
+        return GeoJsonVariant(etag, encoding, data=_encode(data, encoding) if encoding else data)
+
+
+# Instância única do processo, usada pelo endpoint de GeoJSON dos mapas
+geojson_cache = GeoJsonCache()
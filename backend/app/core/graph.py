@@ -0,0 +1,107 @@
+"""Algoritmos de grafo sobre a conectividade de edges do .netpack (formato CSR)."""
+from typing import Optional, Tuple
+
+import numpy as np
+
+
+def strongly_connected_components(offsets: np.ndarray, succ: np.ndarray, mask: Optional[np.ndarray] = None) -> np.ndarray:
+    """Rótulo da componente fortemente conexa de cada nó (Tarjan iterativo).
+
+    Nós fora de `mask` (quando informada) ficam com rótulo -1 e são ignorados
+    como origem e como destino de arcos.
+    """
+    n = len(offsets) - 1
+    offsets = offsets.tolist()
+    succ = succ.tolist()
+    allowed = [True] * n if mask is None else mask.tolist()
+
+    labels = [-1] * n
+    index = [-1] * n
+    low = [0] * n
+    on_stack = [False] * n
+    stack = []
+    counter = 0
+    n_components = 0
+
+    for root in range(n):
+        if index[root] != -1 or not allowed[root]:
+            continue
+        # Pilha de chamadas explícita: (nó, próxima posição na lista de sucessores)
+        work = [(root, offsets[root])]
+        index[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack[root] = True
+
+        while work:
+            v, pos = work[-1]
+            end = offsets[v + 1]
+            while pos < end:
+                w = succ[pos]
+                pos += 1
+                if not allowed[w]:
+                    continue
+                if index[w] == -1:
+                    work[-1] = (v, pos)
+                    index[w] = low[w] = counter
+                    counter += 1
+                    stack.append(w)
+                    on_stack[w] = True
+                    work.append((w, offsets[w]))
+                    break
+                if on_stack[w] and index[w] < low[v]:
+                    low[v] = index[w]
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    if low[v] < low[parent]:
+                        low[parent] = low[v]
+                if low[v] == index[v]:
+                    while True:
+                        w = stack.pop()
+                        on_stack[w] = False
+                        labels[w] = n_components
+                        if w == v:
+                            break
+                    n_components += 1
+
+    return np.asarray(labels, dtype=np.int32)
+
+
+def largest_component_mask(labels: np.ndarray, weights: Optional[np.ndarray] = None) -> np.ndarray:
+    """Máscara dos nós da maior componente (por soma de pesos, ou por número de nós)."""
+    valid = labels >= 0
+    if not valid.any():
+        return np.zeros(len(labels), dtype=bool)
+    sizes = np.bincount(labels[valid], weights=None if weights is None else weights[valid])
+    return labels == int(np.argmax(sizes))
+
+
+def reverse_csr(offsets: np.ndarray, succ: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Grafo transposto no mesmo formato CSR (lista de predecessores)."""
+    n = len(offsets) - 1
+    sources = np.repeat(np.arange(n, dtype=np.int32), np.diff(offsets))
+    order = np.argsort(succ, kind="stable")
+    rev_offsets = np.zeros(n + 1, dtype=np.int64)
+    rev_offsets[1:] = np.cumsum(np.bincount(succ, minlength=n))
+    return rev_offsets, sources[order].astype(np.int32)
+
+
+def reachable(offsets: np.ndarray, succ: np.ndarray, sources: np.ndarray, mask: Optional[np.ndarray] = None) -> np.ndarray:
+    """Máscara dos nós alcançáveis a partir de `sources` (máscara booleana), por BFS em lote."""
+    visited = sources.copy()
+    allowed = np.ones(len(visited), dtype=bool) if mask is None else mask
+    frontier = np.flatnonzero(visited)
+    while frontier.size:
+        starts = offsets[frontier]
+        counts = offsets[frontier + 1] - starts
+        total = int(counts.sum())
+        if not total:
+            break
+        positions = np.repeat(starts - (np.cumsum(counts) - counts), counts) + np.arange(total)
+        nodes = succ[positions]
+        nodes = np.unique(nodes[allowed[nodes] & ~visited[nodes]])
+        visited[nodes] = True
+        frontier = nodes
+    return visited
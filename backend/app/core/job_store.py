@@ -0,0 +1,111 @@
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import List, Optional
+
+from app.core.config import settings
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id          TEXT PRIMARY KEY,
+    kind        TEXT NOT NULL,
+    status      TEXT NOT NULL,
+    stage       TEXT,
+    stages      TEXT NOT NULL,
+    payload     TEXT NOT NULL,
+    filename    TEXT,
+    artifact    TEXT,
+    error       TEXT,
+    created_at  REAL NOT NULL,
+    updated_at  REAL NOT NULL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_finished_at ON jobs (finished_at);
+"""
+
+# Estados de um job
+QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED = "queued", "running", "succeeded", "failed", "cancelled"
+FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+
+class JobStore:
+    """Persistência dos jobs de geração num SQLite local.
+
+    Guarda payload, estado, etapa atual e caminho do artefato, de modo que os
+    jobs sobrevivam a um restart do servidor. Uma única conexão (modo WAL) é
+    compartilhada pelas threads, protegida por lock.
+    """
+
+    def __init__(self, db_path: Optional[Path] = None):
+        self.db_path = Path(db_path if db_path is not None else settings.JOBS_DB_PATH)
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.db_path), check_same_thread=False, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def create(self, kind: str, payload: dict) -> dict:
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._connect().execute(
+                "INSERT INTO jobs (id, kind, status, stages, payload, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, QUEUED, "{}", json.dumps(payload), now, now),
+            )
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._connect().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return _row_to_job(row) if row else None
+
+    def list_unfinished(self) -> List[dict]:
+        with self._lock:
+            rows = self._connect().execute(
+                f"SELECT * FROM jobs WHERE status NOT IN ({', '.join('?' * len(FINISHED))}) ORDER BY created_at", FINISHED
+            ).fetchall()
+        return [_row_to_job(r) for r in rows]
+
+    def update(self, job_id: str, **fields):
+        if "stages" in fields:
+            fields["stages"] = json.dumps(fields["stages"])
+        fields["updated_at"] = time.time()
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._connect().execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+
+    def delete(self, job_id: str):
+        with self._lock:
+            self._connect().execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+    def expired(self, ttl_seconds: float) -> List[dict]:
+        """Jobs terminados há mais de `ttl_seconds`."""
+        cutoff = time.time() - ttl_seconds
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT * FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?", (cutoff,)
+            ).fetchall()
+        return [_row_to_job(r) for r in rows]
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def _row_to_job(row: sqlite3.Row) -> dict:
+    job = dict(row)
+    job["stages"] = json.loads(job["stages"])
+    job["payload"] = json.loads(job["payload"])
+    return job
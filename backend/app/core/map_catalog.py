@@ -0,0 +1,298 @@
+"""Catálogo persistente dos mapas em SUMO_MAPS_DIR.
+
+Guarda num SQLite os metadados de cada .net.xml (tamanho, hash, bounding box,
+contagens, extensão da malha, projeção) e mantém uma cópia em memória, de modo
+que listar e consultar mapas não exija varrer o diretório nem abrir a rede. A
+atualização é incremental: uma varredura (no máximo a cada
+MAP_CATALOG_SCAN_SECONDS) compara mtime e tamanho e só reindexa o que mudou.
+As listagens respondem na hora e disparam a varredura em segundo plano: os nomes
+vêm sempre do diretório (mapas ainda não indexados já aparecem) e os metadados
+esperam apenas a primeira varredura; depois dela só o que mudou fica atrasado.
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.disk_cache import content_hash
+from app.core.netpack import load_compiled_net
+
+# Muda quando os campos calculados mudam (força a reindexação)
+CATALOG_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS maps (
+    name          TEXT PRIMARY KEY,
+    version       INTEGER NOT NULL,
+    size          INTEGER NOT NULL,
+    mtime_ns      INTEGER NOT NULL,
+    sha256        TEXT NOT NULL,
+    west          REAL,
+    south         REAL,
+    east          REAL,
+    north         REAL,
+    projection    TEXT,
+    num_edges     INTEGER NOT NULL,
+    num_lanes     INTEGER NOT NULL,
+    num_junctions INTEGER NOT NULL,
+    road_length_m REAL NOT NULL,
+    indexed_at    REAL NOT NULL
+);
+"""
+
+_COLUMNS = ("name", "version", "size", "mtime_ns", "sha256", "west", "south", "east", "north", "projection",
+            "num_edges", "num_lanes", "num_junctions", "road_length_m", "indexed_at")
+
+
+def _signature(st: os.stat_result) -> Tuple[int, int]:
+    return st.st_mtime_ns, st.st_size
+
+
+def index_map(map_file: Path) -> dict:
+    """Metadados de um .net.xml (compila o .netpack se preciso)."""
+    st = map_file.stat()
+    # Fora do net_cache: indexar o diretório não deve expulsar os mapas em uso
+    net = load_compiled_net(map_file)
+    bounds = [None] * 4
+    projection = None
+    if net.has_geo_proj():
+        projection = net.location["projParameter"]
+        # Cantos do convBoundary na projeção inversa
+        xmin, ymin, xmax, ymax = net.get_boundary()
+        lons, lats = net.convert_xy_to_lonlat_batch([xmin, xmin, xmax, xmax], [ymin, ymax, ymin, ymax])
+        bounds = [float(lons.min()), float(lats.min()), float(lons.max()), float(lats.max())]
+    return {
+        "name": map_file.name,
+        "version": CATALOG_VERSION,
+        "size": st.st_size,
+        "mtime_ns": st.st_mtime_ns,
+        "sha256": content_hash(map_file),
+        "west": bounds[0], "south": bounds[1], "east": bounds[2], "north": bounds[3],
+        "projection": projection,
+        "num_edges": net.num_edges,
+        "num_lanes": net.num_lanes,
+        "num_junctions": len(net.arrays["junction_xy"]),
+        "road_length_m": round(float(np.sum(net.arrays["edge_length"])), 2),
+        "indexed_at": time.time(),
+    }
+
+
+def to_meta(record: dict) -> dict:
+    """Registro do catálogo no formato da API (MapMeta)."""
+    has_bounds = record["west"] is not None
+    return {
+        "name": record["name"],
+        "size": record["size"],
+        "sha256": record["sha256"],
+        "mtime": record["mtime_ns"] / 1e9,
+        "bounds": [record["west"], record["south"], record["east"], record["north"]] if has_bounds else None,
+        "projection": record["projection"],
+        "num_edges": record["num_edges"],
+        "num_lanes": record["num_lanes"],
+        "num_junctions": record["num_junctions"],
+        "road_length_m": record["road_length_m"],
+        "indexed_at": record["indexed_at"],
+    }
+
+
+class MapCatalog:
+    """Índice dos mapas: SQLite para sobreviver a restarts, dicionário em memória para as consultas."""
+
+    def __init__(self, maps_dir: Optional[Path] = None, db_path: Optional[Path] = None):
+        self._maps_dir = maps_dir
+        self.db_path = Path(db_path if db_path is not None else settings.MAP_CATALOG_DB_PATH)
+        self._lock = threading.Lock()          # conexão e snapshot
+        self._scan_lock = threading.Lock()     # uma varredura por vez
+        self._conn: Optional[sqlite3.Connection] = None
+        # nome -> metadados (formato da API); trocado inteiro a cada atualização
+        self._maps: Dict[str, dict] = {}
+        self._signatures: Dict[str, Tuple[int, int]] = {}
+        self._loaded = False
+        self._scanned_at = 0.0
+        # Marcado ao fim da primeira varredura completa deste processo
+        self._scanned = threading.Event()
+        # Falhas de indexação por assinatura, para não repetir a cada varredura
+        self._failed: Dict[str, Tuple[int, int]] = {}
+        # Chamados com o caminho de cada mapa novo ou alterado
+        self._listeners: List[Callable[[Path], None]] = []
+
+        self.scans = 0
+        self.indexed = 0
+        self.errors = 0
+
+    @property
+    def maps_dir(self) -> Path:
+        return Path(self._maps_dir if self._maps_dir is not None else settings.SUMO_MAPS_DIR)
+
+    def subscribe(self, listener: Callable[[Path], None]):
+        self._listeners.append(listener)
+
+    def lookup(self, name: str) -> Optional[dict]:
+        """Metadados do mapa se o registro estiver em dia (só um stat()); None caso contrário."""
+        self._ensure_loaded()
+        meta = self._maps.get(name)
+        if meta is None:
+            return None
+        try:
+            st = os.stat(os.path.join(self.maps_dir, name))
+        except OSError:
+            return None
+        return meta if self._signatures.get(name) == _signature(st) else None
+
+    def get(self, name: str) -> Optional[dict]:
+        """Como lookup, mas reindexa o diretório se o mapa for novo ou tiver mudado."""
+        meta = self.lookup(name)
+        if meta is None and (self.maps_dir / name).is_file():
+            self.refresh(force=True)
+            meta = self._maps.get(name)
+        return meta
+
+    def names(self) -> List[str]:
+        self.refresh_async()
+        # Um scandir, sem stat nem indexação: os nomes nunca esperam a varredura
+        return sorted(entry.name for entry in self._net_files())
+
+    def items(self) -> List[dict]:
+        if not self._scanned.is_set():
+            # Catálogo vazio ou desatualizado (primeiro start, CATALOG_VERSION novo): espera a varredura
+            self.refresh()
+        else:
+            self.refresh_async()
+        maps = self._maps
+        return [maps[name] for name in sorted(maps)]
+
+    def refresh(self, force: bool = False):
+        """Sincroniza com o diretório (no máximo a cada MAP_CATALOG_SCAN_SECONDS, salvo `force`)."""
+        self._ensure_loaded()
+        if not force and time.monotonic() - self._scanned_at < settings.MAP_CATALOG_SCAN_SECONDS:
+            return
+        with self._scan_lock:
+            if not force and time.monotonic() - self._scanned_at < settings.MAP_CATALOG_SCAN_SECONDS:
+                return
+            self._scan()
+            self._scanned_at = time.monotonic()
+            self._scanned.set()
+
+    def refresh_async(self):
+        """Como refresh, mas numa thread em segundo plano; não faz nada se já houver uma varredura em andamento."""
+        self._ensure_loaded()
+        if time.monotonic() - self._scanned_at < settings.MAP_CATALOG_SCAN_SECONDS:
+            return
+        if not self._scan_lock.acquire(blocking=False):
+            return
+        threading.Thread(target=self._background_scan, name="map-catalog", daemon=True).start()
+
+    def stats(self) -> dict:
+        return {
+            "directory": str(self.maps_dir),
+            "database": str(self.db_path),
+            "maps": len(self._maps),
+            "scans": self.scans,
+            "indexed": self.indexed,
+            "errors": self.errors,
+        }
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    # --- Internos ---
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.db_path), check_same_thread=False, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            rows = self._connect().execute("SELECT * FROM maps WHERE version = ?", (CATALOG_VERSION,)).fetchall()
+            self._maps = {row["name"]: to_meta(dict(row)) for row in rows}
+            self._signatures = {row["name"]: (row["mtime_ns"], row["size"]) for row in rows}
+            self._loaded = True
+
+    def _background_scan(self):
+        # Chamado com _scan_lock já adquirido por refresh_async
+        try:
+            self._scan()
+            self._scanned_at = time.monotonic()
+            self._scanned.set()
+        except Exception as e:
+            logging.error(f"Map catalog: scan failed: {e}")
+        finally:
+            self._scan_lock.release()
+
+    def _net_files(self) -> List[os.DirEntry]:
+        if not self.maps_dir.is_dir():
+            return []
+        with os.scandir(self.maps_dir) as entries:
+            return [entry for entry in entries if entry.name.endswith(".net.xml") and entry.is_file()]
+
+    def _scan(self):
+        self.scans += 1
+        current: Dict[str, Tuple[int, int]] = {}
+        for entry in self._net_files():
+            try:
+                current[entry.name] = _signature(entry.stat())
+            except OSError:
+                pass
+
+        maps, signatures = dict(self._maps), dict(self._signatures)
+        removed = [name for name in maps if name not in current]
+        changed = [name for name, sig in current.items()
+                   if signatures.get(name) != sig and self._failed.get(name) != sig]
+        if not removed and not changed:
+            return
+
+        records = []
+        for name in sorted(changed):
+            try:
+                record = index_map(self.maps_dir / name)
+            except Exception as e:
+                logging.warning(f"Map catalog: failed to index {name}: {e}")
+                self._failed[name] = current[name]
+                self.errors += 1
+                continue
+            records.append(record)
+            maps[name] = to_meta(record)
+            signatures[name] = (record["mtime_ns"], record["size"])
+        for name in removed:
+            maps.pop(name, None)
+            signatures.pop(name, None)
+
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN")
+            conn.executemany("DELETE FROM maps WHERE name = ?", [(name,) for name in removed])
+            conn.executemany(
+                f"INSERT OR REPLACE INTO maps ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})",
+                [tuple(r[c] for c in _COLUMNS) for r in records],
+            )
+            conn.execute("COMMIT")
+            self._maps, self._signatures = maps, signatures
+        self.indexed += len(records)
+        logging.info(f"Map catalog: {len(records)} indexed, {len(removed)} removed, {len(maps)} maps")
+
+        for record in records:
+            for listener in self._listeners:
+                listener(self.maps_dir / record["name"])
+
+
+# Instância única do processo
+map_catalog = MapCatalog()
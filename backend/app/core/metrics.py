@@ -0,0 +1,274 @@
+"""Métricas das gerações (formato texto do Prometheus) e cabeçalho Server-Timing.
+
+Contadores e histogramas mínimos, sem dependências: duração de cada etapa
+(recebida de `report_stage`), gerações iniciadas/falhas, veículos gerados, bytes
+de ZIP e requisições HTTP. `GET /metrics` expõe tudo no formato 0.0.4; cada
+resposta leva as etapas executadas durante a requisição em `Server-Timing`.
+Com METRICS_ENABLED=False nada é registrado (uma verificação por chamada).
+"""
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from starlette.datastructures import MutableHeaders
+
+from app.core.config import settings
+from app.core.progress import Cancelled, observe_stages
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Limites (segundos) dos histogramas: etapas curtas até o netconvert de mapas grandes
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            lines.extend(self._samples())
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}" for k, v in self._values.items()]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float] = DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(buckets) + (float("inf"),)
+        # rótulos -> (contagem por faixa, soma)
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: str):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.setdefault(key, ([0] * len(self.buckets), [0.0]))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            total[0] += value
+
+    def _samples(self) -> List[str]:
+        lines = []
+        for key, (counts, total) in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total[0])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), **kwargs) -> Histogram:
+        metric = Histogram(name, documentation, labelnames, **kwargs)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(line for metric in self._metrics for line in metric.render()) + "\n"
+
+
+registry = Registry()
+
+HTTP_REQUESTS = registry.counter(
+    "http_requests_total", "HTTP requests by route template and status.", ("method", "route", "status"))
+HTTP_SECONDS = registry.histogram(
+    "http_request_duration_seconds", "HTTP request duration, including the streamed body.", ("method", "route"))
+GENERATIONS = registry.counter(
+    "scenario_generations_total", "Scenario and map generations started.", ("kind",))
+GENERATION_FAILURES = registry.counter(
+    "scenario_generation_failures_total", "Generations that raised an error (cancellations excluded).", ("kind",))
+GENERATION_SECONDS = registry.histogram(
+    "scenario_generation_duration_seconds", "Generation duration (packaging of streamed ZIPs excluded).", ("kind",))
+STAGE_SECONDS = registry.histogram(
+    "scenario_stage_duration_seconds", "Duration of each generation stage.", ("kind", "stage"))
+VEHICLES = registry.counter(
+    "scenario_vehicles_total", "Vehicles (fixed and background traffic) in generated scenarios.", ("kind",))
+ZIP_BYTES = registry.counter(
+    "scenario_zip_bytes_total", "Bytes of generated ZIP packages.", ("kind",))
+
+# Tipo da geração em andamento (rótulo das etapas) e etapas da requisição atual (Server-Timing)
+_kind: ContextVar[str] = ContextVar("metrics_kind", default="other")
+_request_stages: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("metrics_request_stages", default=None)
+
+
+def _observe_stage(stage: str, seconds: Optional[float]):
+    if seconds is None:
+        return
+    STAGE_SECONDS.observe(seconds, kind=_kind.get(), stage=stage)
+    stages = _request_stages.get()
+    if stages is not None:
+        stages.append((stage, seconds))
+
+
+if settings.METRICS_ENABLED:
+    observe_stages(_observe_stage)
+
+
+@contextmanager
+def generation(kind: str, background: bool = False):
+    """Conta a geração executada no bloco e rotula suas etapas com `kind`.
+    `background`: fora de uma requisição (jobs), as etapas não entram no Server-Timing."""
+    if not settings.METRICS_ENABLED:
+        yield
+        return
+    kind_token = _kind.set(kind)
+    stages_token = _request_stages.set(None) if background else None
+    GENERATIONS.inc(kind=kind)
+    start = time.perf_counter()
+    try:
+        yield
+    except Cancelled:
+        raise
+    except Exception:
+        GENERATION_FAILURES.inc(kind=kind)
+        raise
+    finally:
+        GENERATION_SECONDS.observe(time.perf_counter() - start, kind=kind)
+        if stages_token is not None:
+            _request_stages.reset(stages_token)
+        _kind.reset(kind_token)
+
+
+def count_vehicles(amount: int):
+    """Veículos do cenário gerado (chamado pelos serviços, dentro de `generation`)."""
+    if settings.METRICS_ENABLED:
+        VEHICLES.inc(amount, kind=_kind.get())
+
+
+def count_zip_bytes(amount: int):
+    if settings.METRICS_ENABLED:
+        ZIP_BYTES.inc(amount, kind=_kind.get())
+
+
+def packaged(kind: str, chunks: Iterable[bytes]) -> Iterable[bytes]:
+    """Conta bytes e tempo de compressão de um ZIP transmitido (que roda depois da
+    geração, enquanto a resposta é enviada), sem incluir a espera pelo cliente."""
+    if not settings.METRICS_ENABLED:
+        return chunks
+    return _packaged(kind, iter(chunks))
+
+
+def _packaged(kind: str, chunks: Iterator[bytes]) -> Iterator[bytes]:
+    size = 0
+    elapsed = 0.0
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                chunk = next(chunks)
+            except StopIteration:
+                break
+            finally:
+                elapsed += time.perf_counter() - start
+            size += len(chunk)
+            yield chunk
+    finally:
+        ZIP_BYTES.inc(size, kind=kind)
+        STAGE_SECONDS.observe(elapsed, kind=kind, stage="packaging")
+
+
+def server_timing(stages: Sequence[Tuple[str, float]], total: float) -> str:
+    """Valor do cabeçalho Server-Timing: cada etapa (somada, se repetida) e o total, em ms."""
+    durations: Dict[str, float] = {}
+    for stage, seconds in stages:
+        durations[stage] = durations.get(stage, 0.0) + seconds
+    durations["total"] = total
+    return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in durations.items())
+
+
+def render() -> str:
+    return registry.render()
+
+
+class MetricsMiddleware:
+    """Conta as requisições HTTP (por rota, não por URL) e acrescenta Server-Timing às respostas."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stages: List[Tuple[str, float]] = []
+        token = _request_stages.set(stages)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                # Etapas concluídas até os cabeçalhos (o ZIP transmitido vem depois)
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", server_timing(list(stages), time.perf_counter() - start))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_stages.reset(token)
+            route = scope.get("route")
+            # Rotas desconhecidas agrupadas, para não criar uma série por URL
+            path = getattr(route, "path", "unmatched")
+            HTTP_REQUESTS.inc(method=scope["method"], route=path, status=str(status))
+            HTTP_SECONDS.observe(time.perf_counter() - start, method=scope["method"], route=path)
@@ -0,0 +1,117 @@
+"""Codificador mínimo de Mapbox Vector Tiles (MVT 2.1) só com a biblioteca padrão.
+
+Cobre o que a camada de ruas usa: camadas com features LineString/MultiLineString
+e propriedades string, inteiras sem sinal e double. A especificação está em
+https://github.com/mapbox/vector-tile-spec/tree/master/2.1
+"""
+import struct
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+
+EXTENT = 4096
+
+# Tipo de geometria e comandos
+LINESTRING = 2
+_MOVE_TO = 1
+_LINE_TO = 2
+
+# Tipos de campo do protobuf
+_VARINT = 0
+_FIXED64 = 1
+_BYTES = 2
+
+_DOUBLE = struct.Struct("<d")
+
+
+def _varint(value: int) -> bytes:
+    out = bytearray()
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _tag(field: int, wire_type: int) -> bytes:
+    return _varint((field << 3) | wire_type)
+
+
+def _bytes_field(field: int, data: bytes) -> bytes:
+    return _tag(field, _BYTES) + _varint(len(data)) + data
+
+
+def _packed(field: int, values: Iterable[int]) -> bytes:
+    return _bytes_field(field, b"".join(_varint(v) for v in values))
+
+
+def _zigzag(value: int) -> int:
+    return value << 1 if value >= 0 else ((-value) << 1) - 1
+
+
+def _command(command: int, count: int) -> int:
+    return (command & 0x7) | (count << 3)
+
+
+def encode_lines(parts: Sequence[Sequence[Tuple[int, int]]]) -> List[int]:
+    """Geometria de uma (multi)linha: cada parte em coordenadas inteiras do tile."""
+    geometry: List[int] = []
+    cx = cy = 0
+    for part in parts:
+        x, y = part[0]
+        geometry += (_command(_MOVE_TO, 1), _zigzag(x - cx), _zigzag(y - cy))
+        cx, cy = x, y
+        geometry.append(_command(_LINE_TO, len(part) - 1))
+        for x, y in part[1:]:
+            geometry += (_zigzag(x - cx), _zigzag(y - cy))
+            cx, cy = x, y
+    return geometry
+
+
+def _encode_value(value: Any) -> bytes:
+    if isinstance(value, str):
+        return _bytes_field(1, value.encode("utf-8"))
+    if isinstance(value, bool):
+        return _tag(7, _VARINT) + _varint(int(value))
+    if isinstance(value, int) and value >= 0:
+        return _tag(5, _VARINT) + _varint(value)
+    if isinstance(value, int):
+        return _tag(6, _VARINT) + _varint(_zigzag(value))
+    return _tag(3, _FIXED64) + _DOUBLE.pack(float(value))
+
+
+class LayerBuilder:
+    """Acumula as features de uma camada, com as tabelas de chaves/valores deduplicadas."""
+
+    def __init__(self, name: str, extent: int = EXTENT):
+        self.name = name
+        self.extent = extent
+        self._keys: Dict[str, int] = {}
+        self._values: Dict[Tuple[type, Any], int] = {}
+        self._features: List[bytes] = []
+
+    def __len__(self) -> int:
+        return len(self._features)
+
+    def add(self, feature_id: int, geometry: List[int], properties: Dict[str, Any], geom_type: int = LINESTRING):
+        tags: List[int] = []
+        for key, value in properties.items():
+            tags.append(self._keys.setdefault(key, len(self._keys)))
+            tags.append(self._values.setdefault((type(value), value), len(self._values)))
+        self._features.append(
+            _tag(1, _VARINT) + _varint(feature_id)
+            + _packed(2, tags)
+            + _tag(3, _VARINT) + _varint(geom_type)
+            + _packed(4, geometry)
+        )
+
+    def encode(self) -> bytes:
+        layer = [_tag(15, _VARINT) + _varint(2), _bytes_field(1, self.name.encode("utf-8"))]
+        layer += [_bytes_field(2, feature) for feature in self._features]
+        layer += [_bytes_field(3, key.encode("utf-8")) for key in self._keys]
+        layer += [_bytes_field(4, _encode_value(value)) for _, value in self._values]
+        layer.append(_tag(5, _VARINT) + _varint(self.extent))
+        return b"".join(layer)
+
+
+def encode_tile(layers: Iterable[LayerBuilder]) -> bytes:
+    """Tile com as camadas não vazias (um tile sem camadas é válido e vazio)."""
+    return b"".join(_bytes_field(3, layer.encode()) for layer in layers if len(layer))
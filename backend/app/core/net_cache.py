@@ -0,0 +1,158 @@
+import logging
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from app.core.config import settings
+from app.core.netpack import load_compiled_net
+
+# (caminho absoluto, mtime_ns, tamanho) identifica uma versão do arquivo de mapa
+CacheKey = Tuple[str, int, int]
+
+
+def _file_key(net_file: Path) -> CacheKey:
+    st = net_file.stat()
+    return str(net_file.resolve()), st.st_mtime_ns, st.st_size
+
+
+class NetCache:
+    """Cache LRU, thread-safe, de redes SUMO já carregadas.
+
+    As entradas são indexadas por caminho + mtime + tamanho: qualquer alteração do
+    arquivo no disco gera uma nova chave e a versão antiga é descartada no próximo
+    acesso. O limite é dado em bytes: o `nbytes` do objeto carregado quando
+    disponível, senão uma estimativa (tamanho do arquivo x fator). O `nbytes` é
+    lido a cada acesso, pois inclui estruturas construídas depois do carregamento
+    (índices espaciais, roteador).
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[Path], Any] = load_compiled_net,
+        max_bytes: Optional[int] = None,
+        size_factor: Optional[float] = None,
+    ):
+        self._loader = loader
+        self.max_bytes = max_bytes if max_bytes is not None else settings.NET_CACHE_MAX_MB * 1024 * 1024
+        self.size_factor = size_factor if size_factor is not None else settings.NET_CACHE_SIZE_FACTOR
+
+        # chave -> (rede, custo estimado usado quando a rede não informa `nbytes`)
+        self._entries: "OrderedDict[CacheKey, Tuple[Any, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Um lock por chave evita que duas requisições parseiem o mesmo mapa ao mesmo tempo
+        self._loading: Dict[CacheKey, threading.Lock] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def current_bytes(self) -> int:
+        return sum(self._cost(net, estimate) for net, estimate in self._entries.values())
+
+    @staticmethod
+    def _cost(net, estimate: int) -> int:
+        return getattr(net, "nbytes", None) or estimate
+
+    def get(self, net_file: Path):
+        """Retorna a rede do arquivo, carregando-a apenas se necessário."""
+        net_file = Path(net_file)
+        if not net_file.exists():
+            raise FileNotFoundError(f"Map file not found: {net_file}")
+        key = _file_key(net_file)
+
+        with self._lock:
+            self._drop_stale(key)
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                # As redes crescem com o uso: o limite é conferido também nos acertos
+                self._evict()
+                return entry[0]
+            load_lock = self._loading.setdefault(key, threading.Lock())
+
+        with load_lock:
+            # Outra thread pode ter terminado o carregamento enquanto esperávamos
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                self.misses += 1
+
+            try:
+                net = self._loader(net_file)
+            except BaseException:
+                with self._lock:
+                    self._loading.pop(key, None)
+                raise
+
+            estimate = int(key[2] * self.size_factor)
+            with self._lock:
+                self._entries[key] = (net, estimate)
+                # Só depois de inserir: quem chegar agora encontra a entrada em vez de um novo lock
+                self._loading.pop(key, None)
+                self._evict()
+            logging.info(f"Net cache: loaded {net_file.name} (~{self._cost(net, estimate) / (1024 * 1024):.1f} MB)")
+            return net
+
+    def invalidate(self, net_file: Optional[Path] = None):
+        """Descarta a entrada de um mapa (ou todo o cache se nenhum for informado)."""
+        with self._lock:
+            if net_file is None:
+                self.invalidations += len(self._entries)
+                self._entries.clear()
+                return
+            path = str(Path(net_file).resolve())
+            for key in [k for k in self._entries if k[0] == path]:
+                del self._entries[key]
+                self.invalidations += 1
+
+    def sweep(self):
+        """Remove entradas cujo arquivo foi alterado ou apagado no diretório de mapas."""
+        with self._lock:
+            for key in list(self._entries):
+                path = Path(key[0])
+                try:
+                    current = _file_key(path)
+                except FileNotFoundError:
+                    current = None
+                if current != key:
+                    del self._entries[key]
+                    self.invalidations += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "maps": [Path(k[0]).name for k in self._entries],
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / total) if total else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "current_bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+    # --- Internos (chamados com self._lock adquirido) ---
+
+    def _drop_stale(self, key: CacheKey):
+        for old in [k for k in self._entries if k[0] == key[0] and k != key]:
+            del self._entries[old]
+            self.invalidations += 1
+
+    def _evict(self):
+        # Mantém sempre a entrada mais recente, mesmo que sozinha ultrapasse o limite
+        while len(self._entries) > 1 and self.current_bytes > self.max_bytes:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+
+# Instância única do processo, usada por todos os serviços
+net_cache = NetCache()
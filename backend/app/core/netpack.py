@@ -0,0 +1,571 @@
+"""Formato binário pré-compilado (.netpack) das redes SUMO.
+
+Um .netpack guarda, em arrays NumPy contíguos, apenas o que os geradores de
+cenário e a camada GeoJSON usam do .net.xml: IDs de edges/lanes/junctions, tipo
+das edges, polilinhas das lanes, conectividade entre edges (geral e só para carros de passeio, com as componentes
+fortemente conexas já calculadas), permissões de veículos de passeio e os
+parâmetros de projeção do elemento <location>. O
+arquivo é mapeado em memória (np.memmap), de modo que carregar um mapa não exige
+parsear XML.
+
+Layout do arquivo:
+    8 bytes   magic (NETPACK_MAGIC)
+    8 bytes   tamanho do cabeçalho JSON (uint64 little-endian)
+    N bytes   cabeçalho JSON (versão, origem, <location>, descritores dos arrays)
+    ...       dados dos arrays, cada um alinhado em 64 bytes
+"""
+import json
+import logging
+import os
+import struct
+import threading
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.graph import largest_component_mask, reachable, reverse_csr, strongly_connected_components
+from app.core.routing import EdgeRouter
+from app.core.spatial_index import LaneSegmentIndex
+
+NETPACK_MAGIC = b"NETPACK\x01"
+NETPACK_VERSION = 4
+NETPACK_SUFFIX = ".netpack"
+_ALIGN = 64
+_PREFIX = struct.Struct("<8sQ")
+
+# Edges que não fazem parte do grafo de ruas usado pelos geradores
+_SKIPPED_FUNCTIONS = {"internal", "crossing", "walkingarea"}
+
+# Estimativa de memória (bytes) por id desempacotado (str + slot da lista) e por entrada de dict
+_STR_BYTES = 80
+_DICT_ENTRY_BYTES = 100
+
+# Bits de edge_reach, relativos à maior componente fortemente conexa (carros de passeio)
+REACHES_MAIN = 1  # Da edge se chega à maior componente
+FROM_MAIN = 2     # A edge é alcançável a partir da maior componente
+
+
+def netpack_path(net_file: Path) -> Path:
+    """Caminho do .netpack correspondente a um .net.xml (ex.: maps/urban_grid.netpack)."""
+    net_file = Path(net_file)
+    name = net_file.name
+    stem = name[: -len(".net.xml")] if name.endswith(".net.xml") else net_file.stem
+    out_dir = settings.NETPACK_DIR if settings.NETPACK_DIR is not None else net_file.parent
+    return Path(out_dir) / f"{stem}{NETPACK_SUFFIX}"
+
+
+def _allows_passenger(allow: Optional[str], disallow: Optional[str]) -> bool:
+    """Aplica a semântica de allow/disallow do SUMO para a classe 'passenger'."""
+    if allow is not None:
+        classes = allow.split()
+        return "all" in classes or "passenger" in classes
+    if disallow is not None:
+        classes = disallow.split()
+        return not ("all" in classes or "passenger" in classes)
+    return True
+
+
+def _parse_shape(shape: str) -> List[Tuple[float, float]]:
+    points = []
+    for pair in shape.split():
+        coords = pair.split(",")
+        points.append((float(coords[0]), float(coords[1])))
+    return points
+
+
+def _pack_strings(values: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    encoded = [v.encode("utf-8") for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    if encoded:
+        offsets[1:] = np.cumsum([len(b) for b in encoded])
+    blob = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    return blob, offsets
+
+
+def _unpack_strings(blob: np.ndarray, offsets: np.ndarray) -> List[str]:
+    raw = blob.tobytes()
+    bounds = offsets.tolist()
+    return [raw[bounds[i]:bounds[i + 1]].decode("utf-8") for i in range(len(bounds) - 1)]
+
+
+def _csr(adjacency: List[set]) -> Tuple[np.ndarray, np.ndarray]:
+    offsets = np.zeros(len(adjacency) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(s) for s in adjacency])
+    return offsets, np.asarray([j for s in adjacency for j in sorted(s)], dtype=np.int32)
+
+
+def _parse_net_xml(net_file: Path) -> Tuple[Dict[str, str], Dict[str, np.ndarray]]:
+    """Lê o .net.xml em streaming e devolve (<location>, arrays)."""
+    location: Dict[str, str] = {}
+    junction_ids: List[str] = []
+    junction_xy: List[Tuple[float, float]] = []
+
+    edge_ids: List[str] = []
+    edge_from: List[str] = []
+    edge_to: List[str] = []
+    edge_priority: List[int] = []
+    edge_type: List[str] = []
+    edge_lane_offsets = [0]
+
+    lane_ids: List[str] = []
+    lane_edge: List[int] = []
+    lane_length: List[float] = []
+    lane_speed: List[float] = []
+    lane_passenger: List[bool] = []
+    lane_shape_offsets = [0]
+    lane_shape_xy: List[Tuple[float, float]] = []
+
+    connections: List[Tuple[str, str, str, str, bool]] = []
+
+    current_edge = None
+    context = ET.iterparse(str(net_file), events=("start", "end"))
+    _, root = next(context)
+
+    for event, elem in context:
+        tag = elem.tag
+        if event == "start":
+            if tag == "edge":
+                if elem.get("function", "normal") in _SKIPPED_FUNCTIONS:
+                    current_edge = None
+                    continue
+                current_edge = len(edge_ids)
+                edge_ids.append(elem.get("id"))
+                edge_from.append(elem.get("from", ""))
+                edge_to.append(elem.get("to", ""))
+                edge_priority.append(int(elem.get("priority", -1)))
+                edge_type.append(elem.get("type", ""))
+            elif tag == "lane" and current_edge is not None:
+                points = _parse_shape(elem.get("shape", ""))
+                lane_ids.append(elem.get("id"))
+                lane_edge.append(current_edge)
+                lane_length.append(float(elem.get("length", 0.0)))
+                lane_speed.append(float(elem.get("speed", 0.0)))
+                lane_passenger.append(_allows_passenger(elem.get("allow"), elem.get("disallow")))
+                lane_shape_xy.extend(points)
+                lane_shape_offsets.append(len(lane_shape_xy))
+            elif tag == "junction":
+                if not elem.get("id", "").startswith(":"):
+                    junction_ids.append(elem.get("id"))
+                    junction_xy.append((float(elem.get("x", 0.0)), float(elem.get("y", 0.0))))
+            elif tag == "connection":
+                connections.append((
+                    elem.get("from"), elem.get("to"), elem.get("fromLane"), elem.get("toLane"),
+                    _allows_passenger(elem.get("allow"), elem.get("disallow")),
+                ))
+            elif tag == "location":
+                location = dict(elem.attrib)
+        else:
+            if tag == "edge":
+                if current_edge is not None:
+                    edge_lane_offsets.append(len(lane_ids))
+                current_edge = None
+            # Libera a memória dos elementos de primeiro nível já processados
+            if tag in ("edge", "junction", "connection", "location", "type", "tlLogic", "roundabout", "request"):
+                elem.clear()
+                root.clear()
+
+    edge_index = {eid: i for i, eid in enumerate(edge_ids)}
+    junction_index = {jid: i for i, jid in enumerate(junction_ids)}
+
+    lane_allows = dict(zip(lane_ids, lane_passenger))
+    succ = [set() for _ in edge_ids]
+    # Só conexões por onde um carro de passeio pode passar (conexão e as duas lanes)
+    passenger_succ = [set() for _ in edge_ids]
+    for src, dst, from_lane, to_lane, allowed in connections:
+        i = edge_index.get(src)
+        j = edge_index.get(dst)
+        if i is not None and j is not None:
+            succ[i].add(j)
+            if allowed and lane_allows.get(f"{src}_{from_lane}") and lane_allows.get(f"{dst}_{to_lane}"):
+                passenger_succ[i].add(j)
+    succ_offsets, succ_flat = _csr(succ)
+    passenger_succ_offsets, passenger_succ_flat = _csr(passenger_succ)
+
+    lane_offsets = np.asarray(edge_lane_offsets, dtype=np.int64)
+    lane_len_arr = np.asarray(lane_length, dtype=np.float64)
+    lane_speed_arr = np.asarray(lane_speed, dtype=np.float64)
+    lane_pass_arr = np.asarray(lane_passenger, dtype=np.bool_)
+    n_edges = len(edge_ids)
+    first_lane = lane_offsets[:-1]
+    has_lanes = lane_offsets[1:] > first_lane
+
+    # Mesmas convenções do sumolib: comprimento da edge = comprimento da primeira lane
+    edge_length = np.zeros(n_edges, dtype=np.float64)
+    edge_speed = np.zeros(n_edges, dtype=np.float64)
+    edge_passenger = np.zeros(n_edges, dtype=np.bool_)
+    if len(lane_ids):
+        edge_length[has_lanes] = lane_len_arr[first_lane[has_lanes]]
+        edge_speed[has_lanes] = np.maximum.reduceat(lane_speed_arr, first_lane[has_lanes])
+        edge_passenger[has_lanes] = np.logical_or.reduceat(lane_pass_arr, first_lane[has_lanes])
+
+    arrays: Dict[str, np.ndarray] = {}
+    arrays["edge_id_blob"], arrays["edge_id_offsets"] = _pack_strings(edge_ids)
+    arrays["lane_id_blob"], arrays["lane_id_offsets"] = _pack_strings(lane_ids)
+    arrays["junction_id_blob"], arrays["junction_id_offsets"] = _pack_strings(junction_ids)
+    arrays["junction_xy"] = np.asarray(junction_xy, dtype=np.float64).reshape(-1, 2)
+    arrays["edge_from"] = np.asarray([junction_index.get(j, -1) for j in edge_from], dtype=np.int32)
+    arrays["edge_to"] = np.asarray([junction_index.get(j, -1) for j in edge_to], dtype=np.int32)
+    arrays["edge_priority"] = np.asarray(edge_priority, dtype=np.int32)
+    arrays["edge_type_blob"], arrays["edge_type_offsets"] = _pack_strings(edge_type)
+    arrays["edge_length"] = edge_length
+    arrays["edge_speed"] = edge_speed
+    arrays["edge_passenger"] = edge_passenger
+    arrays["edge_lane_offsets"] = lane_offsets
+    arrays["edge_succ_offsets"] = succ_offsets
+    arrays["edge_succ"] = succ_flat
+    arrays["edge_passenger_succ_offsets"] = passenger_succ_offsets
+    arrays["edge_passenger_succ"] = passenger_succ_flat
+    arrays["lane_edge"] = np.asarray(lane_edge, dtype=np.int32)
+    arrays["lane_length"] = lane_len_arr
+    arrays["lane_speed"] = lane_speed_arr
+    arrays["lane_passenger"] = lane_pass_arr
+    arrays["lane_shape_offsets"] = np.asarray(lane_shape_offsets, dtype=np.int64)
+    arrays["lane_shape_xy"] = np.asarray(lane_shape_xy, dtype=np.float64).reshape(-1, 2)
+    arrays["edge_scc"], arrays["edge_reach"] = connectivity_arrays(passenger_succ_offsets, passenger_succ_flat, edge_passenger)
+    return location, arrays
+
+
+def connectivity_arrays(offsets: np.ndarray, succ: np.ndarray, passenger: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Componente fortemente conexa (carros de passeio) de cada edge e os bits de edge_reach."""
+    labels = strongly_connected_components(offsets, succ, passenger)
+    main = largest_component_mask(labels)
+    from_main = reachable(offsets, succ, main, passenger)
+    rev_offsets, pred = reverse_csr(offsets, succ)
+    to_main = reachable(rev_offsets, pred, main, passenger)
+    reach = np.where(to_main, REACHES_MAIN, 0) | np.where(from_main, FROM_MAIN, 0)
+    return labels, reach.astype(np.uint8)
+
+
+def _source_signature(net_file: Path) -> dict:
+    st = Path(net_file).stat()
+    return {"name": Path(net_file).name, "mtime_ns": st.st_mtime_ns, "size": st.st_size}
+
+
+def _build_header(source: dict, location: Dict[str, str], arrays: Dict[str, np.ndarray]) -> Tuple[bytes, Dict[str, dict]]:
+    descriptors = {}
+    offset = 0
+    for name, arr in arrays.items():
+        offset = (offset + _ALIGN - 1) // _ALIGN * _ALIGN
+        descriptors[name] = {"dtype": arr.dtype.str, "shape": list(arr.shape), "offset": offset}
+        offset += arr.nbytes
+    header = {
+        "version": NETPACK_VERSION,
+        "source": source,
+        "location": location,
+        "arrays": descriptors,
+    }
+    return json.dumps(header).encode("utf-8"), descriptors
+
+
+def write_netpack(out_file: Path, source: dict, location: Dict[str, str], arrays: Dict[str, np.ndarray]):
+    """Grava o .netpack de forma atômica (arquivo temporário + os.replace)."""
+    header_bytes, descriptors = _build_header(source, location, arrays)
+    data_start = (_PREFIX.size + len(header_bytes) + _ALIGN - 1) // _ALIGN * _ALIGN
+
+    tmp_file = out_file.with_name(f".{out_file.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        with open(tmp_file, "wb") as f:
+            f.write(_PREFIX.pack(NETPACK_MAGIC, len(header_bytes)))
+            f.write(header_bytes)
+            for name, arr in arrays.items():
+                f.seek(data_start + descriptors[name]["offset"])
+                f.write(np.ascontiguousarray(arr).tobytes())
+        os.replace(tmp_file, out_file)
+    finally:
+        if tmp_file.exists():
+            tmp_file.unlink()
+
+
+def read_netpack_header(pack_file: Path) -> Tuple[dict, int]:
+    """Retorna (cabeçalho, deslocamento do início dos dados)."""
+    with open(pack_file, "rb") as f:
+        magic, header_len = _PREFIX.unpack(f.read(_PREFIX.size))
+        if magic != NETPACK_MAGIC:
+            raise ValueError(f"Not a netpack file: {pack_file}")
+        header = json.loads(f.read(header_len).decode("utf-8"))
+    data_start = (_PREFIX.size + header_len + _ALIGN - 1) // _ALIGN * _ALIGN
+    return header, data_start
+
+
+def _is_fresh(pack_file: Path, net_file: Path) -> bool:
+    if not pack_file.exists():
+        return False
+    try:
+        header, _ = read_netpack_header(pack_file)
+    except (OSError, ValueError):
+        return False
+    source = _source_signature(net_file)
+    return (
+        header.get("version") == NETPACK_VERSION
+        and header["source"]["mtime_ns"] == source["mtime_ns"]
+        and header["source"]["size"] == source["size"]
+    )
+
+
+class CompiledNet:
+    """Visão somente leitura de uma rede SUMO compilada."""
+
+    def __init__(self, location: Dict[str, str], arrays: Dict[str, np.ndarray], source: dict, path: Optional[Path] = None):
+        self.location = location
+        self.arrays = arrays
+        self.source = source
+        self.path = path
+        self._edge_ids: Optional[List[str]] = None
+        self._lane_ids: Optional[List[str]] = None
+        self._edge_types: Optional[List[str]] = None
+        self._edge_index: Optional[Dict[str, int]] = None
+        self._segment_indexes: Dict[Tuple[bool, bool], LaneSegmentIndex] = {}
+        self._scc_labels: Dict[bool, np.ndarray] = {}
+        self._router: Optional[EdgeRouter] = None
+        self._proj = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def open(cls, pack_file: Path) -> "CompiledNet":
+        """Mapeia um .netpack em memória sem copiar os arrays."""
+        header, data_start = read_netpack_header(pack_file)
+        mm = np.memmap(pack_file, dtype=np.uint8, mode="r")
+        arrays = {}
+        for name, desc in header["arrays"].items():
+            dtype = np.dtype(desc["dtype"])
+            count = int(np.prod(desc["shape"])) if desc["shape"] else 1
+            start = data_start + desc["offset"]
+            arrays[name] = np.frombuffer(mm, dtype=dtype, count=count, offset=start).reshape(desc["shape"])
+        return cls(header["location"], arrays, header["source"], path=Path(pack_file))
+
+    # --- Tamanho / identificação ---
+
+    @property
+    def nbytes(self) -> int:
+        """Arrays mapeados mais o que já foi construído sob demanda (ids, índices,
+        componentes e roteador): cresce com o uso do mapa."""
+        total = sum(a.nbytes for a in self.arrays.values())
+        for names in (self._edge_ids, self._lane_ids, self._edge_types):
+            if names is not None:
+                total += _STR_BYTES * len(names)
+        if self._edge_index is not None:
+            total += _DICT_ENTRY_BYTES * len(self._edge_index)
+        total += sum(index.nbytes for index in list(self._segment_indexes.values()))
+        total += sum(labels.nbytes for labels in list(self._scc_labels.values()))
+        if self._router is not None:
+            total += self._router.nbytes
+        return total
+
+    @property
+    def num_edges(self) -> int:
+        return len(self.arrays["edge_from"])
+
+    @property
+    def num_lanes(self) -> int:
+        return len(self.arrays["lane_edge"])
+
+    @property
+    def edge_ids(self) -> List[str]:
+        if self._edge_ids is None:
+            self._edge_ids = _unpack_strings(self.arrays["edge_id_blob"], self.arrays["edge_id_offsets"])
+        return self._edge_ids
+
+    @property
+    def lane_ids(self) -> List[str]:
+        if self._lane_ids is None:
+            self._lane_ids = _unpack_strings(self.arrays["lane_id_blob"], self.arrays["lane_id_offsets"])
+        return self._lane_ids
+
+    @property
+    def edge_types(self) -> List[str]:
+        """Atributo type de cada edge (ex.: "highway.residential"), vazio se ausente."""
+        if self._edge_types is None:
+            self._edge_types = _unpack_strings(self.arrays["edge_type_blob"], self.arrays["edge_type_offsets"])
+        return self._edge_types
+
+    def edge_index(self, edge_id: str) -> int:
+        if self._edge_index is None:
+            self._edge_index = {eid: i for i, eid in enumerate(self.edge_ids)}
+        return self._edge_index[edge_id]
+
+    def successors(self, edge_idx: int) -> np.ndarray:
+        offsets = self.arrays["edge_succ_offsets"]
+        return self.arrays["edge_succ"][offsets[edge_idx]:offsets[edge_idx + 1]]
+
+    def lane_shape(self, lane_idx: int) -> np.ndarray:
+        offsets = self.arrays["lane_shape_offsets"]
+        return self.arrays["lane_shape_xy"][offsets[lane_idx]:offsets[lane_idx + 1]]
+
+    def edge_shape(self, edge_idx: int) -> np.ndarray:
+        """Polilinha da edge como em sumolib Edge.getShape(): a lane central, ou a
+        média ponto a ponto das lanes quando o número de lanes é par."""
+        lanes = self.arrays["edge_lane_offsets"]
+        first, last = int(lanes[edge_idx]), int(lanes[edge_idx + 1])
+        count = last - first
+        if count == 0:
+            return np.empty((0, 2), dtype=np.float64)
+        if count % 2 == 1:
+            return self.lane_shape(first + count // 2)
+        shapes = [self.lane_shape(lane) for lane in range(first, last)]
+        points = min(len(shape) for shape in shapes)
+        return sum(shape[:points] for shape in shapes) / count
+
+    # --- Projeção (mesma semântica do sumolib.net.Net) ---
+
+    def get_boundary(self) -> List[float]:
+        """xmin, ymin, xmax, ymax em coordenadas da rede."""
+        return list(map(float, self.location["convBoundary"].split(",")))
+
+    def get_location_offset(self) -> List[float]:
+        return list(map(float, self.location["netOffset"].split(",")))
+
+    def has_geo_proj(self) -> bool:
+        return self.location.get("projParameter", "!") != "!"
+
+    def get_geo_proj(self):
+        if not self.has_geo_proj():
+            raise RuntimeError("Network does not provide geo-projection")
+        if self._proj is None:
+            import pyproj
+            with self._lock:
+                if self._proj is None:
+                    self._proj = pyproj.Proj(projparams=self.location["projParameter"])
+        return self._proj
+
+    def convert_lonlat_to_xy(self, lon: float, lat: float) -> Tuple[float, float]:
+        x, y = self.get_geo_proj()(lon, lat)
+        x_off, y_off = self.get_location_offset()
+        return x + x_off, y + y_off
+
+    def convert_lonlat_to_xy_batch(self, lons, lats) -> Tuple[np.ndarray, np.ndarray]:
+        """Versão vetorizada de convert_lonlat_to_xy.
+
+        Usa o mesmo pipeline PROJ do sumolib (pyproj.Proj, cacheado por mapa) numa
+        única chamada, e soma o netOffset em float64: o resultado é bit a bit igual
+        ao de sumolib.net.Net.convertLonLat2XY ponto a ponto.
+        """
+        lons = np.asarray(lons, dtype=np.float64)
+        lats = np.asarray(lats, dtype=np.float64)
+        if lons.size == 0:
+            return np.empty(0, dtype=np.float64), np.empty(0, dtype=np.float64)
+        xs, ys = self.get_geo_proj().transform(lons, lats)
+        x_off, y_off = self.get_location_offset()
+        return np.asarray(xs, dtype=np.float64) + x_off, np.asarray(ys, dtype=np.float64) + y_off
+
+    def convert_xy_to_lonlat_batch(self, xs, ys) -> Tuple[np.ndarray, np.ndarray]:
+        """Inverso de convert_lonlat_to_xy_batch (mesma semântica de sumolib convertXY2LonLat)."""
+        xs = np.asarray(xs, dtype=np.float64)
+        ys = np.asarray(ys, dtype=np.float64)
+        if xs.size == 0:
+            return np.empty(0, dtype=np.float64), np.empty(0, dtype=np.float64)
+        x_off, y_off = self.get_location_offset()
+        lons, lats = self.get_geo_proj()(xs - x_off, ys - y_off, inverse=True)
+        return np.asarray(lons, dtype=np.float64), np.asarray(lats, dtype=np.float64)
+
+    # --- Conectividade ---
+
+    def scc_labels(self, passenger_only: bool = True) -> np.ndarray:
+        """Componente fortemente conexa de cada edge (-1 se a edge foi filtrada)."""
+        if passenger_only:
+            return self.arrays["edge_scc"]  # Calculada na compilação
+        labels = self._scc_labels.get(passenger_only)
+        if labels is None:
+            with self._lock:
+                labels = self._scc_labels.get(passenger_only)
+                if labels is None:
+                    mask = self.arrays["edge_passenger"] if passenger_only else None
+                    labels = strongly_connected_components(
+                        self.arrays["edge_succ_offsets"], self.arrays["edge_succ"], mask
+                    )
+                    self._scc_labels[passenger_only] = labels
+        return labels
+
+    def largest_scc_mask(self, passenger_only: bool = True) -> np.ndarray:
+        """Edges da maior componente: entre quaisquer duas delas existe rota."""
+        return largest_component_mask(self.scc_labels(passenger_only))
+
+    def od_feasible(self, from_edges, to_edges) -> np.ndarray:
+        """Se existe rota de carro de passeio de cada origem ao destino correspondente, em O(1) por par.
+
+        Exato quando origem e destino estão na mesma componente ou quando a rota
+        passa pela maior componente (o caso de ramais de entrada e saída); pares
+        entre duas componentes menores são dados como inviáveis.
+        """
+        f = np.asarray(from_edges, dtype=np.int64)
+        t = np.asarray(to_edges, dtype=np.int64)
+        labels, reach = self.arrays["edge_scc"], self.arrays["edge_reach"]
+        valid = (f >= 0) & (t >= 0)
+        f, t = np.where(valid, f, 0), np.where(valid, t, 0)
+        same = (labels[f] == labels[t]) & (labels[f] >= 0)
+        via_main = ((reach[f] & REACHES_MAIN) > 0) & ((reach[t] & FROM_MAIN) > 0)
+        return valid & (same | via_main)
+
+    def router(self) -> EdgeRouter:
+        """Roteador de caminhos mínimos (contraction hierarchy construída uma única vez por mapa)."""
+        if self._router is None:
+            with self._lock:
+                if self._router is None:
+                    self._router = EdgeRouter(self.arrays)
+        return self._router
+
+    # --- Consultas geométricas ---
+
+    def segment_index(self, passenger_only: bool = False, main_component: bool = False) -> LaneSegmentIndex:
+        """Índice espacial das lanes, construído uma única vez por mapa.
+
+        Com main_component, só as lanes de carros de passeio da maior componente."""
+        key = (passenger_only or main_component, main_component)
+        index = self._segment_indexes.get(key)
+        if index is None:
+            with self._lock:
+                index = self._segment_indexes.get(key)
+                if index is None:
+                    mask = self.arrays["lane_passenger"] if key[0] else None
+                    if main_component:
+                        mask = mask & self.largest_scc_mask()[self.arrays["lane_edge"]]
+                    index = LaneSegmentIndex.from_shapes(
+                        self.arrays["lane_shape_xy"], self.arrays["lane_shape_offsets"], lane_mask=mask
+                    )
+                    self._segment_indexes[key] = index
+        return index
+
+    def nearest_edges(self, xs, ys, max_dist: Optional[float] = None, passenger_only: bool = True,
+                      main_component: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+        """Edge mais próxima de cada ponto (x, y), em lote.
+
+        Retorna (índices das edges, distâncias). Sem max_dist todo ponto recebe a
+        edge mais próxima do mapa; com max_dist, pontos sem rua no raio recebem -1.
+        Com main_component, só edges da maior componente (de onde se chega a
+        qualquer outra edge dela).
+        """
+        lanes, dists = self.segment_index(passenger_only, main_component).query(xs, ys, k=1, max_dist=max_dist)
+        lanes, dists = lanes[:, 0], dists[:, 0]
+        edges = np.where(lanes >= 0, self.arrays["lane_edge"][np.maximum(lanes, 0)], -1)
+        return edges, dists
+
+
+def compile_netpack(net_file: Path, out_file: Optional[Path] = None) -> Path:
+    """Compila um .net.xml para .netpack e retorna o caminho gravado."""
+    net_file = Path(net_file)
+    out_file = Path(out_file) if out_file is not None else netpack_path(net_file)
+    source = _source_signature(net_file)
+    location, arrays = _parse_net_xml(net_file)
+    out_file.parent.mkdir(parents=True, exist_ok=True)
+    write_netpack(out_file, source, location, arrays)
+    logging.info(f"Netpack compiled: {net_file.name} -> {out_file}")
+    return out_file
+
+
+def load_compiled_net(net_file: Path) -> CompiledNet:
+    """Abre o .netpack do mapa, recompilando-o se o .net.xml mudou.
+
+    Se o diretório do .netpack não for gravável, a rede é compilada só em memória.
+    """
+    net_file = Path(net_file)
+    pack_file = netpack_path(net_file)
+    if not _is_fresh(pack_file, net_file):
+        try:
+            compile_netpack(net_file, pack_file)
+        except OSError as e:
+            logging.warning(f"Could not write netpack for {net_file.name} ({e}); using in-memory build.")
+            location, arrays = _parse_net_xml(net_file)
+            return CompiledNet(location, arrays, _source_signature(net_file))
+    return CompiledNet.open(pack_file)
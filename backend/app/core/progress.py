@@ -0,0 +1,90 @@
+"""Relato de etapas (e cancelamento) das gerações, usado pela API de jobs."""
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, List, Optional
+
+# Etapas de uma geração, na ordem em que começam (várias podem rodar ao mesmo tempo)
+STAGES = ("net_load", "snapping", "routes", "ini_ned", "map", "packaging")
+# Etapas da geração de um mapa (.net.xml) a partir do OpenStreetMap
+MAP_STAGES = ("geocode", "osm_data", "netconvert", "precompute")
+
+RUNNING = "running"
+DONE = "done"
+# Andamento de uma etapa em execução; o terceiro argumento do callback é a fração (0..1)
+PROGRESS = "progress"
+
+# (etapa, status, duração em segundos com DONE ou fração com PROGRESS)
+StageCallback = Callable[[str, str, Optional[float]], None]
+
+_stage_callback: ContextVar[Optional[StageCallback]] = ContextVar("stage_callback", default=None)
+_cancel_event: ContextVar[Optional[threading.Event]] = ContextVar("cancel_event", default=None)
+# Recebem (etapa, duração) de toda etapa concluída, com ou sem stage_reporter (ex.: métricas)
+_stage_observers: List[Callable[[str, Optional[float]], None]] = []
+
+
+class Cancelled(Exception):
+    """A geração foi cancelada (levantada no próximo relato de etapa)."""
+
+
+def cancel_requested() -> bool:
+    event = _cancel_event.get()
+    return event is not None and event.is_set()
+
+
+def check_cancelled():
+    if cancel_requested():
+        raise Cancelled("Cancelled")
+
+
+@contextmanager
+def cancel_scope(event: threading.Event):
+    """Dentro do bloco (e das threads que herdam o contexto), `event` cancela a geração."""
+    token = _cancel_event.set(event)
+    try:
+        yield
+    finally:
+        _cancel_event.reset(token)
+
+
+def report_stage(stage: str, status: str = RUNNING, seconds: Optional[float] = None):
+    """Sinaliza o início de uma etapa (ou o fim, com status DONE e a duração).
+    Sem efeito fora de `stage_reporter`. Levanta Cancelled se a geração foi cancelada."""
+    check_cancelled()
+    if status == DONE:
+        for observer in _stage_observers:
+            observer(stage, seconds)
+    callback = _stage_callback.get()
+    if callback is not None:
+        callback(stage, status, seconds)
+
+
+def report_progress(stage: str, fraction: float):
+    """Andamento parcial de uma etapa longa (ex.: netconvert)."""
+    report_stage(stage, PROGRESS, fraction)
+
+
+@contextmanager
+def tracked_stage(stage: str):
+    """Relata início e fim da etapa executada dentro do bloco."""
+    start = time.perf_counter()
+    report_stage(stage)
+    yield
+    report_stage(stage, DONE, time.perf_counter() - start)
+
+
+def observe_stages(observer: Callable[[str, Optional[float]], None]):
+    """Registra `observer` para todas as etapas concluídas no processo."""
+    _stage_observers.append(observer)
+
+
+@contextmanager
+def stage_reporter(callback: StageCallback):
+    """Encaminha as chamadas de `report_stage` feitas neste contexto para `callback`
+    (inclusive das threads do pipeline, que herdam o contexto)."""
+    token = _stage_callback.set(callback)
+    try:
+        yield
+    finally:
+        _stage_callback.reset(token)
@@ -0,0 +1,66 @@
+import logging
+from pathlib import Path
+from typing import Callable, Optional
+
+from app.core.config import settings
+from app.core.disk_cache import DiskCache
+
+
+class RouteCache(DiskCache):
+    """Cache em disco, endereçado por conteúdo, dos arquivos de tráfego de fundo.
+
+    A chave é o hash de (conteúdo do mapa, duração, período, seed, opções do
+    gerador): dois pedidos idênticos, mesmo em mapas renomeados, reaproveitam o
+    mesmo arquivo.
+    """
+
+    suffix = ".rou.xml"
+
+    def __init__(self, cache_dir: Optional[Path] = None, max_bytes: Optional[int] = None):
+        super().__init__(
+            cache_dir if cache_dir is not None else settings.ROUTE_CACHE_DIR,
+            max_bytes if max_bytes is not None else settings.ROUTE_CACHE_MAX_MB * 1024 * 1024,
+        )
+
+    def get_or_create(self, net_file: Path, build: Callable[[], str], **params) -> str:
+        """Retorna o XML de rotas do cache, gerando-o com `build()` em caso de falta.
+
+        `params` entram na chave e devem descrever tudo o que influencia a saída
+        (duração, período, seed, gerador...).
+        """
+        if not self.enabled:
+            return build()
+        key = self.key_for(net_file, **params)
+
+        content = self._read(key)
+        if content is not None:
+            return content
+
+        with self._single_flight(key):
+            # Outra thread pode ter gerado o arquivo enquanto esperávamos
+            content = self._read(key)
+            if content is not None:
+                return content
+            self.record_miss()
+            content = build()
+            data = content.encode()
+            self.store(key, lambda f: f.write(data))
+        return content
+
+    def _read(self, key: str) -> Optional[str]:
+        path = self.lookup(key)
+        if path is None:
+            return None
+        try:
+            return path.read_text()
+        except OSError as e:
+            # Removida por outro worker entre o lookup e a leitura
+            logging.warning(f"Route cache: failed to read {path.name}: {e}")
+            with self._lock:
+                self.hits -= 1
+                self.errors += 1
+            return None
+
+
+# Instância única do processo, usada pelos geradores de tráfego
+route_cache = RouteCache()
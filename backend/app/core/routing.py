@@ -0,0 +1,231 @@
+"""Roteamento em processo sobre o grafo de edges do .netpack.
+
+Caminho mínimo por tempo de viagem (comprimento / velocidade máxima, o custo
+padrão do duarouter) entre edges de carros de passeio, via contraction
+hierarchy: as edges são "contraídas" uma a uma, em ordem de importância,
+acrescentando atalhos que preservam as distâncias. Uma consulta é então uma
+busca bidirecional que só sobe na hierarquia e visita poucas centenas de nós,
+mesmo em redes grandes. A hierarquia é construída uma única vez por mapa
+(CompiledNet.router) e os pares O/D já resolvidos ficam memorizados.
+
+Convenção de custo: o percurso de `a` até `b` soma o tempo de todas as edges
+após `a` (inclusive `b`).
+"""
+import heapq
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Nós visitados por busca de "testemunha" na contração (acima disso o atalho é
+# criado por segurança: só custa memória, nunca correção)
+_WITNESS_SETTLE_LIMIT = 500
+# Velocidade assumida para edges sem velocidade (m/s)
+_DEFAULT_SPEED = 13.89
+# Pares O/D memorizados por mapa
+_MEMO_MAX = 65536
+# Estimativa de memória (bytes) dos objetos Python: arco (tupla + float na lista),
+# atalho no dict `via`, par memorizado (chave + entrada) e cada edge de um caminho
+_ARC_BYTES = 120
+_VIA_BYTES = 110
+_MEMO_ENTRY_BYTES = 250
+_HOP_BYTES = 36
+
+_INF = float("inf")
+
+
+class EdgeRouter:
+    """Caminhos mínimos entre edges de carros de passeio de uma rede compilada."""
+
+    def __init__(self, arrays: Dict[str, np.ndarray]):
+        passenger = np.asarray(arrays["edge_passenger"], dtype=bool).tolist()
+        speed = np.where(arrays["edge_speed"] > 0, arrays["edge_speed"], _DEFAULT_SPEED)
+        cost = (np.asarray(arrays["edge_length"]) / speed).tolist()
+        offsets = arrays["edge_passenger_succ_offsets"].tolist()
+        succ = arrays["edge_passenger_succ"].tolist()
+
+        n = len(offsets) - 1
+        # Arco u -> w custa o tempo da edge w
+        out: List[Dict[int, float]] = [{} for _ in range(n)]
+        inn: List[Dict[int, float]] = [{} for _ in range(n)]
+        for u in range(n):
+            if not passenger[u]:
+                continue
+            for w in succ[offsets[u]:offsets[u + 1]]:
+                if w != u and passenger[w]:
+                    out[u][w] = inn[w][u] = cost[w]
+        self._n = n
+        self._up_out, self._up_in, self._via = self._contract(out, inn)
+        arcs = sum(len(a) for a in self._up_out) + sum(len(a) for a in self._up_in)
+        self._graph_bytes = _ARC_BYTES * arcs + _VIA_BYTES * len(self._via)
+        self._memo: Dict[Tuple[int, int], Optional[Tuple[int, ...]]] = {}
+        self._memo_bytes = 0
+        self._memo_lock = threading.Lock()
+
+    @property
+    def nbytes(self) -> int:
+        """Memória estimada da hierarquia e dos caminhos memorizados."""
+        return self._graph_bytes + self._memo_bytes
+
+    # --- Construção ---
+
+    @staticmethod
+    def _witness(out: List[Dict[int, float]], source: int, skip: int, targets: Dict[int, float]) -> Dict[int, float]:
+        """Distâncias a partir de `source` sem passar por `skip`, até alcançar todos os `targets`
+        (ou passar do maior custo entre eles)."""
+        limit = max(targets.values())
+        pending = len(targets)
+        dist = {source: 0.0}
+        heap = [(0.0, source)]
+        settled = 0
+        while heap and settled < _WITNESS_SETTLE_LIMIT:
+            d, v = heapq.heappop(heap)
+            if d > dist[v]:
+                continue
+            if d > limit:
+                break
+            if v in targets:
+                pending -= 1
+                if not pending:
+                    break
+            settled += 1
+            for w, c in out[v].items():
+                nd = d + c
+                if w != skip and nd < dist.get(w, _INF):
+                    dist[w] = nd
+                    heapq.heappush(heap, (nd, w))
+        return dist
+
+    def _shortcuts(self, out, inn, v: int) -> List[Tuple[int, int, float]]:
+        """Atalhos (u, x, custo) necessários para retirar `v` do grafo."""
+        shortcuts = []
+        for u, cu in inn[v].items():
+            targets = {x: cu + cx for x, cx in out[v].items() if x != u}
+            if not targets:
+                continue
+            dist = self._witness(out, u, v, targets)
+            shortcuts.extend((u, x, c) for x, c in targets.items() if dist.get(x, _INF) > c)
+        return shortcuts
+
+    def _contract(self, out, inn):
+        n = self._n
+        contracted_neighbors = [0] * n
+        level = [0] * n
+        up_out: List[List[Tuple[int, float]]] = [[] for _ in range(n)]
+        up_in: List[List[Tuple[int, float]]] = [[] for _ in range(n)]
+        via: Dict[int, int] = {}  # u * n + x -> edge contraída entre u e x (só atalhos)
+
+        def priority(v: int, shortcuts) -> int:
+            # Diferença de arcos, vizinhos já contraídos e nível na hierarquia: espalha a
+            # contração pelo mapa e mantém as buscas rasas
+            return 2 * (len(shortcuts) - len(inn[v]) - len(out[v])) + contracted_neighbors[v] + level[v]
+
+        heap = [(priority(v, self._shortcuts(out, inn, v)), v) for v in range(n) if out[v] or inn[v]]
+        heapq.heapify(heap)
+        while heap:
+            _, v = heapq.heappop(heap)
+            # Atualização preguiçosa: só contrai se ainda for o de menor prioridade
+            shortcuts = self._shortcuts(out, inn, v)
+            p = priority(v, shortcuts)
+            if heap and p > heap[0][0]:
+                heapq.heappush(heap, (p, v))
+                continue
+
+            up_out[v] = list(out[v].items())
+            up_in[v] = list(inn[v].items())
+            for neighbors, reverse in ((inn[v], out), (out[v], inn)):
+                for u in neighbors:
+                    del reverse[u][v]
+                    contracted_neighbors[u] += 1
+                    level[u] = max(level[u], level[v] + 1)
+            out[v].clear()
+            inn[v].clear()
+            for u, x, c in shortcuts:
+                if c < out[u].get(x, _INF):
+                    out[u][x] = inn[x][u] = c
+                    via[u * n + x] = v
+        return up_out, up_in, via
+
+    # --- Consultas ---
+
+    def _search(self, source: int, target: int) -> Optional[Tuple[int, ...]]:
+        """Busca bidirecional na hierarquia (as duas metades só sobem)."""
+        dist = ({source: 0.0}, {target: 0.0})
+        parent = ({source: -1}, {target: -1})
+        heaps = ([(0.0, source)], [(0.0, target)])
+        # Arcos para subir e, no sentido oposto, para o "stall-on-demand"
+        arcs = ((self._up_out, self._up_in), (self._up_in, self._up_out))
+        best, meet = _INF, -1
+        side = 1
+        while True:
+            # Alterna os lados; para quando nenhum pode mais melhorar `best`
+            forward_done = not heaps[0] or heaps[0][0][0] >= best
+            backward_done = not heaps[1] or heaps[1][0][0] >= best
+            if forward_done and backward_done:
+                break
+            side = 1 if forward_done else 0 if backward_done else 1 - side
+            heap, mine, other = heaps[side], dist[side], dist[1 - side]
+            up, down = arcs[side]
+            d, v = heapq.heappop(heap)
+            if d > mine[v]:
+                continue
+            if v in other and d + other[v] < best:
+                best, meet = d + other[v], v
+            # Nó alcançado por um caminho melhor vindo de cima não precisa ser expandido
+            if any(mine.get(u, _INF) + c < d for u, c in down[v]):
+                continue
+            for w, c in up[v]:
+                nd = d + c
+                if nd < mine.get(w, _INF):
+                    mine[w] = nd
+                    parent[side][w] = v
+                    heapq.heappush(heap, (nd, w))
+        if meet < 0:
+            return None
+
+        hops = []
+        v = meet
+        while v != -1:
+            hops.append(v)
+            v = parent[0][v]
+        hops.reverse()
+        v = parent[1][meet]
+        while v != -1:
+            hops.append(v)
+            v = parent[1][v]
+
+        # Desfaz os atalhos
+        path = [hops[0]]
+        n, via = self._n, self._via
+        for a, b in zip(hops, hops[1:]):
+            stack = [(a, b)]
+            while stack:
+                a, b = stack.pop()
+                m = via.get(a * n + b)
+                if m is None:
+                    path.append(b)
+                else:
+                    stack.append((m, b))
+                    stack.append((a, m))
+        return tuple(path)
+
+    def route(self, source: int, target: int) -> Optional[Tuple[int, ...]]:
+        """Edges (índices) do caminho mínimo de `source` a `target`, ou None se não houver."""
+        if source == target:
+            return (source,)
+        key = (source, target)
+        if key in self._memo:
+            return self._memo[key]
+        path = self._search(source, target)
+        with self._memo_lock:
+            if len(self._memo) >= _MEMO_MAX:
+                self._memo.clear()
+                self._memo_bytes = 0
+            if key not in self._memo:
+                self._memo_bytes += _MEMO_ENTRY_BYTES + _HOP_BYTES * len(path or ())
+            self._memo[key] = path
+        return path
+
+    def routes(self, sources: Sequence[int], targets: Sequence[int]) -> List[Optional[Tuple[int, ...]]]:
+        """Caminhos de cada par (sources[i], targets[i]); pares repetidos são resolvidos uma vez."""
+        return [self.route(int(s), int(t)) for s, t in zip(sources, targets)]
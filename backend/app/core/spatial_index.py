@@ -0,0 +1,281 @@
+"""Índice espacial de segmentos de lanes para snapping em lote.
+
+Os segmentos das polilinhas das lanes são divididos em pedaços de no máximo uma
+célula e distribuídos numa grade uniforme (armazenamento CSR por célula). As
+células são agrupadas em blocos com bounding box e um ponto representativo.
+
+Uma consulta é resolvida, para o lote inteiro e de forma vetorizada, em dois
+níveis: primeiro a célula do ponto e as oito vizinhas; os pontos que ainda não têm
+garantia de resposta (longe de qualquer rua, ou fora do mapa) passam por uma
+poda por blocos (limite inferior = distância à caixa do bloco, limite superior =
+distância ao ponto representativo), o que dá uma busca sem raio máximo correta.
+"""
+from typing import Optional, Tuple
+
+import numpy as np
+
+# Limite de células da grade (evita CSR gigante em mapas de cidades inteiras)
+_MAX_CELLS = 4_000_000
+_MIN_CELL_SIZE = 5.0
+# Raio (em células) da vizinhança visitada no primeiro nível
+_RING = 1
+# Blocos por lado no segundo nível
+_BLOCKS_PER_SIDE = 16
+# Pontos por lote na poda por blocos (limita a matriz pontos x blocos)
+_BLOCK_CHUNK = 1024
+
+
+def lane_segments(xy: np.ndarray, shape_offsets: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Segmentos (a, b, lane) de todas as polilinhas armazenadas em CSR."""
+    counts = np.diff(shape_offsets)
+    lane_of_point = np.repeat(np.arange(len(counts), dtype=np.int64), counts)
+    if len(xy) < 2:
+        empty = np.empty((0, 2), dtype=np.float64)
+        return empty, empty, np.empty(0, dtype=np.int64)
+    # Um segmento liga cada ponto ao seguinte dentro da mesma lane
+    valid = lane_of_point[:-1] == lane_of_point[1:]
+    return xy[:-1][valid], xy[1:][valid], lane_of_point[:-1][valid]
+
+
+def _expand_csr(starts: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """Índices starts[i] .. starts[i] + counts[i] - 1 concatenados."""
+    total = int(counts.sum())
+    return np.repeat(starts, counts) + (np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts))
+
+
+class LaneSegmentIndex:
+    """Grade uniforme de segmentos de lanes com consultas k-nearest em lote."""
+
+    def __init__(self, a: np.ndarray, b: np.ndarray, seg_lane: np.ndarray, cell_size: Optional[float] = None):
+        self.num_segments = len(seg_lane)
+        if self.num_segments == 0:
+            return
+
+        pts = np.vstack([a, b])
+        min_x, min_y = pts.min(axis=0)
+        max_x, max_y = pts.max(axis=0)
+        span_x, span_y = max(max_x - min_x, 1.0), max(max_y - min_y, 1.0)
+        if cell_size is None:
+            # Células com metade do lado "um segmento por célula": poucos candidatos por consulta
+            cell_size = max(0.5 * np.sqrt(span_x * span_y / self.num_segments), _MIN_CELL_SIZE)
+        cell_size = max(cell_size, np.sqrt(span_x * span_y / _MAX_CELLS))
+        self.cell_size = float(cell_size)
+        self.origin = (float(min_x), float(min_y))
+        self.width = int(span_x // cell_size) + 1
+        self.height = int(span_y // cell_size) + 1
+
+        # Divide segmentos longos em pedaços de até uma célula: cada pedaço cobre no máximo 2x2 células
+        d = b - a
+        seg_len = np.hypot(d[:, 0], d[:, 1])
+        n_pieces = np.maximum(np.ceil(seg_len / cell_size).astype(np.int64), 1)
+        piece_seg = np.repeat(np.arange(len(seg_len)), n_pieces)
+        piece_k = np.arange(len(piece_seg)) - np.repeat(np.cumsum(n_pieces) - n_pieces, n_pieces)
+        t0 = (piece_k / n_pieces[piece_seg])[:, None]
+        t1 = ((piece_k + 1) / n_pieces[piece_seg])[:, None]
+        p0 = a[piece_seg] + t0 * d[piece_seg]
+        p1 = a[piece_seg] + t1 * d[piece_seg]
+        self._ax, self._ay = p0[:, 0].copy(), p0[:, 1].copy()
+        self._bx, self._by = p1[:, 0].copy(), p1[:, 1].copy()
+        self._lane = seg_lane[piece_seg].astype(np.int64)
+
+        # Nível 1: células finas
+        lo_x, lo_y = np.minimum(self._ax, self._bx), np.minimum(self._ay, self._by)
+        hi_x, hi_y = np.maximum(self._ax, self._bx), np.maximum(self._ay, self._by)
+        cx0, cy0 = self._cell_of(lo_x, lo_y)
+        cx1, cy1 = self._cell_of(hi_x, hi_y)
+        cells, pieces = [], []
+        for ox, oy in ((0, 0), (1, 0), (0, 1), (1, 1)):
+            mask = (cx0 + ox <= cx1) & (cy0 + oy <= cy1)
+            cells.append((cy0[mask] + oy) * self.width + (cx0[mask] + ox))
+            pieces.append(np.nonzero(mask)[0])
+        cells = np.concatenate(cells)
+        pieces = np.concatenate(pieces)
+        order = np.argsort(cells, kind="stable")
+        cells, pieces = cells[order], pieces[order]
+        self._cell_start = np.searchsorted(cells, np.arange(self.width * self.height + 1)).astype(np.int64)
+        self._cell_piece = pieces
+
+        # Nível 2: blocos de células, cada um com a caixa dos seus pedaços e um ponto representativo
+        self.block_cells = max(1, int(np.ceil(max(self.width, self.height) / _BLOCKS_PER_SIDE)))
+        blocks_w = (self.width + self.block_cells - 1) // self.block_cells
+        block = (cells // self.width) // self.block_cells * blocks_w + (cells % self.width) // self.block_cells
+        key = np.unique(block * len(self._lane) + pieces)
+        block, pieces = key // len(self._lane), key % len(self._lane)
+        occupied, self._block_start = np.unique(block, return_index=True)
+        self._block_start = np.r_[self._block_start, len(block)].astype(np.int64)
+        self._block_piece = pieces
+        first = pieces[self._block_start[:-1]]
+        self._block_rep = np.column_stack([self._ax[first], self._ay[first]])
+        self._block_rep_lane = self._lane[first]
+        self._block_box = np.column_stack([
+            np.minimum.reduceat(lo_x[pieces], self._block_start[:-1]),
+            np.minimum.reduceat(lo_y[pieces], self._block_start[:-1]),
+            np.maximum.reduceat(hi_x[pieces], self._block_start[:-1]),
+            np.maximum.reduceat(hi_y[pieces], self._block_start[:-1]),
+        ])
+
+    @property
+    def nbytes(self) -> int:
+        return sum(v.nbytes for v in vars(self).values() if isinstance(v, np.ndarray))
+
+    @classmethod
+    def from_shapes(cls, xy: np.ndarray, shape_offsets: np.ndarray, lane_mask: Optional[np.ndarray] = None, cell_size: Optional[float] = None):
+        a, b, seg_lane = lane_segments(xy, shape_offsets)
+        if lane_mask is not None:
+            keep = lane_mask[seg_lane]
+            a, b, seg_lane = a[keep], b[keep], seg_lane[keep]
+        return cls(a, b, seg_lane, cell_size=cell_size)
+
+    def _cell_of(self, xs: np.ndarray, ys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        cx = np.floor((xs - self.origin[0]) / self.cell_size).astype(np.int64)
+        cy = np.floor((ys - self.origin[1]) / self.cell_size).astype(np.int64)
+        return cx, cy
+
+    def query(self, xs, ys, k: int = 1, max_dist: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """k lanes mais próximas de cada ponto.
+
+        Retorna (lanes, dists), ambos com forma (N, k) e ordenados por distância.
+        Posições sem resultado têm lane -1 e distância inf. Sem max_dist a busca
+        não tem raio limite: todo ponto recebe a lane mais próxima do mapa.
+        """
+        xs = np.asarray(xs, dtype=np.float64).ravel()
+        ys = np.asarray(ys, dtype=np.float64).ravel()
+        n = len(xs)
+        best_d = np.full((n, k), np.inf)
+        best_l = np.full((n, k), -1, dtype=np.int64)
+        if n == 0 or self.num_segments == 0:
+            return best_l, best_d
+
+        pending = self._query_cells(xs, ys, k, max_dist, best_d, best_l)
+        for start in range(0, len(pending), _BLOCK_CHUNK):
+            self._query_blocks(xs, ys, pending[start:start + _BLOCK_CHUNK], k, max_dist, best_d, best_l)
+
+        if max_dist is not None:
+            far = best_d >= max_dist
+            best_d[far] = np.inf
+            best_l[far] = -1
+        return best_l, best_d
+
+    def _query_cells(self, xs, ys, k, max_dist, best_d, best_l) -> np.ndarray:
+        """Nível 1: vizinhança de células do ponto. Retorna os pontos ainda sem garantia."""
+        n = len(xs)
+        cx, cy = self._cell_of(xs, ys)
+        # Distância do ponto à borda da própria célula: o quadrado visitado cobre _RING células + margem
+        fx = (xs - self.origin[0]) / self.cell_size - cx
+        fy = (ys - self.origin[1]) / self.cell_size - cy
+        margin = np.minimum.reduce([fx, 1.0 - fx, fy, 1.0 - fy]) * self.cell_size
+
+        dx, dy = np.meshgrid(np.arange(-_RING, _RING + 1), np.arange(-_RING, _RING + 1))
+        gx = cx[:, None] + dx.ravel()
+        gy = cy[:, None] + dy.ravel()
+        inside = (gx >= 0) & (gx < self.width) & (gy >= 0) & (gy < self.height)
+        p_rep = np.nonzero(inside)[0]
+        cell = gy[inside] * self.width + gx[inside]
+
+        starts = self._cell_start[cell]
+        counts = self._cell_start[cell + 1] - starts
+        if counts.sum():
+            cand_p = np.repeat(p_rep, counts)
+            cand_i = self._cell_piece[_expand_csr(starts, counts)]
+            cand_d = self._distances(xs[cand_p], ys[cand_p], cand_i)
+            self._merge(best_d, best_l, cand_p, cand_d, self._lane[cand_i], k)
+
+        covered = _RING * self.cell_size + margin
+        done = best_d[:, k - 1] <= covered
+        if max_dist is not None:
+            done |= covered >= max_dist
+        return np.nonzero(~done)[0]
+
+    def _query_blocks(self, xs, ys, points, k, max_dist, best_d, best_l):
+        """Nível 2: poda exata por blocos para os pontos restantes."""
+        px, py = xs[points][:, None], ys[points][:, None]
+        box = self._block_box
+        # Limites em distância ao quadrado (evita raízes na matriz pontos x blocos)
+        ex = np.maximum(np.maximum(box[:, 0] - px, px - box[:, 2]), 0.0)
+        ey = np.maximum(np.maximum(box[:, 1] - py, py - box[:, 3]), 0.0)
+        lower = ex * ex + ey * ey
+        rx, ry = self._block_rep[:, 0] - px, self._block_rep[:, 1] - py
+        upper = rx * rx + ry * ry
+
+        if k == 1:
+            threshold = upper.min(axis=1)
+        else:
+            # k-ésimo menor limite superior entre lanes distintas
+            lane_order = np.argsort(self._block_rep_lane, kind="stable")
+            lanes = self._block_rep_lane[lane_order]
+            groups = np.flatnonzero(np.r_[True, lanes[1:] != lanes[:-1]])
+            per_lane = np.minimum.reduceat(upper[:, lane_order], groups, axis=1)
+            if per_lane.shape[1] >= k:
+                threshold = np.partition(per_lane, k - 1, axis=1)[:, k - 1]
+            else:
+                threshold = np.full(len(points), np.inf)
+        if max_dist is not None:
+            threshold = np.minimum(threshold, max_dist * max_dist)
+
+        row, blk = np.nonzero(lower <= threshold[:, None])
+        starts = self._block_start[blk]
+        counts = self._block_start[blk + 1] - starts
+        if not counts.sum():
+            return
+        cand_p = np.repeat(points[row], counts)
+        cand_i = self._block_piece[_expand_csr(starts, counts)]
+        cand_d = self._distances(xs[cand_p], ys[cand_p], cand_i)
+        self._merge(best_d, best_l, cand_p, cand_d, self._lane[cand_i], k)
+
+    def _distances(self, px: np.ndarray, py: np.ndarray, idx: np.ndarray) -> np.ndarray:
+        ax, ay = self._ax[idx], self._ay[idx]
+        dx, dy = self._bx[idx] - ax, self._by[idx] - ay
+        len2 = dx * dx + dy * dy
+        t = ((px - ax) * dx + (py - ay) * dy) / np.where(len2 > 0, len2, 1.0)
+        t = np.clip(np.where(len2 > 0, t, 0.0), 0.0, 1.0)
+        ex, ey = ax + t * dx - px, ay + t * dy - py
+        return np.sqrt(ex * ex + ey * ey)
+
+    @staticmethod
+    def _merge(best_d: np.ndarray, best_l: np.ndarray, cand_p: np.ndarray, cand_d: np.ndarray, cand_l: np.ndarray, k: int):
+        """Funde candidatos nos top-k por ponto, mantendo uma entrada por lane.
+
+        Os candidatos chegam agrupados por ponto (cand_p não decrescente).
+        """
+        # Candidatos piores que o k-ésimo atual não podem entrar
+        better = cand_d < best_d[cand_p, k - 1]
+        cand_p, cand_d, cand_l = cand_p[better], cand_d[better], cand_l[better]
+        if not len(cand_p):
+            return
+
+        if k == 1:
+            # Caminho rápido: mínimo por grupo, sem ordenação
+            starts = np.flatnonzero(np.r_[True, cand_p[1:] != cand_p[:-1]])
+            mins = np.minimum.reduceat(cand_d, starts)
+            group = np.repeat(np.arange(len(starts)), np.diff(np.r_[starts, len(cand_p)]))
+            hit = np.flatnonzero(cand_d == mins[group])
+            _, first = np.unique(cand_p[hit], return_index=True)
+            chosen = hit[first]
+            best_d[cand_p[chosen], 0] = cand_d[chosen]
+            best_l[cand_p[chosen], 0] = cand_l[chosen]
+            return
+
+        points = np.unique(cand_p)
+        old_l = best_l[points].ravel()
+        valid = old_l >= 0
+        P = np.concatenate([np.repeat(points, k)[valid], cand_p])
+        D = np.concatenate([best_d[points].ravel()[valid], cand_d])
+        L = np.concatenate([old_l[valid], cand_l])
+
+        # Menor distância por (ponto, lane)
+        order = np.lexsort((D, L, P))
+        P, D, L = P[order], D[order], L[order]
+        first = np.ones(len(P), dtype=bool)
+        first[1:] = (P[1:] != P[:-1]) | (L[1:] != L[:-1])
+        P, D, L = P[first], D[first], L[first]
+
+        # Top-k por ponto
+        order = np.lexsort((D, P))
+        P, D, L = P[order], D[order], L[order]
+        rank = np.arange(len(P)) - np.searchsorted(P, P, side="left")
+        keep = rank < k
+
+        best_d[points] = np.inf
+        best_l[points] = -1
+        best_d[P[keep], rank[keep]] = D[keep]
+        best_l[P[keep], rank[keep]] = L[keep]
@@ -0,0 +1,314 @@
+"""Vector tiles (MVT) das redes SUMO, gerados sob demanda a partir do .netpack.
+
+Cada tile recorta a geometria das edges (já em Web Mercator) ao quadrado do
+tile com uma margem, simplifica com Douglas–Peucker em meio pixel e quantiza
+para a grade de EXTENT unidades. Os tiles gerados ficam num LRU em memória
+sobre um cache em disco; os zooms baixos são pré-gerados quando um mapa entra.
+"""
+import gzip
+import logging
+import math
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.disk_cache import DiskCache, content_hash
+from app.core.geojson_cache import douglas_peucker, edge_properties
+from app.core.mvt import EXTENT, LayerBuilder, encode_lines, encode_tile
+from app.core.net_cache import net_cache
+
+# Muda quando o conteúdo dos tiles muda (invalida as entradas antigas)
+TILE_VERSION = 1
+LAYER_NAME = "roads"
+# Margem em volta do tile (unidades do tile) para as linhas não serem cortadas na borda
+BUFFER = 64
+# Meio pixel de um tile de 256 px: limite da simplificação e tamanho mínimo de uma edge
+TOLERANCE = EXTENT / 512
+
+# Sempre comprimidos no cache; quem não aceita gzip recebe o tile descomprimido
+_EMPTY_TILE = gzip.compress(b"", mtime=0)
+
+
+def lonlat_to_world(lons: np.ndarray, lats: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Web Mercator normalizado: (0, 0) no canto noroeste do mundo, (1, 1) no sudeste."""
+    lats = np.clip(lats, -85.05112878, 85.05112878)
+    wx = (lons + 180.0) / 360.0
+    wy = (1.0 - np.arcsinh(np.tan(np.radians(lats))) / math.pi) / 2.0
+    return wx, wy
+
+
+def tile_range(bounds: List[float], z: int) -> Tuple[int, int, int, int]:
+    """Tiles (x0, y0, x1, y1), inclusivos, que cobrem bounds = [oeste, sul, leste, norte]."""
+    n = 1 << z
+    wx, wy = lonlat_to_world(np.array([bounds[0], bounds[2]]), np.array([bounds[3], bounds[1]]))
+    x0, x1 = (min(max(int(v * n), 0), n - 1) for v in wx)
+    y0, y1 = (min(max(int(v * n), 0), n - 1) for v in wy)
+    return x0, y0, x1, y1
+
+
+def _clip_segment(x0, y0, x1, y1, lo, hi):
+    """Liang–Barsky: trecho do segmento dentro do quadrado [lo, hi]², ou None."""
+    dx, dy = x1 - x0, y1 - y0
+    t0, t1 = 0.0, 1.0
+    for p, q in ((-dx, x0 - lo), (dx, hi - x0), (-dy, y0 - lo), (dy, hi - y0)):
+        if p == 0:
+            if q < 0:
+                return None
+            continue
+        t = q / p
+        if p < 0:
+            if t > t1:
+                return None
+            t0 = max(t0, t)
+        else:
+            if t < t0:
+                return None
+            t1 = min(t1, t)
+    # Extremos não cortados são devolvidos exatos, para emendar os segmentos
+    start = (x0, y0) if t0 == 0.0 else (x0 + t0 * dx, y0 + t0 * dy)
+    end = (x1, y1) if t1 == 1.0 else (x0 + t1 * dx, y0 + t1 * dy)
+    return start, end
+
+
+def clip_polyline(points: List[Tuple[float, float]], lo: float, hi: float) -> List[List[Tuple[float, float]]]:
+    """Partes da polilinha dentro do quadrado [lo, hi]² (uma linha pode sair e voltar)."""
+    parts: List[List[Tuple[float, float]]] = []
+    current: List[Tuple[float, float]] = []
+    for (x0, y0), (x1, y1) in zip(points[:-1], points[1:]):
+        clipped = _clip_segment(x0, y0, x1, y1, lo, hi)
+        if clipped is None:
+            if current:
+                parts.append(current)
+                current = []
+            continue
+        start, end = clipped
+        if current and current[-1] != start:
+            parts.append(current)
+            current = []
+        if not current:
+            current.append(start)
+        current.append(end)
+        if end != (x1, y1):
+            parts.append(current)
+            current = []
+    if current:
+        parts.append(current)
+    return parts
+
+
+def _quantize(part) -> Optional[List[Tuple[int, int]]]:
+    q = np.rint(np.asarray(part, dtype=np.float64)).astype(np.int64)
+    moved = np.any(q[1:] != q[:-1], axis=1)
+    q = q[np.concatenate(([True], moved))]
+    return [tuple(p) for p in q.tolist()] if len(q) >= 2 else None
+
+
+class TileSource:
+    """Geometria das edges de uma rede em Web Mercator normalizado, pronta para recorte."""
+
+    def __init__(self, net):
+        if not net.has_geo_proj():
+            raise ValueError("Network has no geo-projection")
+        shapes, edges = [], []
+        for e in range(net.num_edges):
+            shape = net.edge_shape(e)
+            if len(shape) >= 2:
+                shapes.append(shape)
+                edges.append(e)
+        self.properties = [edge_properties(net, e) for e in edges]
+        self.edges = np.asarray(edges, dtype=np.int64)
+        self.offsets = np.zeros(len(shapes) + 1, dtype=np.int64)
+        self.bounds: Optional[List[float]] = None
+        if not shapes:
+            self.points = np.empty((0, 2), dtype=np.float64)
+            self.bbox = np.empty((0, 4), dtype=np.float64)
+            return
+
+        self.offsets[1:] = np.cumsum([len(s) for s in shapes])
+        xy = np.concatenate(shapes)
+        lons, lats = net.convert_xy_to_lonlat_batch(xy[:, 0], xy[:, 1])
+        self.bounds = [float(lons.min()), float(lats.min()), float(lons.max()), float(lats.max())]
+        wx, wy = lonlat_to_world(lons, lats)
+        self.points = np.column_stack((wx, wy))
+        starts = self.offsets[:-1]
+        self.bbox = np.column_stack((
+            np.minimum.reduceat(wx, starts), np.minimum.reduceat(wy, starts),
+            np.maximum.reduceat(wx, starts), np.maximum.reduceat(wy, starts),
+        ))
+
+    @property
+    def nbytes(self) -> int:
+        return self.points.nbytes + self.bbox.nbytes + self.offsets.nbytes
+
+    def render(self, z: int, x: int, y: int) -> bytes:
+        """Tile MVT (sem compressão) com a camada de ruas."""
+        layer = LayerBuilder(LAYER_NAME)
+        scale = float(1 << z) * EXTENT
+        ox, oy = x * EXTENT, y * EXTENT
+        pad = BUFFER / scale
+        lo_x, lo_y = x / (1 << z) - pad, y / (1 << z) - pad
+        hi_x, hi_y = (x + 1) / (1 << z) + pad, (y + 1) / (1 << z) + pad
+
+        bbox = self.bbox
+        hit = (bbox[:, 2] >= lo_x) & (bbox[:, 0] <= hi_x) & (bbox[:, 3] >= lo_y) & (bbox[:, 1] <= hi_y)
+        # Edges menores que meio pixel neste zoom não aparecem
+        size = np.maximum(bbox[:, 2] - bbox[:, 0], bbox[:, 3] - bbox[:, 1]) * scale
+        for k in np.nonzero(hit & (size >= TOLERANCE))[0].tolist():
+            pts = self.points[self.offsets[k]:self.offsets[k + 1]] * scale - (ox, oy)
+            pts = pts[douglas_peucker(pts, TOLERANCE)]
+            inside = pts.min() >= -BUFFER and pts.max() <= EXTENT + BUFFER
+            parts = [pts] if inside else clip_polyline(pts.tolist(), -BUFFER, EXTENT + BUFFER)
+            lines = [q for q in (_quantize(p) for p in parts) if q is not None]
+            if lines:
+                layer.add(int(self.edges[k]), encode_lines(lines), self.properties[k])
+        return encode_tile([layer])
+
+
+class TileCache(DiskCache):
+    """Tiles gzip'ados: LRU em memória na frente das entradas em disco."""
+
+    suffix = ".pbf.gz"
+
+    def __init__(self, cache_dir: Optional[Path] = None, max_bytes: Optional[int] = None,
+                 memory_bytes: Optional[int] = None):
+        super().__init__(
+            cache_dir if cache_dir is not None else settings.TILE_CACHE_DIR,
+            max_bytes if max_bytes is not None else settings.TILE_CACHE_MAX_MB * 1024 * 1024,
+        )
+        self.memory_max_bytes = memory_bytes if memory_bytes is not None else settings.TILE_MEMORY_MAX_MB * 1024 * 1024
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_bytes = 0
+        self.memory_hits = 0
+        # Fontes de recorte por conteúdo do mapa (poucas: uma por mapa em uso)
+        self._sources: "OrderedDict[str, TileSource]" = OrderedDict()
+        self._seeder = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tile-seed")
+
+    def tile_key(self, net_file: Path, z: int, x: int, y: int) -> str:
+        return self.key_for(net_file, z=z, x=x, y=y, version=TILE_VERSION)
+
+    def source(self, net_file: Path) -> TileSource:
+        digest = content_hash(net_file)
+        with self._lock:
+            source = self._sources.get(digest)
+            if source is not None:
+                self._sources.move_to_end(digest)
+                return source
+        with self._single_flight(f"source:{digest}"):
+            with self._lock:
+                source = self._sources.get(digest)
+            if source is None:
+                source = TileSource(net_cache.get(net_file))
+                with self._lock:
+                    self._sources[digest] = source
+                    while len(self._sources) > settings.TILE_SOURCES_MAX:
+                        self._sources.popitem(last=False)
+        return source
+
+    def tile(self, net_file: Path, z: int, x: int, y: int) -> bytes:
+        """Tile gzip'ado: memória, depois disco, e por fim gerado (uma vez por chave)."""
+        key = self.tile_key(net_file, z, x, y)
+        data = self._memory_get(key)
+        if data is not None:
+            return data
+        data = self._disk_get(key)
+        if data is None:
+            with self._single_flight(key):
+                data = self._memory_get(key) or self._disk_get(key)
+                if data is None:
+                    self.record_miss()
+                    data = self._render(net_file, z, x, y)
+                    if self.enabled:
+                        self.store(key, lambda f: f.write(data))
+        self._memory_put(key, data)
+        return data
+
+    def seed(self, net_file: Path, max_zoom: Optional[int] = None) -> int:
+        """Gera os tiles de zoom 0 a `max_zoom` que cobrem o mapa; devolve quantos."""
+        max_zoom = settings.TILE_SEED_MAX_ZOOM if max_zoom is None else max_zoom
+        bounds = self.source(net_file).bounds
+        if bounds is None:
+            return 0
+        count = 0
+        for z in range(max_zoom + 1):
+            x0, y0, x1, y1 = tile_range(bounds, z)
+            for x in range(x0, x1 + 1):
+                for y in range(y0, y1 + 1):
+                    self.tile(net_file, z, x, y)
+                    count += 1
+        return count
+
+    def seed_async(self, net_file: Path):
+        """Pré-gera os zooms baixos em segundo plano (mapa novo ou servidor iniciando)."""
+        if settings.TILE_SEED_MAX_ZOOM < 0:
+            return
+
+        def task():
+            try:
+                count = self.seed(net_file)
+                logging.info(f"Tile cache: seeded {count} tiles for {Path(net_file).name}")
+            except Exception as e:
+                logging.warning(f"Tile cache: seeding {Path(net_file).name} failed: {e}")
+
+        self._seeder.submit(task)
+
+    def shutdown(self):
+        self._seeder.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        with self._lock:
+            stats.update({
+                "memory_entries": len(self._memory),
+                "memory_hits": self.memory_hits,
+                "memory_bytes": self._memory_bytes,
+                "memory_max_bytes": self.memory_max_bytes,
+                "sources": len(self._sources),
+            })
+        return stats
+
+    # --- Internos ---
+
+    def _render(self, net_file: Path, z: int, x: int, y: int) -> bytes:
+        source = self.source(net_file)
+        data = source.render(z, x, y)
+        return gzip.compress(data, mtime=0) if data else _EMPTY_TILE
+
+    def _disk_get(self, key: str) -> Optional[bytes]:
+        if not self.enabled:
+            return None
+        path = self.lookup(key)
+        if path is None:
+            return None
+        try:
+            return path.read_bytes()
+        except OSError:
+            # Removida por outro worker entre o lookup e a leitura
+            return None
+
+    def _memory_get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+            return data
+
+    def _memory_put(self, key: str, data: bytes):
+        if self.memory_max_bytes <= 0:
+            return
+        with self._lock:
+            if key in self._memory:
+                return
+            self._memory[key] = data
+            self._memory_bytes += len(data)
+            while self._memory_bytes > self.memory_max_bytes and self._memory:
+                _, old = self._memory.popitem(last=False)
+                self._memory_bytes -= len(old)
+
+
+# Instância única do processo, usada pelo endpoint de tiles
+tile_cache = TileCache()
@@ -0,0 +1,171 @@
+import asyncio
+import contextvars
+import logging
+import math
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import AsyncIterator, Callable, Iterable, Iterator, List, Optional, Tuple, TypeVar
+
+from app.core.config import settings
+
+T = TypeVar("T")
+
+# Bytes produzidos por tarefa ao transmitir um iterador pelo pool (ver WorkerPool.stream)
+STREAM_BATCH_BYTES = 1024 * 1024
+
+
+class PoolSaturated(Exception):
+    """Fila de geração cheia; o cliente deve tentar de novo após `retry_after` segundos."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Generation queue is full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class WorkerPool:
+    """Pool limitado de threads para o trabalho síncrono de geração de cenários.
+
+    Os endpoints `async` delegam a geração para cá, liberando o event loop para
+    as demais requisições. Aceita no máximo `max_workers` tarefas em execução e
+    `max_queue` aguardando; acima disso `run` levanta PoolSaturated em vez de
+    enfileirar indefinidamente.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, max_queue: Optional[int] = None,
+                 thread_name_prefix: str = "sim-worker"):
+        self.max_workers = max_workers or settings.WORKER_POOL_SIZE
+        self.max_queue = max_queue if max_queue is not None else settings.WORKER_QUEUE_MAX
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=thread_name_prefix)
+
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.in_flight = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._run_total = 0.0
+
+    def submit(self, fn: Callable[..., T], *args, **kwargs) -> "Future[T]":
+        """Enfileira `fn(*args, **kwargs)` no pool, sem aguardar (usado pelos jobs)."""
+        return self._submit(fn, args, kwargs, admit=True)
+
+    def _submit(self, fn: Callable[..., T], args, kwargs, admit: bool) -> "Future[T]":
+        # admit=False: continuação de um trabalho já aceito, nunca recusada
+        with self._lock:
+            if admit and self.queued + self.in_flight >= self.max_workers + self.max_queue:
+                self.rejected += 1
+                raise PoolSaturated(self._retry_after())
+            self.queued += 1
+            self.submitted += 1
+        enqueued_at = time.perf_counter()
+
+        def task():
+            started_at = time.perf_counter()
+            with self._lock:
+                self.queued -= 1
+                self.in_flight += 1
+                wait = started_at - enqueued_at
+                self._wait_total += wait
+                self._wait_max = max(self._wait_max, wait)
+            ok = False
+            try:
+                result = fn(*args, **kwargs)
+                ok = True
+                return result
+            finally:
+                with self._lock:
+                    self.in_flight -= 1
+                    self._run_total += time.perf_counter() - started_at
+                    if ok:
+                        self.completed += 1
+                    else:
+                        self.failed += 1
+
+        # A tarefa herda o contexto de quem enfileirou (ex.: etapas da requisição no Server-Timing)
+        return self._executor.submit(contextvars.copy_context().run, task)
+
+    async def run(self, fn: Callable[..., T], *args, **kwargs) -> T:
+        """Executa `fn(*args, **kwargs)` no pool e aguarda o resultado."""
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def stream(self, chunks: Iterable[bytes], batch_bytes: int = STREAM_BATCH_BYTES) -> AsyncIterator[bytes]:
+        """Consome `chunks` (ex.: a compressão de um ZIP) nas threads do pool, em lotes de
+        ~`batch_bytes`, para uma resposta em streaming.
+
+        O próximo lote é produzido enquanto o atual é enviado; nenhuma thread fica
+        presa esperando um cliente lento. Só o primeiro lote passa pelo limite da
+        fila (PoolSaturated é levantada aqui, antes de a resposta começar).
+        """
+        it = iter(chunks)
+        return self._drain(it, self.submit(_next_batch, it, batch_bytes), batch_bytes)
+
+    async def _drain(self, it: Iterator[bytes], future: "Future", batch_bytes: int) -> AsyncIterator[bytes]:
+        try:
+            while True:
+                batch, done = await asyncio.wrap_future(future)
+                if done:
+                    for chunk in batch:
+                        yield chunk
+                    return
+                future = self._submit(_next_batch, (it, batch_bytes), {}, admit=False)
+                for chunk in batch:
+                    yield chunk
+        finally:
+            # Cliente desconectado: fecha o iterador depois do lote em andamento
+            close = getattr(it, "close", None)
+            if close is not None:
+                future.add_done_callback(lambda _: close())
+
+    def stats(self) -> dict:
+        with self._lock:
+            started = self.completed + self.failed + self.in_flight
+            finished = self.completed + self.failed
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "queue_depth": self.queued,
+                "in_flight": self.in_flight,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "avg_wait_seconds": (self._wait_total / started) if started else 0.0,
+                "max_wait_seconds": self._wait_max,
+                "avg_run_seconds": (self._run_total / finished) if finished else 0.0,
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    # --- Internos (chamados com self._lock adquirido) ---
+
+    def _retry_after(self) -> int:
+        # Estimativa: tempo para esvaziar a fila com a duração média observada
+        finished = self.completed + self.failed
+        avg_run = (self._run_total / finished) if finished else 0.0
+        estimate = math.ceil(avg_run * (self.queued + 1) / self.max_workers)
+        retry_after = max(settings.WORKER_RETRY_AFTER, estimate)
+        logging.warning(f"Worker pool saturated ({self.in_flight} running, {self.queued} queued), retry after {retry_after}s")
+        return retry_after
+
+
+def _next_batch(it: Iterator[bytes], batch_bytes: int) -> Tuple[List[bytes], bool]:
+    """Próximos blocos do iterador até somar `batch_bytes`; o segundo valor indica o fim."""
+    batch, size = [], 0
+    for chunk in it:
+        batch.append(chunk)
+        size += len(chunk)
+        if size >= batch_bytes:
+            return batch, False
+    return batch, True
+
+
+# Instância única do processo, usada pelos endpoints de geração
+worker_pool = WorkerPool()
+# Jobs de mapa (geocode, download e netconvert, por minutos): pool próprio do tamanho
+# do limite de netconverts, para não ocupar as threads de geração de cenários
+map_pool = WorkerPool(max_workers=max(1, settings.NETCONVERT_MAX_PROCS), thread_name_prefix="map-worker")
@@ -0,0 +1,310 @@
+"""Escrita de ZIP em streaming: os bytes comprimidos saem à medida que cada
+membro é escrito, sem montar o arquivo inteiro em memória."""
+import bz2
+import io
+import lzma
+import struct
+import time
+import zipfile
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Iterable, Iterator, Optional, Tuple, Union
+
+from app.core.config import settings
+
+
+@dataclass(frozen=True)
+class Precompressed:
+    """Membro já comprimido: o fluxo cru (sem cabeçalho ZIP) está em `data_path`
+    a partir de `offset` e é copiado para o ZIP sem recompressão."""
+    source: Path  # arquivo original, comprimido normalmente se a cópia sumir
+    data_path: Path
+    offset: int
+    compress_type: int
+    compress_level: Optional[int]  # nível configurado, usado se for preciso recomprimir
+    crc: int
+    file_size: int
+    compress_size: int
+    date_time: Tuple[int, int, int, int, int, int]
+    external_attr: int
+
+
+# Conteúdo de um membro: texto/bytes já gerados, caminho de um arquivo em disco
+# ou cópia pré-comprimida
+ZipContent = Union[str, bytes, Path, Precompressed]
+ZipMember = Tuple[str, ZipContent]
+# (método do zipfile, nível ou None para o padrão do método)
+Compression = Tuple[int, Optional[int]]
+
+CHUNK_SIZE = 64 * 1024
+
+_METHODS = {
+    "stored": zipfile.ZIP_STORED,
+    "deflated": zipfile.ZIP_DEFLATED,
+    "bzip2": zipfile.ZIP_BZIP2,
+    "lzma": zipfile.ZIP_LZMA,
+}
+
+
+def parse_compression(spec: str) -> Compression:
+    """"deflated:9" -> (ZIP_DEFLATED, 9); o nível é opcional."""
+    method, _, level = spec.strip().lower().partition(":")
+    if method not in _METHODS:
+        raise ValueError(f"Unknown ZIP compression method: {method!r}")
+    return _METHODS[method], int(level) if level else None
+
+
+def compression_for(name: str) -> Compression:
+    """Compressão do membro segundo settings.ZIP_COMPRESSION (sufixo mais longo; "*" é o padrão)."""
+    policy = settings.ZIP_COMPRESSION
+    matches = [suffix for suffix in policy if suffix != "*" and name.endswith(suffix)]
+    if matches:
+        return parse_compression(policy[max(matches, key=len)])
+    if "*" in policy:
+        return parse_compression(policy["*"])
+    return zipfile.ZIP_DEFLATED, None
+
+
+# Registros do formato ZIP (APPNOTE.TXT); montados aqui para não depender de
+# internos do zipfile, que mudam entre versões do Python
+_DATA_DESCRIPTOR = struct.Struct("<4sLLL")
+_DATA_DESCRIPTOR64 = struct.Struct("<4sLQQ")
+_CENTRAL_DIR = struct.Struct("<4s4B4HL2L5H2L")
+_END_RECORD = struct.Struct("<4s4H2LH")
+_END_RECORD64 = struct.Struct("<4sQ2H2L4Q")
+_END_LOCATOR64 = struct.Struct("<4sLQL")
+_FLAG_LZMA_EOS = 0x02
+_FLAG_DATA_DESCRIPTOR = 0x08
+_FLAG_UTF8 = 0x800
+_ZIP64_VERSION = 45
+_MIN_VERSION = {zipfile.ZIP_BZIP2: 46, zipfile.ZIP_LZMA: 63}
+_MAX_UINT16 = 0xFFFF
+_MAX_UINT32 = 0xFFFFFFFF
+# Dicionário do LZMA1 por preset (lc=3, lp=0, pb=2 em todos)
+_LZMA_DICT_SIZE = [1 << 18, 1 << 20, 1 << 21, 1 << 22, 1 << 22, 1 << 23, 1 << 23, 1 << 24, 1 << 25, 1 << 26]
+
+
+class _Stored:
+    def compress(self, data: bytes) -> bytes:
+        return bytes(data)
+
+    def flush(self) -> bytes:
+        return b""
+
+
+class _LzmaCompressor:
+    """LZMA1 cru precedido do cabeçalho de propriedades que o ZIP exige (o mesmo do zipfile)."""
+
+    def __init__(self, level: Optional[int]):
+        preset = 6 if level is None else level
+        dict_size = _LZMA_DICT_SIZE[preset]
+        self._compressor = lzma.LZMACompressor(lzma.FORMAT_RAW, filters=[
+            {"id": lzma.FILTER_LZMA1, "preset": preset, "dict_size": dict_size, "lc": 3, "lp": 0, "pb": 2},
+        ])
+        props = bytes([(2 * 5 + 0) * 9 + 3]) + dict_size.to_bytes(4, "little")
+        self._header = struct.pack("<BBH", 9, 4, len(props)) + props
+
+    def compress(self, data: bytes) -> bytes:
+        header, self._header = self._header, b""
+        return header + self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        header, self._header = self._header, b""
+        return header + self._compressor.flush()
+
+
+def compressor_for(compression: Compression):
+    """Compressor (compress/flush) que produz o fluxo do membro como o zipfile produziria."""
+    method, level = compression
+    if method == zipfile.ZIP_STORED:
+        return _Stored()
+    if method == zipfile.ZIP_DEFLATED:
+        return zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION if level is None else level, zlib.DEFLATED, -15)
+    if method == zipfile.ZIP_BZIP2:
+        return bz2.BZ2Compressor(9 if level is None else level)
+    if method == zipfile.ZIP_LZMA:
+        return _LzmaCompressor(level)
+    raise ValueError(f"Unsupported ZIP compression method: {method}")
+
+
+def _member_info(name: str, content: ZipContent, method: int) -> zipfile.ZipInfo:
+    if isinstance(content, Path):
+        info = zipfile.ZipInfo.from_file(content, name)
+    else:
+        # Mesmos metadados que ZipFile.writestr
+        info = zipfile.ZipInfo(filename=name, date_time=time.localtime(time.time())[:6])
+        info.external_attr = 0o600 << 16
+        info.file_size = len(content)
+    info.compress_type = method
+    if method == zipfile.ZIP_LZMA:
+        # Fluxo LZMA inclui marcador de fim
+        info.flag_bits |= _FLAG_LZMA_EOS
+    return info
+
+
+class _ZipWriter:
+    """Monta o ZIP em sequência: cabeçalho local, dados e, no fim, o diretório central.
+
+    Usa só a parte pública do zipfile (ZipInfo e FileHeader); o destino não
+    precisa ser posicionável (tamanhos e CRC dos membros comprimidos aqui vão
+    num data descriptor após os dados, como o zipfile faz nesse caso).
+    """
+
+    def __init__(self):
+        self.offset = 0
+        self.entries = []
+
+    def _emit(self, data: bytes) -> bytes:
+        self.offset += len(data)
+        return data
+
+    def member(self, name: str, content: ZipContent, compression: Compression) -> Iterator[bytes]:
+        """Comprime e escreve um membro, cedendo a cada bloco de CHUNK_SIZE bytes de entrada."""
+        if isinstance(content, Precompressed):
+            yield from self.precompressed(name, content)
+            return
+        if isinstance(content, str):
+            content = content.encode()
+        info = _member_info(name, content, compression[0])
+        info.flag_bits |= _FLAG_DATA_DESCRIPTOR
+        # Mesmo critério do zipfile para reservar campos zip64 no cabeçalho local
+        zip64 = info.file_size * 1.05 > zipfile.ZIP64_LIMIT
+        info.header_offset = self.offset
+        yield self._emit(info.FileHeader(zip64))
+
+        compressor = compressor_for(compression)
+        crc = file_size = compress_size = 0
+        if isinstance(content, Path):
+            src = open(content, "rb")
+            blocks = iter(lambda: src.read(CHUNK_SIZE), b"")
+        else:
+            src = None
+            view = memoryview(content)
+            blocks = (view[start:start + CHUNK_SIZE] for start in range(0, len(view), CHUNK_SIZE))
+        try:
+            for block in blocks:
+                crc = zlib.crc32(block, crc)
+                file_size += len(block)
+                data = compressor.compress(block)
+                compress_size += len(data)
+                if data:
+                    yield self._emit(data)
+        finally:
+            if src is not None:
+                src.close()
+        data = compressor.flush()
+        compress_size += len(data)
+
+        if not zip64 and max(file_size, compress_size) > zipfile.ZIP64_LIMIT:
+            raise RuntimeError(f"{name}: file size too large for a ZIP without zip64 fields")
+        info.CRC, info.file_size, info.compress_size = crc, file_size, compress_size
+        descriptor = _DATA_DESCRIPTOR64 if zip64 else _DATA_DESCRIPTOR
+        yield self._emit(data + descriptor.pack(b"PK\x07\x08", crc, compress_size, file_size))
+        self.entries.append(info)
+
+    def precompressed(self, name: str, member: Precompressed) -> Iterator[bytes]:
+        """Copia o fluxo já comprimido, com CRC e tamanhos conhecidos no cabeçalho local."""
+        try:
+            src = open(member.data_path, "rb")
+        except FileNotFoundError:
+            # Cópia removida do cache entre a geração dos membros e o envio
+            yield from self.member(name, member.source, (member.compress_type, member.compress_level))
+            return
+
+        with src:
+            src.seek(member.offset)
+            info = zipfile.ZipInfo(filename=name, date_time=member.date_time)
+            info.external_attr = member.external_attr
+            info.compress_type = member.compress_type
+            if member.compress_type == zipfile.ZIP_LZMA:
+                info.flag_bits |= _FLAG_LZMA_EOS
+            info.CRC = member.crc
+            info.file_size = member.file_size
+            info.compress_size = member.compress_size
+            info.header_offset = self.offset
+            yield self._emit(info.FileHeader())
+
+            remaining = member.compress_size
+            while remaining:
+                block = src.read(min(CHUNK_SIZE, remaining))
+                if not block:
+                    raise OSError(f"Precompressed data for {name} is truncated")
+                remaining -= len(block)
+                yield self._emit(block)
+        self.entries.append(info)
+
+    def central_directory(self) -> bytes:
+        """Diretório central e registros de fim (zip64 quando algum limite é excedido)."""
+        start = self.offset
+        data = b"".join(self._central_record(info) for info in self.entries)
+        size, count = len(data), len(self.entries)
+
+        if count > _MAX_UINT16 or size > zipfile.ZIP64_LIMIT or start > zipfile.ZIP64_LIMIT:
+            end64_offset = start + size
+            data += _END_RECORD64.pack(
+                b"PK\x06\x06", _END_RECORD64.size - 12, _ZIP64_VERSION, _ZIP64_VERSION, 0, 0, count, count, size, start,
+            )
+            data += _END_LOCATOR64.pack(b"PK\x06\x07", 0, end64_offset, 1)
+            count, size, start = min(count, _MAX_UINT16), min(size, _MAX_UINT32), min(start, _MAX_UINT32)
+        data += _END_RECORD.pack(b"PK\x05\x06", 0, 0, count, count, size, start, 0)
+        return self._emit(data)
+
+    @staticmethod
+    def _central_record(info: zipfile.ZipInfo) -> bytes:
+        # Campos que não cabem em 32 bits vão no extra zip64 (id 1), na ordem da especificação
+        extra = []
+        file_size, compress_size, header_offset = info.file_size, info.compress_size, info.header_offset
+        if file_size > zipfile.ZIP64_LIMIT or compress_size > zipfile.ZIP64_LIMIT:
+            extra += [file_size, compress_size]
+            file_size = compress_size = _MAX_UINT32
+        if header_offset > zipfile.ZIP64_LIMIT:
+            extra.append(header_offset)
+            header_offset = _MAX_UINT32
+        extra_data = info.extra
+        min_version = _MIN_VERSION.get(info.compress_type, 0)
+        if extra:
+            extra_data = struct.pack(f"<HH{len(extra)}Q", 1, 8 * len(extra), *extra) + extra_data
+            min_version = max(min_version, _ZIP64_VERSION)
+
+        try:
+            filename, flag_bits = info.filename.encode("ascii"), info.flag_bits
+        except UnicodeEncodeError:
+            filename, flag_bits = info.filename.encode("utf-8"), info.flag_bits | _FLAG_UTF8
+        year, month, day, hour, minute, second = info.date_time
+        dosdate = (year - 1980) << 9 | month << 5 | day
+        dostime = hour << 11 | minute << 5 | (second // 2)
+        record = _CENTRAL_DIR.pack(
+            b"PK\x01\x02", max(min_version, info.create_version), info.create_system,
+            max(min_version, info.extract_version), info.reserved, flag_bits, info.compress_type,
+            dostime, dosdate, info.CRC, compress_size, file_size, len(filename), len(extra_data),
+            len(info.comment), 0, info.internal_attr, info.external_attr, header_offset,
+        )
+        return record + filename + extra_data + info.comment
+
+
+def iter_zip(members: Iterable[ZipMember], compression: Optional[int] = None) -> Iterator[bytes]:
+    """Gera o ZIP em blocos. `members` pode ser um gerador: cada membro só é
+    produzido quando o anterior já foi enviado.
+
+    Sem `compression`, cada membro segue settings.ZIP_COMPRESSION; membros
+    Precompressed entram como estão.
+    """
+    writer = _ZipWriter()
+    for name, content in members:
+        member_compression = compression_for(name) if compression is None else (compression, None)
+        yield from writer.member(name, content, member_compression)
+    yield writer.central_directory()
+
+
+def write_zip(members: Iterable[ZipMember], fileobj: BinaryIO, compression: Optional[int] = None):
+    """Escreve o ZIP completo em `fileobj` (arquivo ou BytesIO)."""
+    for chunk in iter_zip(members, compression):
+        fileobj.write(chunk)
+
+
+def zip_to_buffer(members: Iterable[ZipMember], compression: Optional[int] = None) -> io.BytesIO:
+    buffer = io.BytesIO()
+    write_zip(members, buffer, compression)
+    buffer.seek(0)
+    return buffer
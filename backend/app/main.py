@@ -1,8 +1,16 @@
-from fastapi import FastAPI
+import threading
+
+from fastapi import FastAPI, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.api import simulation_router, map_router, utility_router
+from app.api import simulation_router, map_router, utility_router, job_router
+from app.core import metrics
 from app.core.config import settings # Importa para garantir que foi carregado
+from app.core.map_catalog import map_catalog
+from app.core.tile_cache import tile_cache
+from app.core.worker_pool import map_pool, worker_pool
+from app.services.job_service import job_service
+from app.services.osm_cache import osm_cache
 
 app = FastAPI(
     title="B5G Cyber Test V2X Backend",
@@ -19,13 +27,48 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Contagem das requisições e cabeçalho Server-Timing (por fora do CORS, mede a resposta inteira)
+if settings.METRICS_ENABLED:
+    app.add_middleware(metrics.MetricsMiddleware)
+
 # Inclui os routers
 app.include_router(simulation_router.router)
 app.include_router(map_router.router)
 app.include_router(utility_router.router)
+app.include_router(job_router.router)
+
+@app.on_event("startup")
+def resume_jobs():
+    # Limpa artefatos expirados (agora e periodicamente) e retoma jobs interrompidos por um restart
+    job_service.cleanup()
+    job_service.resume()
+    job_service.start_cleanup()
+
+@app.on_event("startup")
+def index_maps():
+    # Mapas novos ou alterados entram no catálogo e têm os zooms baixos dos tiles pré-gerados
+    map_catalog.subscribe(tile_cache.seed_async)
+    threading.Thread(target=map_catalog.refresh, kwargs={"force": True}, name="map-catalog", daemon=True).start()
+
+@app.on_event("shutdown")
+def shutdown_worker_pool():
+    job_service.stop_cleanup()
+    worker_pool.shutdown()
+    map_pool.shutdown()
+    tile_cache.shutdown()
+    map_catalog.close()
+    job_service.store.close()
+    osm_cache.close()
 
 @app.get("/")
 async def read_root():
     return {"message": "Welcome to the V2X Simulation API v2.0"}
 
+@app.get("/metrics", include_in_schema=False)
+def read_metrics():
+    """Métricas no formato texto do Prometheus."""
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
 # Para rodar: uvicorn app.main:app --reload --port 8000
\ No newline at end of file
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from typing import List, Literal, Optional, Dict, Any
 
 class ExpertNode(BaseModel):
     id: int               # ID visual (timestamp)
@@ -19,4 +19,9 @@ class ExpertSimulationPayload(BaseModel):
     # --- CAMPO QUE ESTAVA FALTANDO OU COM ERRO ---
     num_random_vehicles: int = 0  # Default 0 para não quebrar se o front não enviar
     
-    nodes_list: List[ExpertNode]
\ No newline at end of file
+    nodes_list: List[ExpertNode]
+    # Rotas sem caminho possível: "resnap" (move a ponta para a malha principal) ou "error" (422)
+    od_policy: Literal["resnap", "error"] = "resnap"
+
+    # "reference": o ZIP leva só map.json + fetch_map.py em vez do .net.xml
+    package_mode: Literal["embedded", "reference"] = "embedded"
@@ -0,0 +1,32 @@
+from pydantic import BaseModel, Field
+from typing import Any, Dict, Literal, Optional
+
+JobKind = Literal["simple", "advanced", "expert", "map"]
+
+class JobRequest(BaseModel):
+    kind: JobKind = Field(..., description="simple, advanced, expert or map")
+    payload: Dict[str, Any]  # Mesmo corpo do endpoint síncrono correspondente
+
+class MapGenerationPayload(BaseModel):
+    city_name: str = Field(..., min_length=1, description="Name of the city (e.g., 'Porto Alegre')")
+    size_km: float = Field(2.0, gt=0, description="Side length of the square area in KM")
+
+class JobStage(BaseModel):
+    status: str           # 'running', 'done', 'skipped', 'failed' ou 'cancelled'
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    seconds: Optional[float] = None  # Duração medida da etapa
+    progress: Optional[float] = None  # Andamento da etapa em execução (0..1), quando relatado
+
+class JobStatus(BaseModel):
+    id: str
+    kind: JobKind
+    status: str           # 'queued', 'running', 'succeeded', 'failed', 'cancelled'
+    stage: Optional[str] = None
+    progress: float = 0.0  # Fração de etapas concluídas (0..1), com o andamento parcial da atual
+    stages: Dict[str, JobStage] = Field(default_factory=dict)
+    error: Optional[str] = None
+    filename: Optional[str] = None
+    created_at: float
+    updated_at: float
+    finished_at: Optional[float] = None
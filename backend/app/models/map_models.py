@@ -0,0 +1,21 @@
+from pydantic import BaseModel
+from typing import List, Optional
+
+class MapMeta(BaseModel):
+    name: str
+    size: int                       # Bytes do .net.xml
+    sha256: str
+    mtime: float
+    bounds: Optional[List[float]] = None  # [oeste, sul, leste, norte] em graus; None sem projeção
+    projection: Optional[str] = None      # projParameter do <location>
+    num_edges: int
+    num_lanes: int
+    num_junctions: int
+    road_length_m: float            # Soma dos comprimentos das edges
+    indexed_at: float
+
+class MapCatalogPage(BaseModel):
+    total: int                      # Mapas que passam nos filtros
+    offset: int
+    limit: int
+    items: List[MapMeta]
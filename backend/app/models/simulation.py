@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import List, Literal, Optional
 
 # --- Sub-models ---
 
@@ -59,6 +59,11 @@ class AdvancedSimulationPayload(BaseModel):
     rsus_list: List[LatLng] = Field(default_factory=list)
     
     fixed_routes_list: List[FixedRoute] = Field(default_factory=list)
+    # Rotas sem caminho possível: "resnap" (move a ponta para a malha principal) ou "error" (422)
+    od_policy: Literal["resnap", "error"] = "resnap"
+
+    # "reference": o ZIP leva só map.json + fetch_map.py em vez do .net.xml
+    package_mode: Literal["embedded", "reference"] = "embedded"
 
 # Simple Payload (Legacy support)
 class SimulationPayload(BaseModel):
@@ -72,4 +77,5 @@ class SimulationPayload(BaseModel):
     app_params: AppParams = Field(default_factory=AppParams)
     net_params: NetParams = Field(default_factory=NetParams)
     execute_with_attack: bool = False
-    jamming_params: Optional[JammingParams] = Field(default_factory=JammingParams)
\ No newline at end of file
+    jamming_params: Optional[JammingParams] = Field(default_factory=JammingParams)
+    package_mode: Literal["embedded", "reference"] = "embedded"
@@ -0,0 +1,17 @@
+from pydantic import BaseModel, Field
+from typing import Any, Dict, List, Literal
+
+class SweepAxis(BaseModel):
+    # Caminho do parâmetro no payload base, com "." entre níveis.
+    # Listas aceitam índice ou "*" (todos os elementos): "nodes_list.*.params.txPower"
+    param: str = Field(..., example="jamming_params.power_dbm")
+    values: List[Any] = Field(..., min_length=1, example=[20, 30, 40])
+
+class SweepRequest(BaseModel):
+    kind: Literal["advanced", "expert"]
+    base: Dict[str, Any]  # AdvancedSimulationPayload ou ExpertSimulationPayload
+    axes: List[SweepAxis] = Field(..., min_length=1)
+
+    @property
+    def map_name(self) -> str:
+        return str(self.base.get("map_name", ""))
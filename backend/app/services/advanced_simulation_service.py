@@ -1,10 +1,10 @@
 import io
-import zipfile
-import subprocess
 import os
 import logging
 from pathlib import Path
-from datetime import datetime
+from typing import List, Optional
+
+import numpy as np
 
 try:
     import sumolib
@@ -13,7 +13,15 @@ except ImportError:
     sumolib = None
 
 from app.models.simulation import AdvancedSimulationPayload
+from app.core import metrics
 from app.core.config import settings
+from app.core.net_cache import net_cache
+from app.core.progress import tracked_stage
+from app.core.zip_stream import ZipMember, zip_to_buffer
+from app.services.ini_writer import IniWriter
+from app.services.od_check import check_od
+from app.services.pipeline import scenario_pipeline
+from app.services.trip_generator import random_trips_xml
 from app.services.simulation_service import SimulationService 
 
 class AdvancedSimulationService(SimulationService):
@@ -28,35 +36,36 @@ class AdvancedSimulationService(SimulationService):
         net_file = settings.SUMO_MAPS_DIR / map_name
         if not net_file.exists():
             raise FileNotFoundError(f"Map file not found: {net_file}")
-        self.net = sumolib.net.readNet(str(net_file))
+        self.net = net_cache.get(net_file)
+
+    @staticmethod
+    def _latlng_of(point):
+        if hasattr(point, 'lat'): return float(point.lat), float(point.lng)
+        if isinstance(point, dict): return float(point['lat']), float(point['lng'])
+        return float('nan'), float('nan')
 
-    def _convert_latlng_to_xy(self, latlng):
+    def _convert_latlng_to_xy_batch(self, points):
+        """Converte uma lista de LatLng (ou dicts) para X/Y do SUMO numa única chamada."""
         if not self.net: raise Exception("SUMO net not loaded.")
+        coords = np.asarray([self._latlng_of(p) for p in points], dtype=np.float64).reshape(-1, 2)
+        lats, lngs = coords[:, 0], coords[:, 1]
         try:
-            lng, lat = float(latlng.lng), float(latlng.lat)
-            if hasattr(self.net, 'convertGeoToXY'):
-                return self.net.convertGeoToXY(lng, lat)
-            elif hasattr(self.net, 'convertLonLat2XY'):
-                return self.net.convertLonLat2XY(lng, lat)
-            return lng, lat
+            if self.net.has_geo_proj():
+                return self.net.convert_lonlat_to_xy_batch(lngs, lats)
+            return lngs, lats
         except Exception as e:
             logging.warning(f"Coord conversion error: {e}")
-            return float(latlng.lng), float(latlng.lat)
+            return lngs, lats
 
-    def _convert_latlng_to_edge(self, latlng) -> str:
+    def _convert_xy_to_edges(self, xs, ys) -> np.ndarray:
+        """Índices das edges mais próximas de cada ponto X/Y."""
         if not self.net: raise Exception("SUMO net not loaded.")
-        x, y = self._convert_latlng_to_xy(latlng)
-        
-        # Tenta achar rua num raio de 50m, depois 200m
-        lanes = self.net.getNeighboringLanes(x, y, 50) 
-        if not lanes: lanes = self.net.getNeighboringLanes(x, y, 200)
-        
-        if not lanes:
-             # Fallback seguro: pega primeira edge do mapa para não quebrar
-             return list(self.net.getEdges())[0].getID()
+        # Rua mais próxima (sem raio limite) entre as lanes que permitem carros de passeio
+        edge_idx, dists = self.net.nearest_edges(xs, ys, passenger_only=True)
+        if np.any(dists > 200):
+            logging.warning(f"{int(np.sum(dists > 200))} point(s) farther than 200m from any road; snapped to the nearest one.")
 
-        closest_lane, dist = min(lanes, key=lambda l: l[1])
-        return closest_lane.getEdge().getID()
+        return np.maximum(edge_idx, 0)
 
     # --- XML GENERATORS ---
 
@@ -67,39 +76,61 @@ class AdvancedSimulationService(SimulationService):
     <multicast-group hosts="**" address="224.0.0.1"/>
 </config>"""
 
-    def _generate_fixed_routes_xml(self, sim_dir: Path) -> Path:
-        route_file = sim_dir / "fixed.rou.xml"
-        with open(route_file, "w") as f:
-            f.write('<routes>\n')
-            f.write('  <vType id="fixed_fleet" accel="2.6" decel="4.5" sigma="0.5" length="5" maxSpeed="70"/>\n')
-            
-            for i, route in enumerate(self.payload.fixed_routes_list):
-                try:
-                    from_edge = self._convert_latlng_to_edge(route.start)
-                    to_edge = self._convert_latlng_to_edge(route.end)
-                    if from_edge == to_edge: continue
-                    
-                    # Usa flow para tráfego contínuo na rota
-                    f.write(f'  <flow id="fixed_{i}" type="fixed_fleet" begin="0" end="{self.payload.simulation_time}" number="{route.count}" from="{from_edge}" to="{to_edge}"/>\n')
-                except Exception as e:
-                    logging.error(f"Error generating fixed route {i}: {e}")
-            f.write("</routes>\n")
-        return route_file
-
-    def _generate_random_routes_xml(self, sim_dir: Path) -> Path:
-        route_file = sim_dir / "random.rou.xml"
+    def _generate_fixed_routes_xml(self) -> str:
+        f = io.StringIO()
+        f.write('<routes>\n')
+        f.write('  <vType id="fixed_fleet" accel="2.6" decel="4.5" sigma="0.5" length="5" maxSpeed="70"/>\n')
+        
+        routes = self.payload.fixed_routes_list
+        start_xs, start_ys = self._convert_latlng_to_xy_batch([r.start for r in routes])
+        end_xs, end_ys = self._convert_latlng_to_xy_batch([r.end for r in routes])
+        # Pares sem rota são re-encaixados (ou recusados) antes do roteamento
+        from_idx, to_idx = check_od(
+            self.net,
+            self._convert_xy_to_edges(start_xs, start_ys), self._convert_xy_to_edges(end_xs, end_ys),
+            (start_xs, start_ys), (end_xs, end_ys),
+            [f"fixed route {i}" for i in range(len(routes))], self.payload.od_policy,
+        )
+        edge_ids = self.net.edge_ids
+        # Rotas completas calculadas aqui: o SUMO não precisa rotear cada veículo ao iniciar
+        paths = self.net.router().routes(from_idx, to_idx)
+        route_ids = {}
+
+        for i, route in enumerate(routes):
+            try:
+                from_edge, to_edge = edge_ids[from_idx[i]], edge_ids[to_idx[i]]
+                if from_edge == to_edge: continue
+                
+                # Usa flow para tráfego contínuo na rota
+                flow = f'  <flow id="fixed_{i}" type="fixed_fleet" begin="0" end="{self.payload.simulation_time}" number="{route.count}"'
+                path = paths[i]
+                if path is None:
+                    # Sem caminho no grafo compilado: deixa o SUMO rotear
+                    f.write(f'{flow} from="{from_edge}" to="{to_edge}"/>\n')
+                    continue
+                route_id = route_ids.get(path)
+                if route_id is None:
+                    route_id = route_ids[path] = f"fixed_route_{len(route_ids)}"
+                    f.write(f'  <route id="{route_id}" edges="{" ".join(edge_ids[e] for e in path)}"/>\n')
+                f.write(f'{flow} route="{route_id}"/>\n')
+            except Exception as e:
+                logging.error(f"Error generating fixed route {i}: {e}")
+        f.write("</routes>\n")
+        return f.getvalue()
+
+    @staticmethod
+    def _random_traffic_params(payload: AdvancedSimulationPayload):
+        """(duração, período, seed) do tráfego de fundo, ou None se o cenário não tiver."""
+        if payload.num_random_vehicles <= 0 and payload.num_fixed_vehicles > 0:
+            return None
+        n_cars = max(1, payload.num_random_vehicles)
+        return payload.simulation_time, float(payload.simulation_time) / n_cars, payload.random_seed
+
+    def _generate_random_routes_xml(self) -> str:
         net_file = settings.SUMO_MAPS_DIR / self.payload.map_name
-        n_cars = max(1, self.payload.num_random_vehicles)
-        period = float(self.payload.simulation_time) / n_cars
-
-        command = [
-            "python", settings.RANDOM_TRIPS_PY,
-            "-n", str(net_file), "-e", str(self.payload.simulation_time),
-            "-p", str(period), "-o", str(route_file),
-            "--seed", str(self.payload.random_seed), "--validate"
-        ]
-        subprocess.run(command, check=True, capture_output=True, text=True)
-        return route_file
+        end, period, seed = self._random_traffic_params(self.payload)
+
+        return random_trips_xml(net_file, end, period, seed)
 
     def _generate_ned_file(self, payload: AdvancedSimulationPayload) -> str:
         sim_name = payload.simulation_name.replace(" ", "_").replace("-", "_")
@@ -146,6 +177,7 @@ network {sim_name}
         gNodeB1: gNB {{ @display("p=150,150;is=vl"); }}
         car[{total_cars}]: CarV2X;
 """
+        parts = [ned]
         # Jammers
         if payload.jammers_list:
             global_type = payload.jamming_params.jammer_type
@@ -153,27 +185,25 @@ network {sim_name}
                 j_type = j_data.get('type', global_type) if isinstance(j_data, dict) else global_type
                 j_class = "DroneJammer" if j_type == "DroneJammer" else "NRJammer"
                 icon = "device/drone" if j_type == "DroneJammer" else "device/antennatower"
-                ned += f"        jammer_{i}: {j_class} {{ @display(\"i={icon}\"); }}\n"
+                parts.append(f"        jammer_{i}: {j_class} {{ @display(\"i={icon}\"); }}\n")
 
         # RSUs
-        if payload.rsus_list:
-            for i, _ in enumerate(payload.rsus_list):
-                ned += f"        rsu_{i}: RSUNR {{ @display(\"i=device/antennatower\"); }}\n"
+        parts += [f"        rsu_{i}: RSUNR {{ @display(\"i=device/antennatower\"); }}\n" for i in range(len(payload.rsus_list))]
 
-        ned += """
+        parts.append("""
     connections allowunconnected:
         server.pppg++ <--> Eth10G <--> router.pppg++;
         router.pppg++ <--> Eth10G <--> upf.filterGate;
         upf.pppg++ <--> Eth10G <--> gNodeB1.ppp;
 }
-"""
-        return ned
+""")
+        return "".join(parts)
 
-    def _generate_omnetpp_ini(self, payload: AdvancedSimulationPayload) -> str:
+    def _generate_omnetpp_ini(self, payload: AdvancedSimulationPayload, launchd: str = "simulation.launchd.xml") -> str:
         sim_name = payload.simulation_name.replace(" ", "_").replace("-", "_")
         jp = payload.jamming_params
         
-        ini = f"""[General]
+        ini = IniWriter(f"""[General]
 network = simulations.{sim_name}.{sim_name}
 sim-time-limit = {payload.simulation_time}s
 seed-set = {payload.random_seed}
@@ -183,7 +213,7 @@ seed-set = {payload.random_seed}
 *.veinsManager.port = 9999
 *.veinsManager.moduleType = "de.hshl.b5gcybertestv2x.nodes.CarV2X"
 *.veinsManager.moduleName = "car"
-*.veinsManager.launchConfig = xmldoc("simulation.launchd.xml")
+*.veinsManager.launchConfig = xmldoc("{launchd}")
 *.veinsManager.updateInterval = 0.1s
 
 # --- 5G Network Params ---
@@ -208,60 +238,67 @@ seed-set = {payload.random_seed}
 *.server.numApps = 1
 *.server.app[0].typename = "VoIPReceiver"
 *.server.app[0].localPort = 3000
-"""
+""")
         # --- JAMMERS ---
         global_type = jp.jammer_type
+        jammer_xs, jammer_ys = self._convert_latlng_to_xy_batch(payload.jammers_list)
+        jammer_nodes = []
         for i, jammer_pos in enumerate(payload.jammers_list):
-            if hasattr(jammer_pos, 'lat'): lat, lng = jammer_pos.lat, jammer_pos.lng
-            elif isinstance(jammer_pos, dict): lat, lng = jammer_pos['lat'], jammer_pos['lng']
-            else: continue 
-            
+            if not (hasattr(jammer_pos, 'lat') or isinstance(jammer_pos, dict)):
+                jammer_nodes.append({})
+                continue
+
             # Determine type
             current_type = jammer_pos.get('type', global_type) if isinstance(jammer_pos, dict) else global_type
-            
-            # Mock para converter
-            class LatLng: 
-                def __init__(self, lat, lng): self.lat, self.lng = lat, lng
-            x, y = self._convert_latlng_to_xy(LatLng(lat, lng))
-            
-            ini += f"\n# Jammer {i} ({current_type})\n"
+
+            node = {}
             if current_type == "DroneJammer":
-                ini += f"*.jammer_{i}.mobility.typename = \"LinearMobility\"\n"
-                ini += f"*.jammer_{i}.mobility.speed = 10mps\n"
-                ini += f"*.jammer_{i}.mobility.initialZ = 50m\n"
+                node["mobility.typename"] = '"LinearMobility"'
+                node["mobility.speed"] = "10mps"
+                node["mobility.initialZ"] = "50m"
             else:
-                ini += f"*.jammer_{i}.mobility.typename = \"StaticGridMobility\"\n"
-
-            ini += f"*.jammer_{i}.mobility.initialX = {x:.2f}m\n"
-            ini += f"*.jammer_{i}.mobility.initialY = {y:.2f}m\n"
-
-            ini += f"*.jammer_{i}.app[0].typename = \"JammerApp\"\n"
-            ini += f"*.jammer_{i}.app[0].startTime = {jp.start_time_s}s\n"
-            ini += f"*.jammer_{i}.app[0].stopTime = {jp.stop_time_s}s\n"
-            ini += f"*.jammer_{i}.jammerType = \"{jp.strategy}\"\n"
-            ini += f"*.jammer_{i}.transmissionPower = {jp.power_dbm}dBm\n"
-            ini += f"*.jammer_{i}.active = true\n"
+                node["mobility.typename"] = '"StaticGridMobility"'
+            node.update({
+                "mobility.initialX": f"{jammer_xs[i]:.2f}m",
+                "mobility.initialY": f"{jammer_ys[i]:.2f}m",
+                "app[0].typename": '"JammerApp"',
+                "app[0].startTime": f"{jp.start_time_s}s",
+                "app[0].stopTime": f"{jp.stop_time_s}s",
+                "jammerType": f'"{jp.strategy}"',
+                "transmissionPower": f"{jp.power_dbm}dBm",
+                "active": "true",
+            })
+            jammer_nodes.append(node)
+        if jammer_nodes:
+            ini.comment(f"Jammers ({global_type})")
+            ini.node_params("jammer", jammer_nodes, vector=False)
 
         # --- RSUS ---
-        for i, rsu in enumerate(payload.rsus_list):
-            x, y = self._convert_latlng_to_xy(rsu)
-            ini += f"\n# RSU {i}\n"
-            ini += f"*.rsu_{i}.mobility.typename = \"StaticGridMobility\"\n"
-            ini += f"*.rsu_{i}.mobility.initialX = {x:.2f}m\n"
-            ini += f"*.rsu_{i}.mobility.initialY = {y:.2f}m\n"
-
-        ini += """
+        rsu_xs, rsu_ys = self._convert_latlng_to_xy_batch(payload.rsus_list)
+        if payload.rsus_list:
+            ini.comment("RSUs")
+            ini.node_params("rsu", [{
+                "mobility.typename": '"StaticGridMobility"',
+                "mobility.initialX": f"{x:.2f}m",
+                "mobility.initialY": f"{y:.2f}m",
+            } for x, y in zip(rsu_xs, rsu_ys)], vector=False)
+
+        ini.text("""
 **.scalar-recording = true
 **.vector-recording = true
 **.car[*].**.sinr.vector-recording = true
 **.car[*].**.packetLoss.vector-recording = true
-"""
-        return ini
+""")
+        return ini.getvalue()
 
-    def _generate_sumocfg(self, payload) -> str:
+    def _route_files(self, payload) -> List[str]:
         route_files = []
         if payload.num_fixed_vehicles > 0: route_files.append("fixed.rou.xml")
         if payload.num_random_vehicles > 0: route_files.append("random.rou.xml")
+        return route_files
+
+    def _generate_sumocfg(self, payload, route_files: Optional[List[str]] = None) -> str:
+        if route_files is None: route_files = self._route_files(payload)
         routes_str = ",".join(route_files) if route_files else "random.rou.xml"
 
         return f"""<configuration>
@@ -275,62 +312,64 @@ seed-set = {payload.random_seed}
     </time>
 </configuration>"""
 
-    def _generate_launchd_xml(self, payload) -> str:
-        files = [payload.map_name, "simulation.sumocfg", "omnetpp.ini", "demo.xml"]
-        if payload.num_fixed_vehicles > 0: files.append("fixed.rou.xml")
-        if payload.num_random_vehicles > 0: files.append("random.rou.xml")
+    def _generate_launchd_xml(self, payload, route_files: Optional[List[str]] = None, sumocfg: str = "simulation.sumocfg") -> str:
+        if route_files is None: route_files = self._route_files(payload)
+        files = [payload.map_name, sumocfg, "omnetpp.ini", "demo.xml"] + route_files
         
         xml = "<launchd>\n"
         for f in files: xml += f'  <copy file="{f}"/>\n'
-        xml += '  <run command="sumo-gui -c simulation.sumocfg --remote-port 9999"/>\n</launchd>'
+        xml += f'  <run command="sumo-gui -c {sumocfg} --remote-port 9999"/>\n</launchd>'
         return xml
 
-    def create_advanced_simulation_zip(self, payload: AdvancedSimulationPayload) -> io.BytesIO:
+    def create_advanced_simulation_members(self, payload: AdvancedSimulationPayload) -> List[ZipMember]:
+        """Gera os arquivos do cenário como membros do ZIP (o mapa vai como caminho em disco)."""
         self.payload = payload
-        self._load_sumo_net(payload.map_name)
+        sim_name = payload.simulation_name.replace(" ", "_").replace("-", "_")
         
-        zip_buffer = io.BytesIO()
-        temp_dir = Path(f"temp_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
-        temp_dir.mkdir()
+        # OPÇÃO 2: ESTRUTURA DE DIRETÓRIOS CORRIGIDA
+        # O ZIP agora contém a pasta raiz 'simulations/nome_do_cenario/'
+        root_folder = f"simulations/{sim_name}"
+
+        # Estágios independentes rodam em paralelo; snapping e INI/NED precisam da rede
+        pipeline = scenario_pipeline(
+            "advanced", lambda: self._load_sumo_net(payload.map_name), root_folder, payload.map_name, payload.package_mode,
+        )
+        if payload.num_fixed_vehicles > 0:
+            pipeline.add("snapping", self._generate_fixed_routes_xml, after=("net_load",))
+        if self._random_traffic_params(payload) is not None:
+            pipeline.add("routes", self._generate_random_routes_xml)
+        pipeline.add("ini_ned", lambda: (
+            self._generate_ned_file(payload),
+            self._generate_omnetpp_ini(payload),
+            self._generate_sumocfg(payload),
+            self._generate_launchd_xml(payload),
+        ), after=("net_load",))
+        results = pipeline.run()
+
+        ned_content, ini_content, sumocfg, launchd = results["ini_ned"]
+        demo_xml = self._generate_ipv4_config()
         
-        try:
-            gen_files = []
-            if payload.num_fixed_vehicles > 0:
-                gen_files.append(self._generate_fixed_routes_xml(temp_dir))
-            
-            if payload.num_random_vehicles > 0 or payload.num_fixed_vehicles == 0:
-                gen_files.append(self._generate_random_routes_xml(temp_dir))
-            
-            ned_content = self._generate_ned_file(payload)
-            ini_content = self._generate_omnetpp_ini(payload)
-            sumocfg = self._generate_sumocfg(payload)
-            launchd = self._generate_launchd_xml(payload)
-            demo_xml = self._generate_ipv4_config()
-            
-            sim_name = payload.simulation_name.replace(" ", "_").replace("-", "_")
-            
-            # OPÇÃO 2: ESTRUTURA DE DIRETÓRIOS CORRIGIDA
-            # O ZIP agora contém a pasta raiz 'simulations/nome_do_cenario/'
-            root_folder = f"simulations/{sim_name}"
-            
-            with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
-                zf.writestr(f"{root_folder}/simulation.ned", ned_content)
-                zf.writestr(f"{root_folder}/package.ned", f"package simulations.{sim_name};")
-                zf.writestr(f"{root_folder}/omnetpp.ini", ini_content)
-                zf.writestr(f"{root_folder}/simulation.sumocfg", sumocfg)
-                zf.writestr(f"{root_folder}/simulation.launchd.xml", launchd)
-                zf.writestr(f"{root_folder}/demo.xml", demo_xml)
-                
-                for f in gen_files: zf.write(f, f"{root_folder}/{f.name}")
-                
-                map_path = settings.SUMO_MAPS_DIR / payload.map_name
-                if map_path.exists():
-                    zf.write(map_path, f"{root_folder}/{payload.map_name}")
-                
-        finally:
-            for f in gen_files: 
-                if f.exists(): f.unlink()
-            if temp_dir.exists(): temp_dir.rmdir()
+        gen_files = []
+        if "snapping" in results:
+            gen_files.append(("fixed.rou.xml", results["snapping"]))
+        if "routes" in results:
+            gen_files.append(("random.rou.xml", results["routes"]))
+        
+        members: List[ZipMember] = [
+            (f"{root_folder}/simulation.ned", ned_content),
+            (f"{root_folder}/package.ned", f"package simulations.{sim_name};"),
+            (f"{root_folder}/omnetpp.ini", ini_content),
+            (f"{root_folder}/simulation.sumocfg", sumocfg),
+            (f"{root_folder}/simulation.launchd.xml", launchd),
+            (f"{root_folder}/demo.xml", demo_xml),
+        ]
+        members += [(f"{root_folder}/{name}", content) for name, content in gen_files]
+        
+        members += results["map"]
+        metrics.count_vehicles(payload.num_fixed_vehicles + payload.num_random_vehicles)
+        return members
 
-        zip_buffer.seek(0)
-        return zip_buffer
\ No newline at end of file
+    def create_advanced_simulation_zip(self, payload: AdvancedSimulationPayload) -> io.BytesIO:
+        members = self.create_advanced_simulation_members(payload)
+        with tracked_stage("packaging"):
+            return zip_to_buffer(members)
@@ -1,9 +1,9 @@
 import io
-import zipfile
 import logging
-import subprocess
 from pathlib import Path
-from datetime import datetime # Importação adicionada para evitar erro de timestamp
+from typing import List
+
+import numpy as np
 
 try:
     import sumolib
@@ -11,7 +11,15 @@ except ImportError:
     logging.error("SUMOLIB not found. Check PYTHONPATH.")
     sumolib = None
 
+from app.core import metrics
 from app.core.config import settings
+from app.core.net_cache import net_cache
+from app.core.progress import tracked_stage
+from app.core.zip_stream import ZipMember, zip_to_buffer
+from app.services.ini_writer import IniWriter
+from app.services.od_check import RESNAP, check_od
+from app.services.pipeline import scenario_pipeline
+from app.services.trip_generator import random_trips_xml
 from app.models.expert_models import ExpertSimulationPayload
 
 class ExpertSimulationService:
@@ -23,73 +31,53 @@ class ExpertSimulationService:
         net_path = settings.SUMO_MAPS_DIR / map_name
         if not net_path.exists():
             raise FileNotFoundError(f"Map {map_name} not found in {settings.SUMO_MAPS_DIR}")
-        self.net = sumolib.net.readNet(str(net_path))
+        self.net = net_cache.get(net_path)
 
-    def _geo_to_xy(self, lat, lng):
-        """Converte Lat/Lon para X/Y do SUMO"""
+    def _geo_to_xy_batch(self, lats, lngs):
+        """Converte listas de Lat/Lon para X/Y do SUMO numa única chamada"""
+        lats = np.asarray(lats, dtype=np.float64)
+        lngs = np.asarray(lngs, dtype=np.float64)
         try:
-            if hasattr(self.net, 'convertGeoToXY'):
-                return self.net.convertGeoToXY(float(lng), float(lat))
-            elif hasattr(self.net, 'convertLonLat2XY'):
-                return self.net.convertLonLat2XY(float(lng), float(lat))
-            return float(lng), float(lat)
+            if self.net.has_geo_proj():
+                return self.net.convert_lonlat_to_xy_batch(lngs, lats)
+            return lngs, lats
         except Exception as e:
             logging.warning(f"Geo conversion failed: {e}")
-            return float(lng), float(lat)
+            return lngs, lats
 
-    def _get_edge_id(self, lat, lng):
-        """Encontra a EdgeID (Rua) mais próxima da coordenada"""
-        x, y = self._geo_to_xy(lat, lng)
-        
-        # Tenta encontrar com raios crescentes
-        lanes = self.net.getNeighboringLanes(x, y, 50)
-        if not lanes: lanes = self.net.getNeighboringLanes(x, y, 200)
-        if not lanes: lanes = self.net.getNeighboringLanes(x, y, 500)
+    def _get_edge_ids(self, xs, ys):
+        """Encontra as edges (índices) mais próximas de cada coordenada X/Y, em lote"""
+        # Busca sem raio limite, apenas em lanes que permitem carros de passeio
+        edge_idx, dists = self.net.nearest_edges(xs, ys, passenger_only=True)
         
-        if not lanes: 
-            # Fallback seguro
-            logging.warning(f"No road found at {lat},{lng}. Using fallback.")
-            return list(self.net.getEdges())[0].getID()
+        for x, y, d in zip(xs[dists > 500], ys[dists > 500], dists[dists > 500]):
+            logging.warning(f"No road within 500m of ({x:.1f}, {y:.1f}). Snapped to nearest road {d:.0f}m away.")
             
-        return min(lanes, key=lambda l: l[1])[0].getEdge().getID()
+        return np.maximum(edge_idx, 0)
+
+    @staticmethod
+    def _random_traffic_params(payload: ExpertSimulationPayload):
+        """(duração, período, seed) do tráfego de fundo, ou None se o cenário não tiver."""
+        num_random = getattr(payload, 'num_random_vehicles', 0)
+        if num_random <= 0:
+            return None
+        return payload.duration, float(payload.duration) / float(num_random), payload.seed
 
     def _generate_random_routes_xml(self, map_name, duration, num_vehicles, seed):
         """Gera tráfego aleatório de fundo se solicitado"""
         if num_vehicles <= 0: return ""
         
-        # Usa um diretório temporário para evitar conflitos
-        temp_id = datetime.now().strftime('%Y%m%d_%H%M%S')
-        route_file = Path(f"temp_expert_random_{temp_id}.rou.xml")
         net_file = settings.SUMO_MAPS_DIR / map_name
-        
         period = float(duration) / float(num_vehicles)
 
-        command = [
-            "python", settings.RANDOM_TRIPS_PY,
-            "-n", str(net_file),
-            "-e", str(duration),
-            "-p", str(period), 
-            "-o", str(route_file),
-            "--seed", str(seed),
-            "--validate"
-        ]
-        
         try:
-            subprocess.run(command, check=True, capture_output=True, text=True)
-            if route_file.exists():
-                with open(route_file, "r") as f:
-                    content = f.read()
-                route_file.unlink()
-                return content
-            return ""
+            return random_trips_xml(net_file, duration, period, seed)
         except Exception as e:
             logging.error(f"Random Trips Error: {e}")
-            if route_file.exists(): route_file.unlink()
             return ""
 
-    def generate_zip(self, payload: ExpertSimulationPayload) -> io.BytesIO:
-        self._load_net(payload.map_name)
-        
+    def generate_members(self, payload: ExpertSimulationPayload) -> List[ZipMember]:
+        """Gera os arquivos do cenário como membros do ZIP (o mapa vai como caminho em disco)."""
         # 1. Organizar Nós
         cars = [n for n in payload.nodes_list if n.type == 'car']
         drones = [n for n in payload.nodes_list if n.type == 'drone']
@@ -97,29 +85,68 @@ class ExpertSimulationService:
         rsus = [n for n in payload.nodes_list if n.type == 'rsu']
         
         sim_name = payload.simulation_name.replace(" ", "_")
+        folder = f"simulations/{sim_name}" # Pasta raiz do pacote
         
-        # 2. Gerar Arquivos
-        # Rotas Manuais (Expert)
-        routes_fixed = self._create_routes_xml(cars)
-        
-        # Rotas Aleatórias (Background)
         # Verifica se o campo existe no payload, default 0
         num_random = getattr(payload, 'num_random_vehicles', 0)
-        routes_random = self._generate_random_routes_xml(payload.map_name, payload.duration, num_random, payload.seed)
-        
         # Total de carros para o vetor car[] no NED
         total_cars = len(cars) + num_random
         
-        ned = self._create_ned(sim_name, total_cars, drones, towers, rsus)
-        ini = self._create_ini(sim_name, payload, cars, drones, towers, rsus, num_random)
+        # 2. Gerar Arquivos: rotas manuais (snapping), rotas aleatórias e INI/NED em paralelo
+        results = (
+            scenario_pipeline("expert", lambda: self._load_net(payload.map_name), folder, payload.map_name, payload.package_mode)
+            .add("snapping", lambda: self._create_routes_xml(cars, payload.od_policy), after=("net_load",))
+            .add("routes", lambda: self._generate_random_routes_xml(payload.map_name, payload.duration, num_random, payload.seed))
+            .add("ini_ned", lambda: (
+                self._create_ned(sim_name, total_cars, drones, towers, rsus),
+                self._create_ini(sim_name, payload, cars, drones, towers, rsus, num_random),
+            ), after=("net_load",))
+            .run()
+        )
+        routes_fixed, routes_random = results["snapping"], results["routes"]
+        ned, ini = results["ini_ned"]
         
         # Lista de rotas para o sumocfg
         route_files = ["fixed.rou.xml"]
         if num_random > 0 and routes_random:
             route_files.append("random.rou.xml")
+        
+        sumocfg = self._create_sumocfg(payload, route_files)
+        launchd = self._create_launchd(payload, route_files)
+        
+        demo_xml = self._create_demo_xml()
+        
+        # 3. Membros do ZIP com estrutura de pasta raiz
+        members: List[ZipMember] = [
+            (f"{folder}/simulation.ned", ned),
+            (f"{folder}/package.ned", f"package simulations.{sim_name};"),
+            (f"{folder}/omnetpp.ini", ini),
+            (f"{folder}/simulation.sumocfg", sumocfg),
+            (f"{folder}/simulation.launchd.xml", launchd),
+            (f"{folder}/fixed.rou.xml", routes_fixed),
+            (f"{folder}/demo.xml", demo_xml),
+        ]
+        
+        if num_random > 0 and routes_random:
+            members.append((f"{folder}/random.rou.xml", routes_random))
+        
+        members += results["map"]
+        metrics.count_vehicles(total_cars)
+        return members
+
+    def generate_zip(self, payload: ExpertSimulationPayload) -> io.BytesIO:
+        members = self.generate_members(payload)
+        with tracked_stage("packaging"):
+            return zip_to_buffer(members)
+
+    @staticmethod
+    def _create_demo_xml():
+        return "<config><interface hosts='**' address='10.x.x.x' netmask='255.x.x.x'/><multicast-group hosts='**' address='224.0.0.1'/></config>"
+
+    def _create_sumocfg(self, payload, route_files):
         routes_str = ",".join(route_files)
         
-        sumocfg = f"""<configuration>
+        return f"""<configuration>
     <input>
         <net-file value="{payload.map_name}"/>
         <route-files value="{routes_str}"/>
@@ -130,61 +157,54 @@ class ExpertSimulationService:
     </time>
 </configuration>"""
 
-        # Launchd XML
-        copy_cmds = f'<copy file="{payload.map_name}"/><copy file="simulation.sumocfg"/><copy file="omnetpp.ini"/><copy file="demo.xml"/><copy file="fixed.rou.xml"/>'
-        if num_random > 0 and routes_random:
-            copy_cmds += '<copy file="random.rou.xml"/>'
+    def _create_launchd(self, payload, route_files, sumocfg="simulation.sumocfg"):
+        copy_cmds = f'<copy file="{payload.map_name}"/><copy file="{sumocfg}"/><copy file="omnetpp.ini"/><copy file="demo.xml"/>'
+        copy_cmds += "".join(f'<copy file="{f}"/>' for f in route_files)
             
-        launchd = f"""<launchd>
+        return f"""<launchd>
     {copy_cmds}
-    <run command="sumo-gui -c simulation.sumocfg --remote-port 9999"/>
+    <run command="sumo-gui -c {sumocfg} --remote-port 9999"/>
 </launchd>"""
+
+    def _create_routes_xml(self, cars, od_policy=RESNAP):
+        lines = ["<routes>\n", '  <vType id="expert_car" accel="2.6" decel="4.5" sigma="0.5" length="5" maxSpeed="70" color="0,1,0"/>\n']
         
-        demo_xml = "<config><interface hosts='**' address='10.x.x.x' netmask='255.x.x.x'/><multicast-group hosts='**' address='224.0.0.1'/></config>"
+        # Usa posições do payload. Se dest não existir, usa start (mas deve existir pela lógica do front)
+        s_xs, s_ys = self._geo_to_xy_batch([c.lat for c in cars], [c.lng for c in cars])
+        d_xs, d_ys = self._geo_to_xy_batch(
+            [c.dest_lat if c.dest_lat is not None else c.lat for c in cars],
+            [c.dest_lng if c.dest_lng is not None else c.lng for c in cars],
+        )
         
-        # 3. Criar ZIP com estrutura de pasta raiz
-        zip_buffer = io.BytesIO()
-        folder = f"simulations/{sim_name}" # Pasta raiz do pacote
-        
-        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
-            zf.writestr(f"{folder}/simulation.ned", ned)
-            zf.writestr(f"{folder}/package.ned", f"package simulations.{sim_name};")
-            zf.writestr(f"{folder}/omnetpp.ini", ini)
-            zf.writestr(f"{folder}/simulation.sumocfg", sumocfg)
-            zf.writestr(f"{folder}/simulation.launchd.xml", launchd)
-            zf.writestr(f"{folder}/fixed.rou.xml", routes_fixed)
-            zf.writestr(f"{folder}/demo.xml", demo_xml)
-            
-            if num_random > 0 and routes_random:
-                zf.writestr(f"{folder}/random.rou.xml", routes_random)
-            
-            map_p = settings.SUMO_MAPS_DIR / payload.map_name
-            if map_p.exists():
-                zf.write(map_p, f"{folder}/{payload.map_name}")
-            
-        zip_buffer.seek(0)
-        return zip_buffer
-
-    def _create_routes_xml(self, cars):
-        xml = "<routes>\n"
-        xml += '  <vType id="expert_car" accel="2.6" decel="4.5" sigma="0.5" length="5" maxSpeed="70" color="0,1,0"/>\n'
+        # Pares sem rota são re-encaixados (ou recusados) antes do roteamento
+        from_idx, to_idx = check_od(
+            self.net, self._get_edge_ids(s_xs, s_ys), self._get_edge_ids(d_xs, d_ys),
+            (s_xs, s_ys), (d_xs, d_ys), [f"car {car.id}" for car in cars], od_policy,
+        )
+        edge_ids = self.net.edge_ids
+        # Rotas completas calculadas aqui (pares iguais compartilham a mesma <route>)
+        paths = self.net.router().routes(from_idx, to_idx)
+        route_ids = {}
         
         for i, car in enumerate(cars):
-            # Usa posições do payload. Se dest não existir, usa start (mas deve existir pela lógica do front)
-            s_lat, s_lng = car.lat, car.lng
-            d_lat = car.dest_lat if car.dest_lat is not None else s_lat
-            d_lng = car.dest_lng if car.dest_lng is not None else s_lng
-            
-            from_edge = self._get_edge_id(s_lat, s_lng)
-            to_edge = self._get_edge_id(d_lat, d_lng)
+            from_edge, to_edge = edge_ids[from_idx[i]], edge_ids[to_idx[i]]
             
             # Se origem == destino, força rota completa na via
             extra_attr = 'departPos="0" arrivalPos="max"' if from_edge == to_edge else 'departPos="0"'
             
-            xml += f'  <trip id="v{i}" type="expert_car" depart="0" from="{from_edge}" to="{to_edge}" {extra_attr}/>\n'
+            path = paths[i]
+            if path is None:
+                # Sem caminho no grafo compilado: deixa o SUMO rotear
+                lines.append(f'  <trip id="v{i}" type="expert_car" depart="0" from="{from_edge}" to="{to_edge}" {extra_attr}/>\n')
+                continue
+            route_id = route_ids.get(path)
+            if route_id is None:
+                route_id = route_ids[path] = f"r{len(route_ids)}"
+                lines.append(f'  <route id="{route_id}" edges="{" ".join(edge_ids[e] for e in path)}"/>\n')
+            lines.append(f'  <vehicle id="v{i}" type="expert_car" depart="0" route="{route_id}" {extra_attr}/>\n')
             
-        xml += "</routes>"
-        return xml
+        lines.append("</routes>")
+        return "".join(lines)
 
     def _create_ned(self, sim_name, total_cars, drones, towers, rsus):
         ned = f"""package simulations.{sim_name};
@@ -227,21 +247,21 @@ network {sim_name} {{
         car[{total_cars}]: CarV2X;
 """
         # Adiciona submódulos estáticos
-        for i, _ in enumerate(drones): ned += f"        drone_{i}: DroneJammer {{ @display(\"i=device/drone\"); }}\n"
-        for i, _ in enumerate(towers): ned += f"        tower_{i}: NRJammer {{ @display(\"i=device/antennatower\"); }}\n"
-        for i, _ in enumerate(rsus): ned += f"        rsu_{i}: RSUNR {{ @display(\"i=device/antennatower\"); }}\n"
-        
-        ned += """
+        parts = [ned]
+        parts += [f"        drone_{i}: DroneJammer {{ @display(\"i=device/drone\"); }}\n" for i in range(len(drones))]
+        parts += [f"        tower_{i}: NRJammer {{ @display(\"i=device/antennatower\"); }}\n" for i in range(len(towers))]
+        parts += [f"        rsu_{i}: RSUNR {{ @display(\"i=device/antennatower\"); }}\n" for i in range(len(rsus))]
+        parts.append("""
     connections allowunconnected:
         server.pppg++ <--> Eth10G <--> router.pppg++;
         router.pppg++ <--> Eth10G <--> upf.filterGate;
         upf.pppg++ <--> Eth10G <--> gNodeB1.ppp;
 }
-"""
-        return ned
+""")
+        return "".join(parts)
 
-    def _create_ini(self, sim_name, payload, cars, drones, towers, rsus, num_random):
-        ini = f"""[General]
+    def _create_ini(self, sim_name, payload, cars, drones, towers, rsus, num_random, launchd="simulation.launchd.xml"):
+        ini = IniWriter(f"""[General]
 network = simulations.{sim_name}.{sim_name}
 sim-time-limit = {payload.duration}s
 seed-set = {payload.seed}
@@ -251,7 +271,7 @@ seed-set = {payload.seed}
 *.veinsManager.port = 9999
 *.veinsManager.moduleType = "de.hshl.b5gcybertestv2x.nodes.CarV2X"
 *.veinsManager.moduleName = "car"
-*.veinsManager.launchConfig = xmldoc("simulation.launchd.xml")
+*.veinsManager.launchConfig = xmldoc("{launchd}")
 *.veinsManager.updateInterval = 0.1s
 
 # --- 5G Network ---
@@ -263,72 +283,77 @@ seed-set = {payload.seed}
 *.server.numApps = 1
 *.server.app[0].typename = "VoIPReceiver"
 *.server.app[0].localPort = 3000
-"""
-        # 1. Carros Manuais (Expert) - Configuração Individual
-        for i, c in enumerate(cars):
-            p = c.params
-            ini += f"\n# Car {i} (Manual)\n"
-            ini += f"*.car[{i}].numApps = 1\n"
-            ini += f"*.car[{i}].app[0].typename = \"VoIPSender\"\n"
-            ini += f"*.car[{i}].app[0].destAddress = \"server\"\n"
-            ini += f"*.car[{i}].app[0].destPort = 3000\n"
-            ini += f"*.car[{i}].app[0].startTime = uniform(0s, 1s)\n"
-            ini += f"*.car[{i}].app[0].packetSize = {p.get('packetSize', 300)}B\n"
-            ini += f"*.car[{i}].phy.txPower = {p.get('txPower', 23)}dBm\n"
-            ini += f"*.car[{i}].mitigation.active = {'true' if p.get('mitigation') else 'false'}\n"
+""")
+        # 1. Carros: manuais (parâmetros do payload) seguidos dos aleatórios (padrão),
+        # agrupados em faixas do vetor car[] quando os valores se repetem
+        car_nodes = [{
+            "numApps": 1,
+            "app[0].typename": '"VoIPSender"',
+            "app[0].destAddress": '"server"',
+            "app[0].destPort": 3000,
+            "app[0].startTime": "uniform(0s, 1s)",
+            "app[0].packetSize": f"{c.params.get('packetSize', 300)}B",
+            "phy.txPower": f"{c.params.get('txPower', 23)}dBm",
+            "mitigation.active": "true" if c.params.get('mitigation') else "false",
+        } for c in cars]
 
-        # 2. Carros Aleatórios (Background) - Configuração em Lote
+        # 2. Carros Aleatórios (Background) - parâmetros padrão
         if num_random > 0:
-            start = len(cars)
-            end = start + num_random - 1
-            # Default params para aleatórios
             def_power = 23
             def_packet = 256
-            
-            ini += f"\n# Random Cars ({start} to {end})\n"
-            # Sintaxe de range do OMNeT++
-            ini += f"*.car[{start}..{end}].numApps = 1\n"
-            ini += f"*.car[{start}..{end}].app[0].typename = \"VoIPSender\"\n"
-            ini += f"*.car[{start}..{end}].app[0].destAddress = \"server\"\n"
-            ini += f"*.car[{start}..{end}].app[0].destPort = 3000\n"
-            ini += f"*.car[{start}..{end}].app[0].startTime = uniform(0s, 5s)\n"
-            ini += f"*.car[{start}..{end}].app[0].packetSize = {def_packet}B\n"
-            ini += f"*.car[{start}..{end}].phy.txPower = {def_power}dBm\n"
+            car_nodes += [{
+                "numApps": 1,
+                "app[0].typename": '"VoIPSender"',
+                "app[0].destAddress": '"server"',
+                "app[0].destPort": 3000,
+                "app[0].startTime": "uniform(0s, 5s)",
+                "app[0].packetSize": f"{def_packet}B",
+                "phy.txPower": f"{def_power}dBm",
+            }] * num_random
+
+        if car_nodes:
+            ini.comment(f"Cars ({len(cars)} manual, {num_random} random)")
+            ini.node_params("car", car_nodes)
+
+        # 3. Infraestrutura (Jammers/RSU) - conversão de coordenadas em lote
+        drone_xs, drone_ys = self._geo_to_xy_batch([d.lat for d in drones], [d.lng for d in drones])
+        tower_xs, tower_ys = self._geo_to_xy_batch([t.lat for t in towers], [t.lng for t in towers])
+        rsu_xs, rsu_ys = self._geo_to_xy_batch([r.lat for r in rsus], [r.lng for r in rsus])
 
-        # 3. Infraestrutura (Jammers/RSU)
-        for i, d in enumerate(drones):
-            p = d.params
-            x, y = self._geo_to_xy(d.lat, d.lng)
-            ini += f"\n# Drone {i}\n"
-            ini += f"*.drone_{i}.mobility.typename = \"LinearMobility\"\n"
-            ini += f"*.drone_{i}.mobility.initialX = {x:.2f}m\n"
-            ini += f"*.drone_{i}.mobility.initialY = {y:.2f}m\n"
-            ini += f"*.drone_{i}.mobility.initialZ = 50m\n"
-            ini += f"*.drone_{i}.mobility.speed = {p.get('speed', 10)}mps\n"
-            ini += f"*.drone_{i}.app[0].typename = \"JammerApp\"\n"
-            ini += f"*.drone_{i}.app[0].startTime = {p.get('start', 20)}s\n"
-            ini += f"*.drone_{i}.app[0].stopTime = {p.get('stop', 100)}s\n"
-            ini += f"*.drone_{i}.jammerType = \"{p.get('strategy', 'constant')}\"\n"
-            ini += f"*.drone_{i}.transmissionPower = {p.get('txPower', 30)}dBm\n"
-            ini += f"*.drone_{i}.active = true\n"
+        if drones:
+            ini.comment("Drones")
+            ini.node_params("drone", [{
+                "mobility.typename": '"LinearMobility"',
+                "mobility.initialX": f"{x:.2f}m",
+                "mobility.initialY": f"{y:.2f}m",
+                "mobility.initialZ": "50m",
+                "mobility.speed": f"{d.params.get('speed', 10)}mps",
+                "app[0].typename": '"JammerApp"',
+                "app[0].startTime": f"{d.params.get('start', 20)}s",
+                "app[0].stopTime": f"{d.params.get('stop', 100)}s",
+                "jammerType": f'"{d.params.get("strategy", "constant")}"',
+                "transmissionPower": f"{d.params.get('txPower', 30)}dBm",
+                "active": "true",
+            } for d, x, y in zip(drones, drone_xs, drone_ys)], vector=False)
 
-        for i, t in enumerate(towers):
-            p = t.params
-            x, y = self._geo_to_xy(t.lat, t.lng)
-            ini += f"\n# Tower {i}\n"
-            ini += f"*.tower_{i}.mobility.typename = \"StaticGridMobility\"\n"
-            ini += f"*.tower_{i}.mobility.initialX = {x:.2f}m\n"
-            ini += f"*.tower_{i}.mobility.initialY = {y:.2f}m\n"
-            ini += f"*.tower_{i}.app[0].typename = \"JammerApp\"\n"
-            ini += f"*.tower_{i}.jammerType = \"{p.get('strategy', 'constant')}\"\n"
-            ini += f"*.tower_{i}.transmissionPower = {p.get('txPower', 40)}dBm\n"
-            ini += f"*.tower_{i}.active = true\n"
+        if towers:
+            ini.comment("Towers")
+            ini.node_params("tower", [{
+                "mobility.typename": '"StaticGridMobility"',
+                "mobility.initialX": f"{x:.2f}m",
+                "mobility.initialY": f"{y:.2f}m",
+                "app[0].typename": '"JammerApp"',
+                "jammerType": f'"{t.params.get("strategy", "constant")}"',
+                "transmissionPower": f"{t.params.get('txPower', 40)}dBm",
+                "active": "true",
+            } for t, x, y in zip(towers, tower_xs, tower_ys)], vector=False)
 
-        for i, r in enumerate(rsus):
-            x, y = self._geo_to_xy(r.lat, r.lng)
-            ini += f"\n# RSU {i}\n"
-            ini += f"*.rsu_{i}.mobility.typename = \"StaticGridMobility\"\n"
-            ini += f"*.rsu_{i}.mobility.initialX = {x:.2f}m\n"
-            ini += f"*.rsu_{i}.mobility.initialY = {y:.2f}m\n"
+        if rsus:
+            ini.comment("RSUs")
+            ini.node_params("rsu", [{
+                "mobility.typename": '"StaticGridMobility"',
+                "mobility.initialX": f"{x:.2f}m",
+                "mobility.initialY": f"{y:.2f}m",
+            } for x, y in zip(rsu_xs, rsu_ys)], vector=False)
 
-        return ini
\ No newline at end of file
+        return ini.getvalue()
\ No newline at end of file
@@ -0,0 +1,87 @@
+"""Gazetteer local para localizar cidades sem o Nominatim.
+
+Aceita dois formatos:
+- CSV com cabeçalho contendo `name`, `lat`, `lon` (opcionalmente `population`);
+- dump do GeoNames (cities500.txt, allCountries.txt...): TSV sem cabeçalho, em que
+  os nomes alternativos também são indexados.
+
+Os nomes são comparados sem acentos e sem diferenciar maiúsculas. Para nomes
+repetidos vence o de maior população. "Cidade, País" cai para "Cidade" quando
+o nome completo não está no arquivo.
+"""
+import csv
+import logging
+import threading
+import unicodedata
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+# Colunas do dump do GeoNames
+_GEONAMES_NAME, _GEONAMES_ASCII, _GEONAMES_ALT, _GEONAMES_LAT, _GEONAMES_LON, _GEONAMES_POP = 1, 2, 3, 4, 5, 14
+
+
+def normalize(name: str) -> str:
+    decomposed = unicodedata.normalize("NFKD", name.casefold())
+    return " ".join("".join(c for c in decomposed if not unicodedata.combining(c)).split())
+
+
+class Gazetteer:
+    """Índice nome -> (lat, lon), carregado uma vez na primeira consulta."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._index: Optional[Dict[str, Tuple[float, float, int]]] = None
+        self._lock = threading.Lock()
+
+    def lookup(self, query: str) -> Optional[Tuple[float, float]]:
+        index = self._load()
+        key = normalize(query)
+        entry = index.get(key)
+        if entry is None and "," in key:
+            entry = index.get(key.split(",", 1)[0].strip())
+        return (entry[0], entry[1]) if entry else None
+
+    def _load(self) -> Dict[str, Tuple[float, float, int]]:
+        if self._index is not None:
+            return self._index
+        with self._lock:
+            if self._index is None:
+                index: Dict[str, Tuple[float, float, int]] = {}
+                with open(self.path, encoding="utf-8", newline="") as f:
+                    first = f.readline()
+                    f.seek(0)
+                    if first.count("\t") >= _GEONAMES_POP:
+                        self._read_geonames(f, index)
+                    else:
+                        self._read_csv(f, index)
+                logging.info(f"Gazetteer: {len(index)} names loaded from {self.path.name}")
+                self._index = index
+        return self._index
+
+    @staticmethod
+    def _add(index: dict, name: str, lat: float, lon: float, population: int):
+        key = normalize(name)
+        if key and (key not in index or index[key][2] < population):
+            index[key] = (lat, lon, population)
+
+    def _read_geonames(self, f, index: dict):
+        for line in f:
+            cols = line.rstrip("\n").split("\t")
+            if len(cols) <= _GEONAMES_POP:
+                continue
+            lat, lon = float(cols[_GEONAMES_LAT]), float(cols[_GEONAMES_LON])
+            population = int(cols[_GEONAMES_POP] or 0)
+            names = {cols[_GEONAMES_NAME], cols[_GEONAMES_ASCII], *cols[_GEONAMES_ALT].split(",")}
+            for name in names:
+                self._add(index, name, lat, lon, population)
+
+    def _read_csv(self, f, index: dict):
+        sample = f.read(4096)
+        f.seek(0)
+        reader = csv.DictReader(f, dialect=csv.Sniffer().sniff(sample, delimiters=",;\t"))
+        for row in reader:
+            try:
+                lat, lon = float(row["lat"]), float(row["lon"])
+            except (KeyError, TypeError, ValueError):
+                continue
+            self._add(index, row.get("name") or "", lat, lon, int(row.get("population") or 0))
@@ -0,0 +1,65 @@
+"""Emissão do omnetpp.ini: texto acumulado em lista (sem `ini +=` repetido) e
+parâmetros por nó agrupados em padrões do OMNeT++ (`car[0..499]`, `drone_{0..3}`).
+
+Os padrões gerados para uma mesma chave nunca se sobrepõem, então a ordem das
+linhas (primeira correspondência vence no OMNeT++) não altera o resultado, e o
+merge das varreduras (sweep_service.merge_ini) continua válido.
+"""
+from typing import Any, Iterable, List, Mapping, Sequence, Tuple
+
+
+def _selector(module: str, first: int, last: int, vector: bool) -> str:
+    # Sempre a faixa explícita, nunca `[*]`: nós além dos declarados (carros criados
+    # pelo Veins) não herdam os parâmetros dos nós fixos
+    if vector:
+        if first == last:
+            return f"{module}[{first}]"
+        return f"{module}[{first}..{last}]"
+    # Submódulos nomeados: drone_0, drone_1, ...
+    if first == last:
+        return f"{module}_{first}"
+    return f"{module}_{{{first}..{last}}}"
+
+
+def group_runs(nodes: Sequence[Mapping[str, Any]], key: str) -> Iterable[Tuple[int, int, Any]]:
+    """(primeiro, último, valor) de cada sequência contígua de nós com o mesmo valor em `key`."""
+    i, n = 0, len(nodes)
+    while i < n:
+        if key not in nodes[i]:
+            i += 1
+            continue
+        value = nodes[i][key]
+        j = i + 1
+        while j < n and key in nodes[j] and nodes[j][key] == value:
+            j += 1
+        yield i, j - 1, value
+        i = j
+
+
+class IniWriter:
+    def __init__(self, header: str = ""):
+        self._parts: List[str] = [header] if header else []
+
+    def text(self, block: str):
+        self._parts.append(block)
+
+    def comment(self, text: str):
+        self._parts.append(f"\n# {text}\n")
+
+    def param(self, pattern: str, value: Any):
+        self._parts.append(f"{pattern} = {value}\n")
+
+    def node_params(self, module: str, nodes: Sequence[Mapping[str, Any]], vector: bool = True):
+        """Parâmetros de `module[i]` (ou `module_i`, se `vector=False`) para cada
+        dicionário chave -> valor já formatado em `nodes`.
+
+        Nós vizinhos com o mesmo valor viram uma faixa (`[0..N-1]` se comum a
+        todos). Um nó sem a chave simplesmente não recebe a linha.
+        """
+        keys = dict.fromkeys(key for node in nodes for key in node)
+        for key in keys:
+            for first, last, value in group_runs(nodes, key):
+                self.param(f"*.{_selector(module, first, last, vector)}.{key}", value)
+
+    def getvalue(self) -> str:
+        return "".join(self._parts)
@@ -0,0 +1,266 @@
+import logging
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app.core import metrics
+from app.core.config import settings
+from app.core.job_store import CANCELLED, FAILED, FINISHED, QUEUED, RUNNING, SUCCEEDED, JobStore
+from app.core.progress import DONE, MAP_STAGES, PROGRESS, STAGES, Cancelled, cancel_scope, stage_reporter, tracked_stage
+from app.core.worker_pool import PoolSaturated, WorkerPool, map_pool, worker_pool
+from app.core.zip_stream import ZipMember, write_zip
+from app.models.expert_models import ExpertSimulationPayload
+from app.models.job_models import MapGenerationPayload
+from app.models.simulation import AdvancedSimulationPayload, SimulationPayload
+from app.services.advanced_simulation_service import AdvancedSimulationService
+from app.services.expert_simulation_service import ExpertSimulationService
+from app.services.map_generator_service import MapGeneratorService
+from app.services.simulation_service import SimulationService
+
+
+def _run_simple(payload: dict) -> Tuple[List[ZipMember], str]:
+    p = SimulationPayload(**payload)
+    return SimulationService().create_simulation_members(p), f"{p.simulation_name}.zip"
+
+
+def _run_advanced(payload: dict) -> Tuple[List[ZipMember], str]:
+    p = AdvancedSimulationPayload(**payload)
+    return AdvancedSimulationService().create_advanced_simulation_members(p), f"{p.simulation_name}.zip"
+
+
+def _run_expert(payload: dict) -> Tuple[List[ZipMember], str]:
+    p = ExpertSimulationPayload(**payload)
+    return ExpertSimulationService().generate_members(p), f"{p.simulation_name}_EXPERT.zip"
+
+
+def _run_map(payload: dict) -> Tuple[Path, str]:
+    p = MapGenerationPayload(**payload)
+    service = MapGeneratorService()
+    result = service.generate_map(p.city_name, p.size_km)
+    if result["status"] == "error":
+        raise RuntimeError(result["message"])
+    net_file = Path(result["full_path"])
+    with tracked_stage("precompute"):
+        service.precompute(net_file)
+    return net_file, result["file_name"]
+
+
+# Tipo de job -> função que gera os membros do ZIP (mesmos serviços dos endpoints síncronos)
+JOB_RUNNERS: Dict[str, Callable[[dict], Tuple[List[ZipMember], str]]] = {
+    "simple": _run_simple,
+    "advanced": _run_advanced,
+    "expert": _run_expert,
+}
+
+# Tipo de job -> função que produz um arquivo próprio (não é um ZIP do job nem é apagado ao expirar)
+FILE_RUNNERS: Dict[str, Callable[[dict], Tuple[Path, str]]] = {
+    "map": _run_map,
+}
+
+PAYLOAD_MODELS = {
+    "simple": SimulationPayload,
+    "advanced": AdvancedSimulationPayload,
+    "expert": ExpertSimulationPayload,
+    "map": MapGenerationPayload,
+}
+
+JOB_STAGES = {kind: STAGES for kind in JOB_RUNNERS}
+JOB_STAGES["map"] = MAP_STAGES
+
+
+class JobService:
+    """Geração assíncrona de cenários e mapas: o job é persistido, executado no
+    worker pool (jobs de mapa no map_pool) e o ZIP resultante fica em
+    JOBS_ARTIFACT_DIR até expirar (JOB_TTL_HOURS). Jobs de mapa apontam para o
+    .net.xml gerado.
+    """
+
+    def __init__(self, store: Optional[JobStore] = None, artifact_dir: Optional[Path] = None):
+        self.store = store or JobStore()
+        self.artifact_dir = Path(artifact_dir if artifact_dir is not None else settings.JOBS_ARTIFACT_DIR)
+        self._cleanup_lock = threading.Lock()
+        self._cleanup_stop = threading.Event()
+        # Job -> evento de cancelamento, verificado a cada relato de etapa
+        self._cancel_events: Dict[str, threading.Event] = {}
+        self._cancel_lock = threading.Lock()
+
+    @staticmethod
+    def _pool(kind: str) -> WorkerPool:
+        # Jobs de mapa rodam no próprio pool: nunca ocupam uma thread de geração de cenários
+        return map_pool if kind in FILE_RUNNERS else worker_pool
+
+    def submit(self, kind: str, payload: dict) -> dict:
+        """Cria o job e o enfileira. Levanta PoolSaturated se a fila estiver cheia."""
+        job = self.store.create(kind, payload)
+        try:
+            self._pool(kind).submit(self._execute, job["id"])
+        except PoolSaturated:
+            self.store.delete(job["id"])
+            raise
+        return job
+
+    def get(self, job_id: str) -> Optional[dict]:
+        return self.store.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[dict]:
+        """Cancela o job: na fila, de imediato; em execução, na próxima etapa
+        (o netconvert é interrompido). Jobs já terminados ficam como estão."""
+        job = self.store.get(job_id)
+        if job is None or job["status"] in FINISHED:
+            return job
+        self._cancel_event(job_id).set()
+        if job["status"] == QUEUED:
+            self.store.update(job_id, status=CANCELLED, error="Cancelled", finished_at=time.time())
+        return self.store.get(job_id)
+
+    def artifact_path(self, job: dict) -> Optional[Path]:
+        if job["status"] != SUCCEEDED or not job["artifact"]:
+            return None
+        path = Path(job["artifact"])
+        return path if path.exists() else None
+
+    def resume(self):
+        """Re-enfileira os jobs que não terminaram antes de um restart."""
+        for job in self.store.list_unfinished():
+            self.store.update(job["id"], status=QUEUED, stage=None, stages={})
+            try:
+                self._pool(job["kind"]).submit(self._execute, job["id"])
+                logging.info(f"Job {job['id']} resumed after restart")
+            except PoolSaturated:
+                self._fail(job["id"], {}, "Interrupted by server restart")
+
+    def cleanup(self):
+        """Apaga jobs terminados há mais de JOB_TTL_HOURS e seus artefatos."""
+        if not self._cleanup_lock.acquire(blocking=False):
+            return
+        try:
+            for job in self.store.expired(settings.JOB_TTL_HOURS * 3600):
+                if job["artifact"] and job["kind"] not in FILE_RUNNERS:
+                    Path(job["artifact"]).unlink(missing_ok=True)
+                self.store.delete(job["id"])
+        finally:
+            self._cleanup_lock.release()
+
+    def start_cleanup(self, interval: Optional[float] = None):
+        """Roda `cleanup` a cada `interval` segundos numa thread em segundo plano."""
+        interval = interval if interval is not None else settings.JOB_CLEANUP_INTERVAL_SECONDS
+        self._cleanup_stop.clear()
+
+        def loop():
+            while not self._cleanup_stop.wait(interval):
+                try:
+                    self.cleanup()
+                except Exception as e:
+                    logging.error(f"Job cleanup failed: {e}")
+
+        threading.Thread(target=loop, name="job-cleanup", daemon=True).start()
+
+    def stop_cleanup(self):
+        self._cleanup_stop.set()
+
+    # --- Execução (roda numa thread do worker pool) ---
+
+    def _execute(self, job_id: str):
+        job = self.store.get(job_id)
+        cancel = self._cancel_event(job_id)
+        if job is None or job["status"] in FINISHED or cancel.is_set():
+            with self._cancel_lock:
+                self._cancel_events.pop(job_id, None)
+            return
+        stages: Dict[str, dict] = {}
+        # Estágios do pipeline relatam de threads diferentes, ao mesmo tempo
+        stages_lock = threading.Lock()
+
+        def on_stage(stage: str, status: str, value: Optional[float]):
+            now = time.time()
+            with stages_lock:
+                if status == PROGRESS:
+                    info = stages.get(stage)
+                    if info is None or info["status"] != "running":
+                        return
+                    info["progress"] = value
+                elif status == DONE:
+                    info = stages.setdefault(stage, {"started_at": None})
+                    info.update(status="done", finished_at=now, seconds=value)
+                    info.pop("progress", None)
+                else:
+                    stages[stage] = {"status": "running", "started_at": now, "finished_at": None, "seconds": None}
+                # Etapa atual: a mais recente ainda em andamento
+                active = [name for name, info in stages.items() if info["status"] == "running"]
+                self.store.update(job_id, stage=active[-1] if active else None, stages=stages)
+
+        self.store.update(job_id, status=RUNNING)
+        try:
+            with stage_reporter(on_stage), cancel_scope(cancel), metrics.generation(job["kind"], background=True):
+                if job["kind"] in FILE_RUNNERS:
+                    artifact, filename = FILE_RUNNERS[job["kind"]](job["payload"])
+                else:
+                    members, filename = JOB_RUNNERS[job["kind"]](job["payload"])
+                    with tracked_stage("packaging"):
+                        artifact = self._store_artifact(job_id, members)
+        except Cancelled:
+            logging.info(f"Job {job_id} cancelled")
+            self._fail(job_id, stages, "Cancelled", status=CANCELLED)
+            return
+        except Exception as e:
+            logging.error(f"Job {job_id} failed: {e}")
+            self._fail(job_id, stages, str(e))
+            return
+        finally:
+            with self._cancel_lock:
+                self._cancel_events.pop(job_id, None)
+
+        now = time.time()
+        for name in JOB_STAGES[job["kind"]]:
+            info = stages.setdefault(name, {"status": "skipped", "started_at": None, "finished_at": None, "seconds": None})
+            if info["status"] == "running":
+                info["status"], info["finished_at"] = "done", now
+        self.store.update(
+            job_id, status=SUCCEEDED, stage=None, stages=stages,
+            filename=filename, artifact=str(artifact), finished_at=now,
+        )
+
+    def _cancel_event(self, job_id: str) -> threading.Event:
+        with self._cancel_lock:
+            return self._cancel_events.setdefault(job_id, threading.Event())
+
+    def _fail(self, job_id: str, stages: Dict[str, dict], error: str, status: str = FAILED):
+        for info in stages.values():
+            if info["status"] == "running":
+                info["status"] = "cancelled" if status == CANCELLED else "failed"
+        self.store.update(job_id, status=status, stages=stages, error=error, finished_at=time.time())
+
+    def _store_artifact(self, job_id: str, members: List[ZipMember]) -> Path:
+        self.artifact_dir.mkdir(parents=True, exist_ok=True)
+        path = self.artifact_dir / f"{job_id}.zip"
+        fd, tmp = tempfile.mkstemp(dir=self.artifact_dir, prefix=f".{job_id}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                write_zip(members, f)
+            os.replace(tmp, path)
+            metrics.count_zip_bytes(path.stat().st_size)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+        return path
+
+
+def job_progress(job: dict) -> float:
+    """Fração das etapas concluídas (etapas puladas contam como concluídas; as em
+    execução contam pelo andamento relatado)."""
+    if job["status"] == SUCCEEDED:
+        return 1.0
+    done = 0.0
+    for info in job["stages"].values():
+        if info["status"] in ("done", "skipped"):
+            done += 1
+        elif info["status"] == "running":
+            done += info.get("progress") or 0.0
+    return done / len(JOB_STAGES[job["kind"]])
+
+
+# Instância única do processo
+job_service = JobService()
@@ -1,26 +1,78 @@
-import subprocess
 import logging
+import os
 import sys
+import tempfile
 import requests
 from math import cos, radians
 from pathlib import Path
-from typing import Tuple, Optional
+from typing import Dict, Tuple, Optional
 
 from app.core.config import settings
+from app.core.deflate_cache import deflate_cache
+from app.core.map_catalog import map_catalog
+from app.core.net_cache import net_cache
+from app.core.progress import Cancelled, tracked_stage
+from app.services.gazetteer import Gazetteer
+from app.services.osm_cache import osm_cache
+from app.services.netconvert import NetconvertError, run_netconvert
+from app.services.osm_extract import clip_osm
 
 # --- Constantes ---
 NOMINATIM_URL = "https://nominatim.openstreetmap.org/search"
 OVERPASS_URL = "https://overpass-api.de/api/interpreter"
 USER_AGENT = "SUMO_V2X_Simulation_Script/1.1"
+# Opções do netconvert (fazem parte da chave das redes em cache)
+NETCONVERT_OPTIONS = [
+    '--geometry.remove',
+    '--ramps.guess',
+    '--junctions.join',
+    '--tls.guess-signals',
+    '--tls.discard-simple',
+    '--tls.join',
+    '--no-turnarounds.tls',
+    '--output.street-names'
+]
+_DOWNLOAD_CHUNK = 1024 * 1024
 
 logging.basicConfig(level=logging.INFO, 
                     format='%(asctime)s [%(levelname)s] - %(message)s',
                     datefmt='%Y-%m-%d %H:%M:%S')
 
+# Gazetteers já carregados, por caminho (o serviço é instanciado a cada requisição)
+_gazetteers: Dict[Path, Gazetteer] = {}
+
+
+def _gazetteer() -> Optional[Gazetteer]:
+    path = settings.GAZETTEER_PATH
+    if path is None:
+        return None
+    if path not in _gazetteers:
+        _gazetteers[path] = Gazetteer(path)
+    return _gazetteers[path]
+
+
 class MapGeneratorService:
 
+    @property
+    def offline(self) -> bool:
+        return settings.MAP_SOURCE == "local"
+
     def _get_coordinates(self, city: str) -> Optional[Tuple[float, float]]:
-        """Busca latitude e longitude da cidade usando Nominatim."""
+        """Busca latitude e longitude da cidade no gazetteer local e, no modo online, no Nominatim."""
+        gazetteer = _gazetteer()
+        if gazetteer is not None:
+            try:
+                coords = gazetteer.lookup(city)
+            except OSError as e:
+                logging.error(f"Erro ao ler o gazetteer: {e}")
+                coords = None
+            if coords:
+                logging.info(f"📍 Coordenadas encontradas para {city} no gazetteer: {coords}")
+                return coords
+        if self.offline:
+            logging.error(f"❌ Cidade '{city}' não encontrada no gazetteer local.")
+            return None
+
         params = {'q': city, 'format': 'json', 'limit': 1}
         headers = {'User-Agent': USER_AGENT}
         try:
@@ -69,85 +121,135 @@ class MapGeneratorService:
         """
         try:
             logging.info("Downloading OSM data...")
-            response = requests.post(OVERPASS_URL, data=query, headers={'User-Agent': USER_AGENT}, timeout=60)
-            response.raise_for_status()
-            with open(osm_file, 'w', encoding='utf-8') as f:
-                f.write(response.text)
+            with requests.post(OVERPASS_URL, data=query, headers={'User-Agent': USER_AGENT},
+                               timeout=60, stream=True) as response:
+                response.raise_for_status()
+                # Direto para o disco, sem manter a resposta inteira em memória
+                with open(osm_file, 'wb') as f:
+                    for chunk in response.iter_content(_DOWNLOAD_CHUNK):
+                        f.write(chunk)
             logging.info(f"🗺️ Dados OSM salvos em: {osm_file}")
             return True
         except requests.RequestException as e:
             logging.error(f"Erro na API Overpass: {e}")
             return False
 
+    def _extract_osm_data(self, lat_min, lat_max, lon_min, lon_max, osm_file: Path) -> bool:
+        """Recorta do extrato OSM local as vias da bounding box (equivalente à consulta ao Overpass)."""
+        extract = settings.OSM_EXTRACT_PATH
+        if extract is None or not extract.is_file():
+            logging.error(f"Extrato OSM local não encontrado: {extract}. Configure OSM_EXTRACT_PATH.")
+            return False
+        try:
+            logging.info(f"Recortando {extract.name}...")
+            result = clip_osm(extract, lat_min, lat_max, lon_min, lon_max, osm_file)
+        except (OSError, ValueError, SyntaxError) as e:
+            logging.error(f"Erro ao ler o extrato OSM: {e}")
+            return False
+        if not result["ways"]:
+            logging.error("Nenhuma via do extrato dentro da bounding box.")
+            return False
+        logging.info(f"🗺️ Dados OSM salvos em: {osm_file}")
+        return True
+
+    def _fetch_osm_data(self, lat_min, lat_max, lon_min, lon_max, osm_file: Path) -> bool:
+        if self.offline:
+            return self._extract_osm_data(lat_min, lat_max, lon_min, lon_max, osm_file)
+        return self._download_osm_data(lat_min, lat_max, lon_min, lon_max, osm_file)
+
+    def _source_id(self) -> str:
+        """Origem dos dados OSM, para que o cache não misture Overpass e extratos diferentes."""
+        if not self.offline:
+            return "overpass"
+        extract = settings.OSM_EXTRACT_PATH
+        try:
+            st = extract.stat()
+            return f"extract:{extract.resolve()}:{st.st_mtime_ns}:{st.st_size}"
+        except (AttributeError, OSError):
+            return f"extract:{extract}"
+
     def _convert_to_sumo(self, osm_file: Path, net_file: Path) -> bool:
         """Converte .osm para .net.xml usando netconvert."""
-        netconvert_cmd = [
-            settings.NETCONVERT_BIN,
-            '--osm-files', str(osm_file),
-            '-o', str(net_file),
-            '--geometry.remove',
-            '--ramps.guess',
-            '--junctions.join',
-            '--tls.guess-signals',
-            '--tls.discard-simple',
-            '--tls.join',
-            '--no-turnarounds.tls',
-            '--output.street-names'
-        ]
-        
         try:
             logging.info("Executando netconvert...")
-            subprocess.run(netconvert_cmd, check=True, capture_output=True, text=True)
+            run_netconvert(osm_file, net_file, NETCONVERT_OPTIONS)
             logging.info(f"SUMO network file created: {net_file}")
             return True
-        except subprocess.CalledProcessError as e:
-            logging.error(f"Falha no netconvert: {e.stderr}")
+        except NetconvertError as e:
+            logging.error(f"Falha no netconvert: {e}")
             return False
         except FileNotFoundError:
             logging.error(f"Erro: 'netconvert' não encontrado. Verifique SUMO_HOME em .env")
             return False
 
+    def precompute(self, net_file: Path):
+        """Deixa o mapa novo pronto para gerar cenários: catálogo (e .netpack), índices
+        usados no snapping, na validação de O/D e no roteamento, cópia pré-comprimida e tiles."""
+        map_catalog.refresh(force=True)  # Também agenda o pré-cálculo dos tiles
+        net = net_cache.get(net_file)
+        net.segment_index(passenger_only=True)
+        net.segment_index(main_component=True)
+        net.router()
+        deflate_cache.member(net_file, net_file.name)
+
     def generate_map(self, city_name: str, size_km: float) -> dict:
         """Função principal para gerar o mapa."""
         output_dir = settings.MAP_GENERATOR_OUTPUT_DIR
         output_dir.mkdir(parents=True, exist_ok=True)
-        
-        coords = self._get_coordinates(city_name)
-        if not coords:
-            raise Exception("City not found")
-        
-        lat, lon = coords
-        bounds = self._calculate_bounding_box(lat, lon, size_km)
-        lat_min, lat_max, lon_min, lon_max = bounds
-        
+
         city_safe_name = city_name.replace(' ', '_').lower()
-        osm_file = output_dir / f"temp_{city_safe_name}.osm"
         net_file = output_dir / f"{city_safe_name}_{int(size_km)}km.net.xml"
-        
-        try:
-            if not self._download_osm_data(lat_min, lat_max, lon_min, lon_max, osm_file):
-                raise Exception("OSM data download failed")
-                
-            if not self._convert_to_sumo(osm_file, net_file):
-                raise Exception("SUMO conversion failed")
-            
-            logging.info("✅ Map generation successful!")
-            return {
-                "status": "success",
-                "message": "Map generated successfully.",
-                "file_name": net_file.name,
-                "full_path": str(net_file)
-            }
-            
-        except Exception as e:
-            logging.error(f"Map generation failed: {e}")
-            return {"status": "error", "message": str(e)}
-        
-        finally:
-            # Limpa arquivo temporário
-            if osm_file.exists():
-                try:
-                    osm_file.unlink()
-                    logging.info("Temporary OSM file removed.")
-                except OSError as e:
-                    logging.warning(f"Could not remove temp OSM file: {e}")
\ No newline at end of file
+
+        # Pedidos idênticos simultâneos compartilham uma única geração
+        with osm_cache.single_flight(f"map:{net_file.name}"):
+            with tracked_stage("geocode"):
+                coords = osm_cache.geocode(city_name, self._get_coordinates)
+            if not coords:
+                raise Exception("City not found")
+
+            lat, lon = coords
+            bounds = self._calculate_bounding_box(lat, lon, size_km)
+            source = self._source_id()
+            # Arquivo .osm temporário próprio desta chamada: jobs da mesma cidade com
+            # tamanhos diferentes rodam em paralelo no map_pool
+            fd, tmp = tempfile.mkstemp(dir=output_dir, prefix=f"temp_{city_safe_name}.", suffix=".osm")
+            os.close(fd)
+            osm_file = Path(tmp)
+
+            def build(out_file: Path) -> bool:
+                with tracked_stage("osm_data"):
+                    osm_path = osm_cache.extract(source, bounds, self._fetch_osm_data, osm_file)
+                if osm_path is None:
+                    raise Exception("OSM extract clipping failed" if self.offline else "OSM data download failed")
+                with tracked_stage("netconvert"):
+                    if not self._convert_to_sumo(osm_path, out_file):
+                        raise Exception("SUMO conversion failed")
+                return True
+
+            try:
+                osm_cache.net(osm_cache.net_key(source, bounds, NETCONVERT_OPTIONS), net_file, build)
+
+                logging.info("✅ Map generation successful!")
+                return {
+                    "status": "success",
+                    "message": "Map generated successfully.",
+                    "file_name": net_file.name,
+                    "full_path": str(net_file)
+                }
+
+            except Cancelled:
+                logging.info(f"Map generation cancelled: {net_file.name}")
+                raise
+
+            except Exception as e:
+                logging.error(f"Map generation failed: {e}")
+                return {"status": "error", "message": str(e)}
+
+            finally:
+                # Limpa arquivo temporário (os extratos em cache ficam em osm_cache)
+                if osm_file.exists():
+                    try:
+                        osm_file.unlink()
+                        logging.info("Temporary OSM file removed.")
+                    except OSError as e:
+                        logging.warning(f"Could not remove temp OSM file: {e}")
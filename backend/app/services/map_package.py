@@ -0,0 +1,107 @@
+import json
+import os
+from typing import List
+
+from app.core.config import settings
+from app.core.deflate_cache import deflate_cache
+from app.core.disk_cache import content_hash
+from app.core.zip_stream import ZipMember
+
+# Modos de empacotamento do mapa nos ZIPs de cenário
+EMBEDDED = "embedded"    # .net.xml dentro do ZIP (padrão)
+REFERENCE = "reference"  # só o manifesto; o mapa é baixado de /api/maps/{name}/blob
+
+MANIFEST_NAME = "map.json"
+FETCH_SCRIPT_NAME = "fetch_map.py"
+
+
+def map_blob_url(map_name: str, sha256: str) -> str:
+    """Caminho do endpoint do mapa, fixado na versão pelo hash (cacheável para sempre)."""
+    return f"/api/maps/{map_name}/blob?sha256={sha256}"
+
+
+def map_members(folder: str, map_name: str, mode: str = EMBEDDED) -> List[ZipMember]:
+    """Membros do ZIP referentes ao mapa: o próprio arquivo, ou manifesto + script de download."""
+    map_path = settings.SUMO_MAPS_DIR / map_name
+    if not map_path.exists():
+        return []
+    if mode != REFERENCE:
+        # Cópia pré-comprimida: o mapa não é recomprimido a cada pacote
+        arcname = f"{folder}/{map_name}"
+        return [(arcname, deflate_cache.member(map_path, arcname))]
+
+    sha256 = content_hash(map_path)
+    manifest = {
+        "name": map_name,
+        "sha256": sha256,
+        "size": os.path.getsize(map_path),
+        "url": map_blob_url(map_name, sha256),
+        "server": settings.PUBLIC_BASE_URL,
+    }
+    return [
+        (f"{folder}/{MANIFEST_NAME}", json.dumps(manifest, indent=2)),
+        (f"{folder}/{FETCH_SCRIPT_NAME}", FETCH_SCRIPT),
+    ]
+
+
+# Script incluído nos pacotes em modo referência (só biblioteca padrão do Python)
+FETCH_SCRIPT = '''#!/usr/bin/env python3
+"""Baixa o mapa SUMO referenciado em map.json e confere o SHA-256.
+
+Uso: python3 fetch_map.py [--server URL] [--verify]
+O servidor também pode vir da variável SCENARIO_SERVER.
+"""
+import argparse
+import hashlib
+import json
+import os
+import sys
+import urllib.request
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def sha256_of(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def main():
+    with open(os.path.join(HERE, "map.json")) as f:
+        manifest = json.load(f)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--server", default=os.environ.get("SCENARIO_SERVER", manifest["server"]))
+    parser.add_argument("--verify", action="store_true", help="only check the local copy")
+    args = parser.parse_args()
+
+    target = os.path.join(HERE, manifest["name"])
+    if os.path.exists(target) and sha256_of(target) == manifest["sha256"]:
+        print(f"{manifest['name']}: OK")
+        return 0
+    if args.verify:
+        print(f"{manifest['name']}: missing or hash mismatch", file=sys.stderr)
+        return 1
+
+    url = args.server.rstrip("/") + manifest["url"]
+    print(f"Downloading {url}")
+    tmp = target + ".part"
+    digest = hashlib.sha256()
+    with urllib.request.urlopen(url) as resp, open(tmp, "wb") as out:
+        for chunk in iter(lambda: resp.read(1 << 20), b""):
+            digest.update(chunk)
+            out.write(chunk)
+    if digest.hexdigest() != manifest["sha256"]:
+        os.remove(tmp)
+        print(f"{manifest['name']}: hash mismatch after download", file=sys.stderr)
+        return 1
+    os.replace(tmp, target)
+    print(f"{manifest['name']}: OK")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
+'''
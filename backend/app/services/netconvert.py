@@ -0,0 +1,143 @@
+"""Execução do netconvert: processos limitados, andamento e cancelamento.
+
+No máximo NETCONVERT_MAX_PROCS processos rodam ao mesmo tempo; cada um roda com
+prioridade reduzida (NETCONVERT_NICE) e, se configurados, limites de memória e
+de tempo de CPU. Com --verbose o netconvert imprime uma linha "<passo> ... done"
+por fase, convertida em andamento da etapa "netconvert".
+"""
+import contextvars
+import logging
+import os
+import re
+import signal
+import subprocess
+import threading
+from collections import deque
+from pathlib import Path
+from typing import List, Optional, Sequence
+
+from app.core.config import settings
+from app.core.progress import Cancelled, cancel_requested, report_progress
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Opções que não alteram a rede gerada (ficam fora da chave do cache de redes)
+RUN_OPTIONS = ["--verbose", "--aggregate-warnings", "5"]
+
+# Fração do tempo típico já decorrida ao fim de cada fase (a leitura do OSM domina)
+_MILESTONES = {
+    "Parsing nodes from osm-file": 0.20,
+    "Parsing edges from osm-file": 0.35,
+    "Removing duplicate edges": 0.38,
+    "Joining junction clusters": 0.45,
+    "Removing empty nodes and geometry nodes": 0.50,
+    "Computing turning directions": 0.55,
+    "Computing node shapes": 0.62,
+    "Computing edge shapes": 0.68,
+    "Computing approaching lanes": 0.72,
+    "Computing node logics": 0.80,
+    "Computing traffic light logics": 0.83,
+    "Building inner edges": 0.90,
+    "Writing network": 1.00,
+}
+_STEP_DONE = re.compile(r"^(.+?)(?: '[^']*')? \.\.\. done")
+# Intervalo entre verificações de cancelamento enquanto espera vaga ou o processo
+_POLL_SECONDS = 0.5
+
+_slots_lock = threading.Lock()
+_slots: Optional[threading.BoundedSemaphore] = None
+
+
+class NetconvertError(RuntimeError):
+    pass
+
+
+def _semaphore() -> threading.BoundedSemaphore:
+    global _slots
+    with _slots_lock:
+        if _slots is None:
+            _slots = threading.BoundedSemaphore(max(1, settings.NETCONVERT_MAX_PROCS))
+        return _slots
+
+
+def _limit_resources():
+    # Roda no processo filho, antes do exec
+    if settings.NETCONVERT_NICE:
+        os.nice(settings.NETCONVERT_NICE)
+    if resource is None:
+        return
+    if settings.NETCONVERT_MEMORY_MB > 0:
+        limit = settings.NETCONVERT_MEMORY_MB * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    if settings.NETCONVERT_CPU_SECONDS > 0:
+        resource.setrlimit(resource.RLIMIT_CPU, (settings.NETCONVERT_CPU_SECONDS, settings.NETCONVERT_CPU_SECONDS))
+
+
+def _follow(stdout, tail: deque):
+    progress = 0.0
+    for line in stdout:
+        line = line.rstrip()
+        tail.append(line)
+        match = _STEP_DONE.match(line.strip())
+        fraction = _MILESTONES.get(match.group(1)) if match else None
+        if fraction is not None and fraction > progress:
+            progress = fraction
+            try:
+                report_progress("netconvert", progress)
+            except Cancelled:
+                pass  # Quem mata o processo é o laço de run_netconvert
+
+
+def _kill(proc: subprocess.Popen):
+    if os.name == "posix":
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+    else:
+        proc.kill()
+    proc.wait()
+
+
+def run_netconvert(osm_file: Path, net_file: Path, options: Sequence[str]):
+    """Converte `osm_file` em `net_file`. Levanta NetconvertError em caso de falha
+    e Cancelled (matando o processo) se a geração for cancelada."""
+    cmd: List[str] = [settings.NETCONVERT_BIN, '--osm-files', str(osm_file), '-o', str(net_file), *options, *RUN_OPTIONS]
+    slots = _semaphore()
+    while not slots.acquire(timeout=_POLL_SECONDS):
+        if cancel_requested():
+            raise Cancelled("Cancelled")
+    try:
+        if cancel_requested():
+            raise Cancelled("Cancelled")
+        tail: deque = deque(maxlen=20)
+        limited = settings.NETCONVERT_NICE or settings.NETCONVERT_MEMORY_MB > 0 or settings.NETCONVERT_CPU_SECONDS > 0
+        proc = subprocess.Popen(
+            cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, errors="replace",
+            preexec_fn=_limit_resources if limited and os.name == "posix" else None,
+            # Grupo próprio: o cancelamento mata também eventuais subprocessos
+            start_new_session=os.name == "posix",
+        )
+        # O leitor herda o contexto para relatar o andamento ao job
+        reader = threading.Thread(target=contextvars.copy_context().run, args=(_follow, proc.stdout, tail), daemon=True)
+        reader.start()
+        try:
+            while True:
+                try:
+                    proc.wait(timeout=_POLL_SECONDS)
+                    break
+                except subprocess.TimeoutExpired:
+                    if cancel_requested():
+                        logging.info(f"Cancelling netconvert (pid {proc.pid})")
+                        _kill(proc)
+                        raise Cancelled("Cancelled")
+        finally:
+            reader.join()
+            proc.stdout.close()
+        if proc.returncode != 0:
+            raise NetconvertError(f"netconvert exited with code {proc.returncode}: " + "\n".join(tail))
+    finally:
+        slots.release()
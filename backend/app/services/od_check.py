@@ -0,0 +1,72 @@
+"""Validação dos pares origem/destino (O/D) das rotas antes de montar o pacote.
+
+Usa as componentes fortemente conexas gravadas no .netpack (CompiledNet.od_feasible),
+então cada par custa O(1). Um par sem rota (origem num trecho de mão única sem
+saída, destino num fragmento isolado etc.) faria o SUMO descartar o veículo só
+durante a co-simulação.
+"""
+import logging
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+from app.core.netpack import FROM_MAIN, REACHES_MAIN, CompiledNet
+
+# Políticas para pares sem rota
+RESNAP = "resnap"  # Move a ponta problemática para a rua mais próxima da malha principal
+ERROR = "error"    # Recusa o cenário, listando os pares
+
+
+class UnroutableODError(ValueError):
+    """Pares O/D sem rota possível (política "error")."""
+
+    def __init__(self, problems: List[str]):
+        super().__init__(f"{len(problems)} route(s) cannot be driven: " + "; ".join(problems))
+        self.problems = problems
+
+
+def _describe(net: CompiledNet, name: str, f: int, t: int) -> str:
+    edge_ids, reach = net.edge_ids, net.arrays["edge_reach"]
+    reasons = []
+    if not reach[f] & REACHES_MAIN:
+        reasons.append(f"origin edge '{edge_ids[f]}' has no way out to the main road network")
+    if not reach[t] & FROM_MAIN:
+        reasons.append(f"destination edge '{edge_ids[t]}' cannot be entered from the main road network")
+    if not reasons:
+        reasons.append(f"no route from edge '{edge_ids[f]}' to edge '{edge_ids[t]}'")
+    return f"{name}: " + " and ".join(reasons)
+
+
+def check_od(net: CompiledNet, from_edges: np.ndarray, to_edges: np.ndarray,
+             from_xy: Tuple[np.ndarray, np.ndarray], to_xy: Tuple[np.ndarray, np.ndarray],
+             names: Sequence[str], policy: str = RESNAP) -> Tuple[np.ndarray, np.ndarray]:
+    """Índices (origens, destinos) com rota garantida.
+
+    `from_edges`/`to_edges` são as edges já encontradas para os pontos `from_xy`/`to_xy`
+    (coordenadas SUMO). Com RESNAP, as pontas sem rota são re-encaixadas na maior
+    componente; com ERROR, levanta UnroutableODError descrevendo cada par.
+    """
+    from_edges = np.array(from_edges, dtype=np.int64)
+    to_edges = np.array(to_edges, dtype=np.int64)
+    if not len(from_edges):
+        return from_edges, to_edges
+    bad = np.flatnonzero(~net.od_feasible(from_edges, to_edges))
+    if not bad.size:
+        return from_edges, to_edges
+
+    if policy == ERROR:
+        raise UnroutableODError([_describe(net, names[i], from_edges[i], to_edges[i]) for i in bad])
+
+    reach = net.arrays["edge_reach"]
+    # Origem precisa chegar à malha principal e o destino ser alcançável dela
+    fix_from = bad[(reach[from_edges[bad]] & REACHES_MAIN) == 0]
+    fix_to = bad[(reach[to_edges[bad]] & FROM_MAIN) == 0]
+    for fix, edges, (xs, ys) in ((fix_from, from_edges, from_xy), (fix_to, to_edges, to_xy)):
+        if fix.size:
+            snapped, _ = net.nearest_edges(np.asarray(xs)[fix], np.asarray(ys)[fix], main_component=True)
+            edges[fix] = snapped
+    logging.warning(
+        f"{bad.size} route(s) without a drivable path re-snapped to the main road network: "
+        + ", ".join(names[i] for i in bad[:10]) + ("..." if bad.size > 10 else "")
+    )
+    return from_edges, to_edges
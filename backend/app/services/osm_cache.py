@@ -0,0 +1,348 @@
+"""Cache persistente do gerador de mapas (geocodificação, extratos OSM e redes geradas).
+
+Fica em MAP_GENERATOR_CACHE_DIR (padrão: `<MAP_GENERATOR_OUTPUT_DIR>/.cache`), com
+um índice SQLite e os arquivos em `osm/` e `nets/`:
+
+- geocodificações por nome normalizado da cidade;
+- extratos OSM brutos por bounding box: uma bbox menor é atendida recortando um
+  extrato em cache que a contenha, sem ir ao Overpass;
+- redes por (origem, bbox, opções do netconvert), copiadas para o diretório de
+  saída sem rodar o netconvert de novo.
+
+O limite de tamanho é aplicado com LRU (último uso) sobre extratos e redes.
+MAP_GENERATOR_CACHE_MAX_MB igual a zero desativa o cache.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+from app.core.config import settings
+from app.core.disk_cache import content_hash
+from app.services.gazetteer import normalize
+from app.services.osm_extract import clip_osm
+
+BBox = Tuple[float, float, float, float]  # lat_min, lat_max, lon_min, lon_max
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS geocodes (
+    query      TEXT PRIMARY KEY,
+    lat        REAL NOT NULL,
+    lon        REAL NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS extracts (
+    key        TEXT PRIMARY KEY,
+    source     TEXT NOT NULL,
+    lat_min    REAL NOT NULL,
+    lat_max    REAL NOT NULL,
+    lon_min    REAL NOT NULL,
+    lon_max    REAL NOT NULL,
+    size       INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    used_at    REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS extracts_source ON extracts (source, lat_min, lon_min);
+CREATE TABLE IF NOT EXISTS nets (
+    key        TEXT PRIMARY KEY,
+    sha256     TEXT NOT NULL,
+    size       INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    used_at    REAL NOT NULL
+);
+"""
+
+# Casas decimais das bboxes nas chaves (~10 cm)
+_BBOX_DIGITS = 6
+
+
+def _round_bbox(bbox: Sequence[float]) -> BBox:
+    return tuple(round(v, _BBOX_DIGITS) for v in bbox)
+
+
+def _hash(**params) -> str:
+    return hashlib.sha256(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class OsmCache:
+    def __init__(self, cache_dir: Optional[Path] = None, max_bytes: Optional[int] = None):
+        self._cache_dir = cache_dir
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._conn_dir: Optional[Path] = None
+        # Chave -> lock da geração em andamento (uma única geração por chave)
+        self._building: Dict[str, threading.Lock] = {}
+
+        self.geocode_hits = 0
+        self.extract_hits = 0
+        self.extract_clips = 0
+        self.net_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def cache_dir(self) -> Path:
+        if self._cache_dir is not None:
+            return Path(self._cache_dir)
+        if settings.MAP_GENERATOR_CACHE_DIR is not None:
+            return settings.MAP_GENERATOR_CACHE_DIR
+        return settings.MAP_GENERATOR_OUTPUT_DIR / ".cache"
+
+    @property
+    def max_bytes(self) -> int:
+        return self._max_bytes if self._max_bytes is not None else settings.MAP_GENERATOR_CACHE_MAX_MB * 1024 * 1024
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    @contextmanager
+    def single_flight(self, key: str):
+        """Serializa o trabalho de uma mesma chave; quem esperou encontra o resultado no cache."""
+        with self._lock:
+            build_lock = self._building.setdefault(key, threading.Lock())
+        with build_lock:
+            try:
+                yield
+            finally:
+                with self._lock:
+                    self._building.pop(key, None)
+
+    # --- Geocodificação ---
+
+    def geocode(self, query: str, resolve: Callable[[str], Optional[Tuple[float, float]]]) -> Optional[Tuple[float, float]]:
+        """Coordenadas da cidade, resolvidas com `resolve` só na primeira vez (falhas não ficam em cache)."""
+        if not self.enabled:
+            return resolve(query)
+        key = normalize(query)
+        with self._lock:
+            row = self._connect().execute("SELECT lat, lon FROM geocodes WHERE query = ?", (key,)).fetchone()
+        if row is not None:
+            self.geocode_hits += 1
+            return row["lat"], row["lon"]
+        coords = resolve(query)
+        if coords:
+            with self._lock:
+                self._connect().execute(
+                    "INSERT OR REPLACE INTO geocodes (query, lat, lon, created_at) VALUES (?, ?, ?, ?)",
+                    (key, coords[0], coords[1], time.time()),
+                )
+        return coords
+
+    # --- Extratos OSM ---
+
+    def extract(self, source: str, bbox: Sequence[float], fetch: Callable[[float, float, float, float, Path], bool],
+                scratch: Path) -> Optional[Path]:
+        """Arquivo .osm com as vias da bbox.
+
+        Usa, nesta ordem: o extrato em cache da mesma bbox; um recorte (gravado em
+        `scratch`) do menor extrato em cache que a contenha; `fetch(*bbox, arquivo)`,
+        cujo resultado entra no cache. Retorna None se `fetch` falhar.
+        """
+        bbox = _round_bbox(bbox)
+        if not self.enabled:
+            return scratch if fetch(*bbox, scratch) else None
+
+        key = _hash(source=source, bbox=bbox)
+        with self.single_flight(f"osm:{key}"):
+            found = self._containing_extract(source, bbox)
+            if found is not None:
+                found_key, exact = found
+                path = self._extract_path(found_key)
+                if exact:
+                    self.extract_hits += 1
+                    return path
+                logging.info(f"OSM cache: clipping cached extract {found_key[:12]}")
+                clip_osm(path, *bbox, scratch)
+                self.extract_clips += 1
+                return scratch
+
+            self.misses += 1
+            path = self._extract_path(key)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{key}.", suffix=".tmp")
+            os.close(fd)
+            try:
+                if not fetch(*bbox, Path(tmp)):
+                    return None
+                os.replace(tmp, path)
+            finally:
+                Path(tmp).unlink(missing_ok=True)
+            now = time.time()
+            self._record("extracts", {
+                "key": key, "source": source,
+                "lat_min": bbox[0], "lat_max": bbox[1], "lon_min": bbox[2], "lon_max": bbox[3],
+                "size": path.stat().st_size, "created_at": now, "used_at": now,
+            })
+            return path
+
+    # --- Redes geradas ---
+
+    def net_key(self, source: str, bbox: Sequence[float], options: Sequence[str]) -> str:
+        return _hash(source=source, bbox=_round_bbox(bbox), options=list(options))
+
+    def net(self, key: str, net_file: Path, build: Callable[[Path], bool]) -> bool:
+        """Coloca em `net_file` a rede da chave, gerando-a com `build(arquivo)` se não estiver em cache."""
+        if not self.enabled:
+            return build(net_file)
+
+        with self.single_flight(f"net:{key}"):
+            cached = self._net_path(key)
+            with self._lock:
+                row = self._connect().execute("SELECT sha256 FROM nets WHERE key = ?", (key,)).fetchone()
+            if row is not None and cached.is_file():
+                self.net_hits += 1
+                self._touch("nets", key)
+                if not (net_file.is_file() and content_hash(net_file) == row["sha256"]):
+                    self._copy(cached, net_file)
+                return True
+
+            cached.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=cached.parent, prefix=f".{key}.", suffix=".net.xml")
+            os.close(fd)
+            try:
+                if not build(Path(tmp)):
+                    return False
+                os.replace(tmp, cached)
+            finally:
+                Path(tmp).unlink(missing_ok=True)
+            now = time.time()
+            self._record("nets", {
+                "key": key, "sha256": content_hash(cached), "size": cached.stat().st_size,
+                "created_at": now, "used_at": now,
+            })
+            self._copy(cached, net_file)
+            return True
+
+    def stats(self) -> dict:
+        counts = {"extracts": 0, "nets": 0, "geocodes": 0}
+        total = 0
+        if self.enabled:
+            with self._lock:
+                conn = self._connect()
+                for table in counts:
+                    counts[table] = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                total = self._total_bytes(conn)
+        return {
+            "enabled": self.enabled,
+            "directory": str(self.cache_dir),
+            **counts,
+            "geocode_hits": self.geocode_hits,
+            "extract_hits": self.extract_hits,
+            "extract_clips": self.extract_clips,
+            "net_hits": self.net_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "current_bytes": total,
+            "max_bytes": self.max_bytes,
+        }
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    # --- Internos ---
+
+    def _connect(self) -> sqlite3.Connection:
+        cache_dir = self.cache_dir
+        if self._conn is not None and self._conn_dir != cache_dir:
+            self._conn.close()
+            self._conn = None
+        if self._conn is None:
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(cache_dir / "index.sqlite3"), check_same_thread=False, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            self._conn, self._conn_dir = conn, cache_dir
+        return self._conn
+
+    def _extract_path(self, key: str) -> Path:
+        return self.cache_dir / "osm" / f"{key}.osm"
+
+    def _net_path(self, key: str) -> Path:
+        return self.cache_dir / "nets" / f"{key}.net.xml"
+
+    def _containing_extract(self, source: str, bbox: BBox) -> Optional[Tuple[str, bool]]:
+        """(chave, mesma bbox?) do menor extrato em cache que contém a bbox."""
+        lat_min, lat_max, lon_min, lon_max = bbox
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT key, lat_min, lat_max, lon_min, lon_max FROM extracts "
+                "WHERE source = ? AND lat_min <= ? AND lat_max >= ? AND lon_min <= ? AND lon_max >= ? "
+                "ORDER BY (lat_max - lat_min) * (lon_max - lon_min)",
+                (source, lat_min, lat_max, lon_min, lon_max),
+            ).fetchall()
+        for row in rows:
+            if self._extract_path(row["key"]).is_file():
+                self._touch("extracts", row["key"])
+                exact = (row["lat_min"], row["lat_max"], row["lon_min"], row["lon_max"]) == bbox
+                return row["key"], exact
+            self._forget("extracts", row["key"])
+        return None
+
+    def _record(self, table: str, record: dict):
+        columns = ", ".join(record)
+        with self._lock:
+            conn = self._connect()
+            conn.execute(f"INSERT OR REPLACE INTO {table} ({columns}) VALUES ({', '.join('?' * len(record))})",
+                         tuple(record.values()))
+            if self._total_bytes(conn) > self.max_bytes:
+                self._evict(conn, keep=record["key"])
+
+    def _touch(self, table: str, key: str):
+        with self._lock:
+            self._connect().execute(f"UPDATE {table} SET used_at = ? WHERE key = ?", (time.time(), key))
+
+    def _forget(self, table: str, key: str):
+        with self._lock:
+            self._connect().execute(f"DELETE FROM {table} WHERE key = ?", (key,))
+
+    @staticmethod
+    def _total_bytes(conn: sqlite3.Connection) -> int:
+        return conn.execute(
+            "SELECT COALESCE((SELECT SUM(size) FROM extracts), 0) + COALESCE((SELECT SUM(size) FROM nets), 0)"
+        ).fetchone()[0]
+
+    def _evict(self, conn: sqlite3.Connection, keep: str):
+        entries = conn.execute(
+            "SELECT 'extracts' AS tbl, key, size, used_at FROM extracts "
+            "UNION ALL SELECT 'nets', key, size, used_at FROM nets ORDER BY used_at"
+        ).fetchall()
+        total = sum(row["size"] for row in entries)
+        for row in entries:
+            if total <= self.max_bytes:
+                break
+            if row["key"] == keep:
+                continue
+            path = self._extract_path(row["key"]) if row["tbl"] == "extracts" else self._net_path(row["key"])
+            path.unlink(missing_ok=True)
+            conn.execute(f"DELETE FROM {row['tbl']} WHERE key = ?", (row["key"],))
+            total -= row["size"]
+            self.evictions += 1
+
+    @staticmethod
+    def _copy(src: Path, dst: Path):
+        # Cópia atômica: o catálogo nunca vê um .net.xml pela metade
+        fd, tmp = tempfile.mkstemp(dir=dst.parent, prefix=f".{dst.name}.", suffix=".tmp")
+        os.close(fd)
+        try:
+            shutil.copyfile(src, tmp)
+            os.replace(tmp, dst)
+        finally:
+            Path(tmp).unlink(missing_ok=True)
+
+
+# Instância única do processo
+osm_cache = OsmCache()
@@ -0,0 +1,315 @@
+"""Recorte de extratos OSM locais (.osm, .osm.gz, .osm.bz2, .osm.pbf) por bounding box.
+
+Substitui a consulta ao Overpass (`way["highway"](bbox); (._;>;);`) quando não há
+rede: seleciona as vias com algum nó dentro da bbox e inclui todos os nós
+dessas vias. O arquivo é lido em streaming, em duas passadas:
+
+1. guarda os IDs dos nós dentro da bbox e grava num arquivo temporário as vias
+   selecionadas, juntando os nós que elas referenciam;
+2. relê os nós e grava os referenciados, seguidos das vias do arquivo temporário.
+
+A memória fica limitada ao conteúdo da bbox, não ao tamanho do extrato. Assume
+a ordem padrão dos extratos (todos os nós antes das vias).
+"""
+import bz2
+import gzip
+import logging
+import shutil
+import struct
+import tempfile
+import time
+import xml.etree.ElementTree as ET
+import zlib
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, NamedTuple, Tuple, Union
+from xml.sax.saxutils import quoteattr
+
+import numpy as np
+
+# Nós por bloco lidos do XML (os blocos do PBF já vêm agrupados)
+_XML_BLOCK = 8192
+
+
+class NodeBlock(NamedTuple):
+    ids: np.ndarray      # int64
+    lats: np.ndarray     # graus
+    lons: np.ndarray
+    tags: Callable[[int], Dict[str, str]]  # tags do i-ésimo nó, decodificadas sob demanda
+
+
+class Way(NamedTuple):
+    id: int
+    refs: np.ndarray     # int64
+    tags: Dict[str, str]
+
+
+Element = Union[NodeBlock, Way]
+
+
+# --- Leitura do XML ---
+
+def _open_xml(path: Path):
+    name = path.name
+    if name.endswith(".gz"):
+        return gzip.open(path, "rb")
+    if name.endswith(".bz2"):
+        return bz2.open(path, "rb")
+    return open(path, "rb")
+
+
+def _read_xml(path: Path) -> Iterator[Element]:
+    ids: List[int] = []
+    lats: List[float] = []
+    lons: List[float] = []
+    node_tags: List[Dict[str, str]] = []
+    tags: Dict[str, str] = {}
+    refs: List[int] = []
+
+    def flush() -> NodeBlock:
+        block_tags = list(node_tags)
+        block = NodeBlock(np.asarray(ids, dtype=np.int64), np.asarray(lats), np.asarray(lons), block_tags.__getitem__)
+        ids.clear(), lats.clear(), lons.clear(), node_tags.clear()
+        return block
+
+    with _open_xml(path) as f:
+        context = ET.iterparse(f, events=("start", "end"))
+        _, root = next(context)
+        for event, elem in context:
+            tag = elem.tag
+            if event == "start":
+                if tag in ("node", "way", "relation"):
+                    tags, refs = {}, []
+                continue
+            if tag == "tag":
+                tags[elem.get("k")] = elem.get("v", "")
+            elif tag == "nd":
+                refs.append(int(elem.get("ref")))
+            elif tag == "node":
+                ids.append(int(elem.get("id")))
+                lats.append(float(elem.get("lat")))
+                lons.append(float(elem.get("lon")))
+                node_tags.append(tags)
+                if len(ids) >= _XML_BLOCK:
+                    yield flush()
+                root.clear()
+            elif tag == "way":
+                if ids:
+                    yield flush()
+                yield Way(int(elem.get("id")), np.asarray(refs, dtype=np.int64), tags)
+                root.clear()
+            elif tag == "relation":
+                root.clear()
+        if ids:
+            yield flush()
+
+
+# --- Leitura do PBF (https://wiki.openstreetmap.org/wiki/PBF_Format) ---
+
+def _varint(buf: bytes, pos: int) -> Tuple[int, int]:
+    result = shift = 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+
+def _fields(buf: bytes) -> Iterator[Tuple[int, Union[int, bytes]]]:
+    """(campo, valor) de uma mensagem protobuf; varints como int, o resto como bytes."""
+    pos, end = 0, len(buf)
+    while pos < end:
+        key, pos = _varint(buf, pos)
+        field, wire = key >> 3, key & 7
+        if wire == 0:
+            value, pos = _varint(buf, pos)
+        elif wire == 2:
+            size, pos = _varint(buf, pos)
+            value, pos = buf[pos:pos + size], pos + size
+        elif wire == 1:
+            value, pos = buf[pos:pos + 8], pos + 8
+        elif wire == 5:
+            value, pos = buf[pos:pos + 4], pos + 4
+        else:
+            raise ValueError(f"Unsupported protobuf wire type {wire}")
+        yield field, value
+
+
+def _packed(buf: bytes) -> np.ndarray:
+    """Varints empacotados decodificados de uma vez (uint64)."""
+    data = np.frombuffer(buf, dtype=np.uint8)
+    if not len(data):
+        return np.empty(0, dtype=np.uint64)
+    ends = np.flatnonzero(data < 0x80)
+    starts = np.empty_like(ends)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+    position = np.arange(len(data)) - np.repeat(starts, ends - starts + 1)
+    parts = (data & 0x7F).astype(np.uint64) << (position * 7).astype(np.uint64)
+    return np.add.reduceat(parts, starts)
+
+
+def _zigzag(values: np.ndarray) -> np.ndarray:
+    return (values >> np.uint64(1)).astype(np.int64) ^ -(values & np.uint64(1)).astype(np.int64)
+
+
+def _read_pbf_blobs(path: Path) -> Iterator[Tuple[str, bytes]]:
+    with open(path, "rb") as f:
+        while True:
+            prefix = f.read(4)
+            if len(prefix) < 4:
+                return
+            header = dict(_fields(f.read(struct.unpack(">I", prefix)[0])))
+            blob = dict(_fields(f.read(header[3])))
+            if 1 in blob:
+                data = blob[1]
+            elif 3 in blob:
+                data = zlib.decompress(blob[3])
+            else:
+                raise ValueError(f"{path.name}: unsupported PBF blob compression")
+            yield header[1].decode(), data
+
+
+def _read_pbf(path: Path) -> Iterator[Element]:
+    for kind, data in _read_pbf_blobs(path):
+        if kind != "OSMData":
+            continue
+        strings: List[str] = []
+        groups: List[bytes] = []
+        granularity, lat_offset, lon_offset = 100, 0, 0
+        for field, value in _fields(data):
+            if field == 1:
+                strings = [s.decode("utf-8") for f, s in _fields(value) if f == 1]
+            elif field == 2:
+                groups.append(value)
+            elif field == 17:
+                granularity = value
+            elif field == 19:
+                lat_offset = value - (1 << 64) if value >= 1 << 63 else value
+            elif field == 20:
+                lon_offset = value - (1 << 64) if value >= 1 << 63 else value
+
+        def scale(raw: np.ndarray, offset: int) -> np.ndarray:
+            return (offset + granularity * raw.astype(np.float64)) * 1e-9
+
+        for group in groups:
+            for field, value in _fields(group):
+                if field == 2:
+                    yield _dense_nodes(value, strings, scale, lat_offset, lon_offset)
+                elif field == 1:
+                    node = dict(_fields(value))
+                    keys = _packed(node.get(2, b"")).tolist()
+                    vals = _packed(node.get(3, b"")).tolist()
+                    node_tags = {strings[k]: strings[v] for k, v in zip(keys, vals)}
+                    raw = _zigzag(np.array([node[1], node[8], node[9]], dtype=np.uint64))
+                    yield NodeBlock(raw[:1], scale(raw[1:2], lat_offset), scale(raw[2:3], lon_offset),
+                                    lambda i, t=node_tags: t)
+                elif field == 3:
+                    way = {2: b"", 3: b"", 8: b""}
+                    way.update(_fields(value))
+                    keys = _packed(way[2]).tolist()
+                    vals = _packed(way[3]).tolist()
+                    refs = np.cumsum(_zigzag(_packed(way[8])))
+                    yield Way(way[1], refs, {strings[k]: strings[v] for k, v in zip(keys, vals)})
+
+
+def _dense_nodes(buf: bytes, strings: List[str], scale, lat_offset: int, lon_offset: int) -> NodeBlock:
+    fields = {1: b"", 8: b"", 9: b"", 10: b""}
+    fields.update((f, v) for f, v in _fields(buf) if f in fields)
+    ids = np.cumsum(_zigzag(_packed(fields[1])))
+    lats = scale(np.cumsum(_zigzag(_packed(fields[8]))), lat_offset)
+    lons = scale(np.cumsum(_zigzag(_packed(fields[9]))), lon_offset)
+    keys_vals = _packed(fields[10]).astype(np.int64)
+    # keys_vals: pares (chave, valor) de cada nó, terminados por 0
+    stops = np.flatnonzero(keys_vals == 0) if len(keys_vals) else np.zeros(0, dtype=np.int64)
+
+    def tags(i: int) -> Dict[str, str]:
+        if not len(stops):
+            return {}
+        start = stops[i - 1] + 1 if i else 0
+        kv = keys_vals[start:stops[i]].tolist()
+        return {strings[kv[j]]: strings[kv[j + 1]] for j in range(0, len(kv), 2)}
+
+    return NodeBlock(ids, lats, lons, tags)
+
+
+def read_osm(path: Path) -> Iterator[Element]:
+    """Blocos de nós e vias do extrato, na ordem do arquivo (relações são ignoradas)."""
+    path = Path(path)
+    return _read_pbf(path) if path.name.endswith(".pbf") else _read_xml(path)
+
+
+# --- Recorte ---
+
+def _node_xml(node_id: int, lat: float, lon: float, tags: Dict[str, str]) -> str:
+    head = f'  <node id="{node_id}" lat="{lat:.7f}" lon="{lon:.7f}"'
+    if not tags:
+        return head + "/>\n"
+    body = "".join(f"    <tag k={quoteattr(k)} v={quoteattr(v)}/>\n" for k, v in tags.items())
+    return f"{head}>\n{body}  </node>\n"
+
+
+def _way_xml(way: Way) -> str:
+    refs = "".join(f'    <nd ref="{ref}"/>\n' for ref in way.refs.tolist())
+    tags = "".join(f"    <tag k={quoteattr(k)} v={quoteattr(v)}/>\n" for k, v in way.tags.items())
+    return f'  <way id="{way.id}">\n{refs}{tags}  </way>\n'
+
+
+def _contains(sorted_ids: np.ndarray, ids: np.ndarray) -> np.ndarray:
+    if not len(sorted_ids):
+        return np.zeros(len(ids), dtype=np.bool_)
+    pos = np.minimum(np.searchsorted(sorted_ids, ids), len(sorted_ids) - 1)
+    return sorted_ids[pos] == ids
+
+
+def clip_osm(source: Path, lat_min: float, lat_max: float, lon_min: float, lon_max: float, out_file: Path,
+             way_filter: Callable[[Dict[str, str]], bool] = lambda tags: "highway" in tags) -> dict:
+    """Grava em `out_file` (.osm) as vias aceitas por `way_filter` que tocam a bbox, com todos os seus nós."""
+    source, out_file = Path(source), Path(out_file)
+    started = time.perf_counter()
+
+    # Passada 1: nós dentro da bbox, vias selecionadas (em disco) e nós que elas usam
+    inside_chunks: List[np.ndarray] = []
+    inside = np.empty(0, dtype=np.int64)
+    needed: List[np.ndarray] = []
+    ways = 0
+    with tempfile.TemporaryFile("w+", encoding="utf-8", dir=out_file.parent) as ways_tmp:
+        for element in read_osm(source):
+            if isinstance(element, NodeBlock):
+                mask = ((element.lats >= lat_min) & (element.lats <= lat_max)
+                        & (element.lons >= lon_min) & (element.lons <= lon_max))
+                if mask.any():
+                    inside_chunks.append(element.ids[mask])
+                continue
+            if inside_chunks:
+                inside = np.unique(np.concatenate([inside, *inside_chunks]))
+                inside_chunks = []
+            if way_filter(element.tags) and _contains(inside, element.refs).any():
+                ways_tmp.write(_way_xml(element))
+                needed.append(element.refs)
+                ways += 1
+        needed_ids = np.unique(np.concatenate(needed)) if needed else np.empty(0, dtype=np.int64)
+        del inside
+
+        # Passada 2: nós referenciados, depois as vias
+        nodes = 0
+        with open(out_file, "w", encoding="utf-8") as out:
+            out.write("<?xml version='1.0' encoding='UTF-8'?>\n")
+            out.write('<osm version="0.6" generator="v2x-osm-extract">\n')
+            out.write(f'  <bounds minlat="{lat_min:.7f}" minlon="{lon_min:.7f}" maxlat="{lat_max:.7f}" maxlon="{lon_max:.7f}"/>\n')
+            if len(needed_ids):
+                for element in read_osm(source):
+                    if not isinstance(element, NodeBlock):
+                        break  # Nós vêm antes das vias
+                    for i in np.flatnonzero(_contains(needed_ids, element.ids)).tolist():
+                        out.write(_node_xml(int(element.ids[i]), float(element.lats[i]), float(element.lons[i]),
+                                            element.tags(i)))
+                        nodes += 1
+            ways_tmp.seek(0)
+            shutil.copyfileobj(ways_tmp, out)
+            out.write("</osm>\n")
+
+    seconds = time.perf_counter() - started
+    logging.info(f"OSM extract: {nodes} nodes, {ways} ways clipped from {source.name} in {seconds:.1f}s")
+    return {"nodes": nodes, "ways": ways, "seconds": seconds}
@@ -0,0 +1,147 @@
+"""Pipeline de geração de cenários em estágios.
+
+Cada estágio declara de quais outros depende; os que não dependem entre si
+(tráfego de fundo, snapping, INI/NED, cópia pré-comprimida do mapa) rodam ao
+mesmo tempo num executor compartilhado, e o tempo total tende ao do estágio
+mais lento em vez da soma de todos.
+"""
+import contextvars
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from app.core.config import settings
+from app.core.progress import DONE, report_stage
+from app.services.map_package import map_members
+
+
+@dataclass(frozen=True)
+class Stage:
+    name: str
+    fn: Callable[..., Any]
+    after: Tuple[str, ...] = ()
+    # Estágio com itens: uma tarefa fn(item) por item, cada uma no executor
+    items: Optional[Tuple[Any, ...]] = None
+
+
+# Threads dos estágios, compartilhadas por todas as gerações. Os estágios nunca
+# esperam uns pelos outros dentro do executor (quem espera é a thread que chamou
+# run()), então não há risco de deadlock com o executor cheio.
+_stage_executor: Optional[ThreadPoolExecutor] = (
+    ThreadPoolExecutor(max_workers=settings.PIPELINE_STAGE_WORKERS, thread_name_prefix="stage")
+    if settings.PIPELINE_STAGE_WORKERS > 0 else None
+)
+
+
+class Pipeline:
+    """Grafo de estágios de uma geração. `run()` devolve o resultado de cada
+    estágio pelo nome (também em `results`, que um estágio pode ler para usar o
+    resultado das suas dependências) e registra as durações em `timings` (segundos).
+
+    Cada estágio é relatado via report_stage com o próprio nome, então os nomes
+    devem seguir app.core.progress.STAGES.
+    """
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self.timings: Dict[str, float] = {}
+        self.results: Dict[str, Any] = {}
+        self._stages: Dict[str, Stage] = {}
+
+    def add(self, name: str, fn: Callable[[], Any], after: Tuple[str, ...] = ()) -> "Pipeline":
+        if name in self._stages:
+            raise ValueError(f"Duplicate pipeline stage: {name}")
+        self._stages[name] = Stage(name, fn, tuple(after))
+        return self
+
+    def map(self, name: str, fn: Callable[[Any], Any], items: Sequence[Any], after: Tuple[str, ...] = ()) -> "Pipeline":
+        """Estágio que roda `fn(item)` para cada item em paralelo, nas threads do
+        executor compartilhado; o resultado é a lista na ordem de `items`."""
+        if name in self._stages:
+            raise ValueError(f"Duplicate pipeline stage: {name}")
+        self._stages[name] = Stage(name, fn, tuple(after), tuple(items))
+        return self
+
+    def run(self) -> Dict[str, Any]:
+        start = time.perf_counter()
+        # Dependência de estágio não adicionado (ex.: sem tráfego aleatório) é ignorada
+        pending = {
+            name: Stage(s.name, s.fn, tuple(d for d in s.after if d in self._stages), s.items)
+            for name, s in self._stages.items()
+        }
+        results = self.results
+        # Futuro -> (estágio, posição do item; None para estágios sem itens)
+        running: Dict[Future, Tuple[str, Optional[int]]] = {}
+        # Estágios com itens em andamento: resultados parciais, tarefas restantes e início
+        partial: Dict[str, List[Any]] = {}
+        remaining: Dict[str, int] = {}
+        started: Dict[str, float] = {}
+        try:
+            while pending or running:
+                ready = [s for s in pending.values() if all(d in results for d in s.after)]
+                if not ready and not running:
+                    raise ValueError(f"Pipeline stages with unsatisfiable dependencies: {sorted(pending)}")
+                for stage in ready:
+                    del pending[stage.name]
+                    if _stage_executor is None or (stage.items is not None and not stage.items):
+                        results[stage.name] = self._run_stage(stage)
+                    elif stage.items is None:
+                        # Cópia do contexto: report_stage funciona dentro das threads do executor
+                        ctx = contextvars.copy_context()
+                        running[_stage_executor.submit(ctx.run, self._run_stage, stage)] = (stage.name, None)
+                    else:
+                        report_stage(stage.name)
+                        started[stage.name] = time.perf_counter()
+                        partial[stage.name] = [None] * len(stage.items)
+                        remaining[stage.name] = len(stage.items)
+                        for i, item in enumerate(stage.items):
+                            ctx = contextvars.copy_context()
+                            running[_stage_executor.submit(ctx.run, stage.fn, item)] = (stage.name, i)
+                if running:
+                    done, _ = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        name, index = running.pop(future)
+                        if index is None:
+                            results[name] = future.result()
+                            continue
+                        partial[name][index] = future.result()
+                        remaining[name] -= 1
+                        if not remaining[name]:
+                            results[name] = partial.pop(name)
+                            self._finish(name, time.perf_counter() - started.pop(name))
+        except BaseException:
+            # Não deixa estágios rodando depois que a geração falhou
+            for future in running:
+                future.cancel()
+            wait(running)
+            raise
+
+        total = time.perf_counter() - start
+        logging.info(
+            f"{self.kind} pipeline: {total * 1000:.0f}ms ("
+            + ", ".join(f"{name}={seconds * 1000:.0f}ms" for name, seconds in self.timings.items()) + ")"
+        )
+        return results
+
+    def _run_stage(self, stage: Stage) -> Any:
+        start = time.perf_counter()
+        report_stage(stage.name)
+        result = stage.fn() if stage.items is None else [stage.fn(item) for item in stage.items]
+        self._finish(stage.name, time.perf_counter() - start)
+        return result
+
+    def _finish(self, name: str, seconds: float):
+        self.timings[name] = seconds
+        report_stage(name, DONE, seconds)
+
+
+def scenario_pipeline(kind: str, load_net: Callable[[], Any], folder: str, map_name: str, package_mode: str) -> Pipeline:
+    """Pipeline com os estágios comuns aos três modos: carga da rede ("net_load")
+    e membros do mapa ("map"). Cada serviço acrescenta snapping, routes e ini_ned."""
+    return (
+        Pipeline(kind)
+        .add("net_load", load_net)
+        .add("map", lambda: map_members(folder, map_name, package_mode))
+    )
@@ -1,11 +1,9 @@
 import io
-import zipfile
-import subprocess
 import os
 import logging
 import random
 from pathlib import Path
-from datetime import datetime
+from typing import List
 import json
 
 try:
@@ -15,7 +13,14 @@ except ImportError:
     sumolib = None
 
 from app.models.simulation import SimulationPayload
+from app.core import metrics
 from app.core.config import settings
+from app.core.net_cache import net_cache
+from app.core.progress import tracked_stage
+from app.core.zip_stream import ZipMember, zip_to_buffer
+from app.services.ini_writer import IniWriter
+from app.services.pipeline import scenario_pipeline
+from app.services.trip_generator import random_trips_xml
 
 class SimulationService:
 
@@ -28,39 +33,29 @@ class SimulationService:
         net_file = settings.SUMO_MAPS_DIR / map_name
         if not net_file.exists():
             raise FileNotFoundError(f"Map file not found: {net_file}")
-        self.net = sumolib.net.readNet(str(net_file))
+        self.net = net_cache.get(net_file)
 
-    def _generate_jammer_positions(self, num_jammers):
+    def _generate_jammer_positions(self, num_jammers, seed=None):
         """Generate random jammer positions inside the map bounding box."""
-        bbox = self.net.getBoundary()
+        bbox = self.net.get_boundary()
         min_x, min_y, max_x, max_y = bbox
         
+        # Gerador próprio com a seed do payload: mesmo payload, mesmo cenário
+        rng = random.Random(seed)
         positions = []
         for _ in range(num_jammers):
-            x = random.uniform(min_x + 50, max_x - 50)
-            y = random.uniform(min_y + 50, max_y - 50)
+            x = rng.uniform(min_x + 50, max_x - 50)
+            y = rng.uniform(min_y + 50, max_y - 50)
             positions.append((x, y))
         return positions
 
-    def _generate_routes(self, sim_dir: Path, payload: SimulationPayload) -> Path:
-        """Generate background traffic using randomTrips.py."""
-        route_file = sim_dir / "random.rou.xml"
+    def _generate_routes(self, payload: SimulationPayload) -> str:
+        """Generate background traffic (native generator or randomTrips.py)."""
         net_file = settings.SUMO_MAPS_DIR / payload.map_name
 
         period = float(payload.simulation_time) / max(1, payload.total_vehicles)
 
-        command = [
-            "python", settings.RANDOM_TRIPS_PY,
-            "-n", str(net_file),
-            "-e", str(payload.simulation_time),
-            "-p", str(period),
-            "-o", str(route_file),
-            "--seed", str(payload.random_seed),
-            "--validate"
-        ]
-        
-        subprocess.run(command, check=True, capture_output=True, text=True)
-        return route_file
+        return random_trips_xml(net_file, payload.simulation_time, period, payload.random_seed)
 
     def _generate_ned_file(self, sim_name, num_cars, num_jammers):
         """Generate network topology file."""
@@ -102,22 +97,21 @@ network {sim_name} {{
         
         car[{num_cars}]: CarV2X;
 """
-        for i in range(num_jammers):
-            ned += f"        jammer_{i}: DroneJammer {{ @display(\"i=device/drone\"); }}\n"
-
-        ned += """
+        parts = [ned]
+        parts += [f"        jammer_{i}: DroneJammer {{ @display(\"i=device/drone\"); }}\n" for i in range(num_jammers)]
+        parts.append("""
     connections allowunconnected:
         server.pppg++ <--> Eth10G <--> router.pppg++;
         router.pppg++ <--> Eth10G <--> upf.filterGate;
         upf.pppg++ <--> Eth10G <--> gNodeB1.ppp;
 }
-"""
-        return ned
+""")
+        return "".join(parts)
 
     def _generate_omnetpp_ini(self, payload: SimulationPayload, jammer_positions) -> str:
         sim_name = payload.simulation_name.replace(" ", "_")
         
-        ini = f"""[General]
+        ini = IniWriter(f"""[General]
 network = {sim_name}.{sim_name}
 sim-time-limit = {payload.simulation_time}s
 seed-set = {payload.random_seed}
@@ -164,24 +158,27 @@ cmdenv-express-mode = true
 **.vector-recording = true
 **.car[*].**.sinr.vector-recording = true
 **.car[*].**.packetLoss.vector-recording = true
-"""
+""")
 
         if payload.execute_with_attack and payload.jamming_params:
             jp = payload.jamming_params
-            for i, (x, y) in enumerate(jammer_positions):
-                ini += f"\n*.jammer_{i}.mobility.typename = \"LinearMobility\"\n"
-                ini += f"*.jammer_{i}.mobility.initialX = {x:.2f}m\n"
-                ini += f"*.jammer_{i}.mobility.initialY = {y:.2f}m\n"
-                ini += f"*.jammer_{i}.mobility.initialZ = 50m\n"
-                ini += f"*.jammer_{i}.mobility.speed = 10mps\n"
-                ini += f"*.jammer_{i}.app[0].typename = \"JammerApp\"\n"
-                ini += f"*.jammer_{i}.app[0].startTime = {jp.start_time_s}s\n"
-                ini += f"*.jammer_{i}.app[0].stopTime = {jp.stop_time_s}s\n"
-                ini += f"*.jammer_{i}.jammerType = \"{jp.strategy}\"\n"
-                ini += f"*.jammer_{i}.transmissionPower = {jp.power_dbm}dBm\n"
-                ini += f"*.jammer_{i}.active = true\n"
-
-        return ini
+            if jammer_positions:
+                ini.comment("Jammers")
+                ini.node_params("jammer", [{
+                    "mobility.typename": '"LinearMobility"',
+                    "mobility.initialX": f"{x:.2f}m",
+                    "mobility.initialY": f"{y:.2f}m",
+                    "mobility.initialZ": "50m",
+                    "mobility.speed": "10mps",
+                    "app[0].typename": '"JammerApp"',
+                    "app[0].startTime": f"{jp.start_time_s}s",
+                    "app[0].stopTime": f"{jp.stop_time_s}s",
+                    "jammerType": f'"{jp.strategy}"',
+                    "transmissionPower": f"{jp.power_dbm}dBm",
+                    "active": "true",
+                } for x, y in jammer_positions], vector=False)
+
+        return ini.getvalue()
 
     def _generate_sumocfg(self, map_name, duration):
         return f"""<configuration>
@@ -195,28 +192,34 @@ cmdenv-express-mode = true
     </time>
 </configuration>"""
 
-    def create_simulation_zip(self, payload: SimulationPayload) -> io.BytesIO:
-        self._load_net(payload.map_name)
-        
+    def create_simulation_members(self, payload: SimulationPayload) -> List[ZipMember]:
+        """Gera os arquivos do cenário como membros do ZIP (o mapa vai como caminho em disco)."""
         num_jammers = 0
         if payload.execute_with_attack:
             factor = 0.10
             num_jammers = max(1, int(payload.total_vehicles * factor)) 
         
-        jammer_positions = self._generate_jammer_positions(num_jammers)
-        
         sim_name = payload.simulation_name.replace(" ", "_")
-        temp_dir = Path(f"temp_simple_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
-        temp_dir.mkdir()
+        folder = f"{sim_name}"
+
+        def ini_ned():
+            jammer_positions = self._generate_jammer_positions(num_jammers, payload.random_seed)
+            return (
+                self._generate_ned_file(sim_name, payload.total_vehicles, num_jammers),
+                self._generate_omnetpp_ini(payload, jammer_positions),
+            )
+
+        # Tráfego de fundo não depende da rede carregada aqui: roda em paralelo com o resto
+        results = (
+            scenario_pipeline("simple", lambda: self._load_net(payload.map_name), folder, payload.map_name, payload.package_mode)
+            .add("routes", lambda: self._generate_routes(payload))
+            .add("ini_ned", ini_ned, after=("net_load",))
+            .run()
+        )
+        ned, ini = results["ini_ned"]
+        sumocfg = self._generate_sumocfg(payload.map_name, payload.simulation_time)
         
-        try:
-            route_file = self._generate_routes(temp_dir, payload)
-            
-            ned = self._generate_ned_file(sim_name, payload.total_vehicles, num_jammers)
-            ini = self._generate_omnetpp_ini(payload, jammer_positions)
-            sumocfg = self._generate_sumocfg(payload.map_name, payload.simulation_time)
-            
-            launchd = f"""<launchd>
+        launchd = f"""<launchd>
                 <copy file="{payload.map_name}"/>
                 <copy file="simulation.sumocfg"/>
                 <copy file="omnetpp.ini"/>
@@ -224,29 +227,24 @@ cmdenv-express-mode = true
                 <copy file="random.rou.xml"/>
                 <run command="sumo-gui -c simulation.sumocfg --remote-port 9999"/>
             </launchd>"""
-            
-            demo_xml = "<config><interface hosts='**' address='10.x.x.x' netmask='255.x.x.x'/><multicast-group hosts='**' address='224.0.0.1'/></config>"
-            
-            zip_buffer = io.BytesIO()
-
-            folder = f"{sim_name}"
-            
-            with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
-                zf.writestr(f"{folder}/simulation.ned", ned)
-                zf.writestr(f"{folder}/package.ned", f"package {sim_name};")
-                zf.writestr(f"{folder}/omnetpp.ini", ini)
-                zf.writestr(f"{folder}/simulation.sumocfg", sumocfg)
-                zf.writestr(f"{folder}/simulation.launchd.xml", launchd)
-                zf.writestr(f"{folder}/demo.xml", demo_xml)
-                zf.write(route_file, f"{folder}/random.rou.xml")
-                
-                map_p = settings.SUMO_MAPS_DIR / payload.map_name
-                if map_p.exists():
-                    zf.write(map_p, f"{folder}/{payload.map_name}")
-                
-        finally:
-            if route_file.exists(): route_file.unlink()
-            if temp_dir.exists(): temp_dir.rmdir()
-
-        zip_buffer.seek(0)
-        return zip_buffer
+        
+        demo_xml = "<config><interface hosts='**' address='10.x.x.x' netmask='255.x.x.x'/><multicast-group hosts='**' address='224.0.0.1'/></config>"
+        
+        members: List[ZipMember] = [
+            (f"{folder}/simulation.ned", ned),
+            (f"{folder}/package.ned", f"package {sim_name};"),
+            (f"{folder}/omnetpp.ini", ini),
+            (f"{folder}/simulation.sumocfg", sumocfg),
+            (f"{folder}/simulation.launchd.xml", launchd),
+            (f"{folder}/demo.xml", demo_xml),
+            (f"{folder}/random.rou.xml", results["routes"]),
+        ]
+        
+        members += results["map"]
+        metrics.count_vehicles(payload.total_vehicles)
+        return members
+
+    def create_simulation_zip(self, payload: SimulationPayload) -> io.BytesIO:
+        members = self.create_simulation_members(payload)
+        with tracked_stage("packaging"):
+            return zip_to_buffer(members)
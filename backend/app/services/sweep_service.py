@@ -0,0 +1,375 @@
+import copy
+import itertools
+import json
+import logging
+import math
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core import metrics
+from app.core.config import settings
+from app.core.progress import tracked_stage
+from app.core.zip_stream import ZipMember
+from app.models.expert_models import ExpertSimulationPayload
+from app.models.simulation import AdvancedSimulationPayload
+from app.models.sweep_models import SweepAxis, SweepRequest
+from app.services.advanced_simulation_service import AdvancedSimulationService
+from app.services.expert_simulation_service import ExpertSimulationService
+from app.services.pipeline import scenario_pipeline
+from app.services.trip_generator import random_trips_xml
+
+# Campos que identificam o pacote e não podem variar numa varredura
+_FIXED_FIELDS = {"simulation_name", "map_name", "package_mode"}
+_MISSING = object()
+_CAR_VECTOR = re.compile(r"car\[(\d+)\]")
+
+
+def _targets(data, head: str, param: str) -> List[Any]:
+    """Chaves/índices de `data` selecionados por um trecho do caminho."""
+    if isinstance(data, list):
+        if head == "*":
+            return list(range(len(data)))
+        try:
+            index = int(head)
+        except ValueError:
+            raise ValueError(f"'{param}': '{head}' is not a list index")
+        if not -len(data) <= index < len(data):
+            raise ValueError(f"'{param}': index {index} out of range")
+        return [index]
+    if isinstance(data, dict):
+        return [head]
+    raise ValueError(f"'{param}' is not a parameter path")
+
+
+def _set_path(data, parts: List[str], value, param: str):
+    for key in _targets(data, parts[0], param):
+        if len(parts) == 1:
+            data[key] = copy.deepcopy(value)
+        elif isinstance(data, dict) and key not in data:
+            raise ValueError(f"Unknown parameter '{param}'")
+        else:
+            _set_path(data[key], parts[1:], value, param)
+
+
+def _get_path(data, parts: List[str], param: str) -> List[Any]:
+    values = []
+    for key in _targets(data, parts[0], param):
+        if isinstance(data, dict) and key not in data:
+            values.append(_MISSING)
+        elif len(parts) == 1:
+            values.append(data[key])
+        else:
+            values.extend(_get_path(data[key], parts[1:], param))
+    return values
+
+
+def expand_variants(model, base: dict, axes: List[SweepAxis]) -> List[Tuple[Dict[str, Any], Any]]:
+    """Produto cartesiano dos eixos sobre o payload base: [(overrides, payload validado)]."""
+    base_data = model(**base).model_dump()
+    for axis in axes:
+        if axis.param.split(".")[0] in _FIXED_FIELDS:
+            raise ValueError(f"'{axis.param}' cannot be swept")
+
+    total = math.prod(len(axis.values) for axis in axes)
+    if total > settings.SWEEP_MAX_VARIANTS:
+        raise ValueError(f"Sweep has {total} variants, limit is {settings.SWEEP_MAX_VARIANTS}")
+
+    variants = []
+    for combo in itertools.product(*(axis.values for axis in axes)):
+        data = copy.deepcopy(base_data)
+        for axis, value in zip(axes, combo):
+            _set_path(data, axis.param.split("."), value, axis.param)
+        payload = model(**data)
+
+        # Campos desconhecidos são descartados pelo pydantic: confere que o valor chegou ao payload
+        check = payload.model_dump()
+        for axis in axes:
+            found = _get_path(check, axis.param.split("."), axis.param)
+            if not found or any(v is _MISSING for v in found):
+                raise ValueError(f"Unknown parameter '{axis.param}'")
+            if any(isinstance(v, (list, dict)) for v in found):
+                raise ValueError(f"'{axis.param}' is not a scalar parameter")
+        variants.append(({axis.param: value for axis, value in zip(axes, combo)}, payload))
+    return variants
+
+
+def merge_ini(variants: List[Tuple[str, str, str]]) -> str:
+    """Junta os omnetpp.ini das variantes: linhas iguais em todas ficam no [General],
+    as demais vão para um [Config] por variante.
+
+    `variants` é uma lista de (nome da config, descrição, ini completo).
+    """
+    parsed = []
+    for _, _, ini in variants:
+        entries = []
+        for line in ini.splitlines():
+            stripped = line.strip()
+            if stripped and not stripped.startswith(("#", "[")) and "=" in stripped:
+                key, value = stripped.split("=", 1)
+                entries.append((line, (key.strip(), value.strip())))
+        parsed.append(entries)
+
+    common = set(e for _, e in parsed[0])
+    for entries in parsed[1:]:
+        common &= set(e for _, e in entries)
+
+    # [General]: estrutura (comentários incluídos) da primeira variante, só com as linhas comuns
+    out = []
+    for line in variants[0][2].splitlines():
+        stripped = line.strip()
+        if stripped and not stripped.startswith(("#", "[")) and "=" in stripped:
+            key, value = stripped.split("=", 1)
+            if (key.strip(), value.strip()) not in common:
+                continue
+        out.append(line)
+
+    for (name, description, _), entries in zip(variants, parsed):
+        out.append("")
+        out.append(f"[Config {name}]")
+        out.append(f"description = {json.dumps(description)}")
+        out.extend(line.strip() for line, e in entries if e not in common)
+    return "\n".join(out) + "\n"
+
+
+def _dedupe(contents: List[str], stem: str, ext: str) -> Tuple[List[str], Dict[str, str]]:
+    """Nomeia conteúdos iguais com o mesmo arquivo: (nome por posição, {nome: conteúdo})."""
+    unique: Dict[str, str] = {}
+    for content in contents:
+        unique.setdefault(content, "")
+    if len(unique) == 1:
+        names = {content: f"{stem}{ext}" for content in unique}
+    else:
+        names = {content: f"{stem}_{k}{ext}" for k, content in enumerate(unique)}
+    return [names[c] for c in contents], {name: content for content, name in names.items()}
+
+
+class _AdvancedVariants:
+    model = AdvancedSimulationPayload
+
+    def __init__(self):
+        self.service = AdvancedSimulationService()
+
+    def load(self, p):
+        self.service._load_sumo_net(p.map_name)
+
+    def sim_name(self, p) -> str:
+        return p.simulation_name.replace(" ", "_").replace("-", "_")
+
+    def traffic_params(self, p):
+        return self.service._random_traffic_params(p)
+
+    def traffic(self, map_name, params) -> str:
+        return random_trips_xml(settings.SUMO_MAPS_DIR / map_name, *params)
+
+    def route_key(self, p) -> str:
+        """Campos de que as rotas fixas dependem (variantes iguais nelas roteiam uma vez só)."""
+        return json.dumps([
+            p.num_fixed_vehicles > 0, p.simulation_time, p.od_policy,
+            [r.model_dump() for r in p.fixed_routes_list],
+        ])
+
+    def fixed_routes(self, p) -> Optional[str]:
+        if p.num_fixed_vehicles <= 0:
+            return None
+        self.service.payload = p
+        return self.service._generate_fixed_routes_xml()
+
+    def routes(self, p, fixed: Optional[str], traffic: Optional[str]) -> List[Tuple[str, str]]:
+        routes = []
+        if fixed is not None:
+            routes.append(("fixed", fixed))
+        if traffic is not None:
+            routes.append(("random", traffic))
+        return routes
+
+    def ned(self, p) -> str:
+        return self.service._generate_ned_file(p)
+
+    def vehicles(self, p) -> int:
+        return p.num_fixed_vehicles + p.num_random_vehicles
+
+    def sumocfg(self, p, route_files) -> str:
+        return self.service._generate_sumocfg(p, route_files)
+
+    def launchd(self, p, route_files, sumocfg) -> str:
+        return self.service._generate_launchd_xml(p, route_files, sumocfg)
+
+    def ini(self, p, launchd) -> str:
+        return self.service._generate_omnetpp_ini(p, launchd)
+
+    def demo(self) -> str:
+        return self.service._generate_ipv4_config()
+
+
+class _ExpertVariants:
+    model = ExpertSimulationPayload
+
+    def __init__(self):
+        self.service = ExpertSimulationService()
+
+    @staticmethod
+    def _nodes(p):
+        return [[n for n in p.nodes_list if n.type == t] for t in ("car", "drone", "tower", "rsu")]
+
+    def load(self, p):
+        self.service._load_net(p.map_name)
+
+    def sim_name(self, p) -> str:
+        return p.simulation_name.replace(" ", "_")
+
+    def traffic_params(self, p):
+        return self.service._random_traffic_params(p)
+
+    def traffic(self, map_name, params) -> str:
+        # Mesmo comportamento do serviço expert: sem tráfego de fundo em caso de erro
+        try:
+            return random_trips_xml(settings.SUMO_MAPS_DIR / map_name, *params)
+        except Exception as e:
+            logging.error(f"Random Trips Error: {e}")
+            return ""
+
+    def route_key(self, p) -> str:
+        cars = self._nodes(p)[0]
+        return json.dumps([p.od_policy, [(c.id, c.lat, c.lng, c.dest_lat, c.dest_lng) for c in cars]])
+
+    def fixed_routes(self, p) -> Optional[str]:
+        return self.service._create_routes_xml(self._nodes(p)[0], p.od_policy)
+
+    def routes(self, p, fixed: Optional[str], traffic: Optional[str]) -> List[Tuple[str, str]]:
+        routes = [("fixed", fixed)]
+        if traffic:
+            routes.append(("random", traffic))
+        return routes
+
+    def ned(self, p) -> str:
+        cars, drones, towers, rsus = self._nodes(p)
+        return self.service._create_ned(self.sim_name(p), self.vehicles(p), drones, towers, rsus)
+
+    def vehicles(self, p) -> int:
+        return len(self._nodes(p)[0]) + p.num_random_vehicles
+
+    def sumocfg(self, p, route_files) -> str:
+        return self.service._create_sumocfg(p, route_files)
+
+    def launchd(self, p, route_files, sumocfg) -> str:
+        return self.service._create_launchd(p, route_files, sumocfg)
+
+    def ini(self, p, launchd) -> str:
+        cars, drones, towers, rsus = self._nodes(p)
+        return self.service._create_ini(self.sim_name(p), p, cars, drones, towers, rsus, p.num_random_vehicles, launchd)
+
+    def demo(self) -> str:
+        return self.service._create_demo_xml()
+
+
+_VARIANT_BUILDERS = {"advanced": _AdvancedVariants, "expert": _ExpertVariants}
+
+
+class SweepService:
+    """Gera um único pacote com todas as variantes de uma varredura de parâmetros.
+
+    O mapa é carregado e embutido uma vez; o tráfego de fundo é gerado uma vez
+    por combinação distinta de (duração, período, seed), em paralelo no executor
+    do pipeline, e as rotas fixas uma vez por conjunto distinto de campos de que
+    dependem. Cada variante vira um [Config] do omnetpp.ini, e rotas/sumocfg/launchd
+    idênticos entre variantes são compartilhados.
+    """
+
+    def create_sweep_members(self, request: SweepRequest) -> List[ZipMember]:
+        builder = _VARIANT_BUILDERS[request.kind]()
+        variants = expand_variants(builder.model, request.base, request.axes)
+        first = variants[0][1]
+
+        sim_name = builder.sim_name(first)
+        folder = f"simulations/{sim_name}"
+        traffic_params = sorted({builder.traffic_params(p) for _, p in variants} - {None})
+
+        # Rede, tráfego de fundo (uma tarefa por combinação) e mapa em paralelo;
+        # o snapping precisa da rede e do tráfego
+        pipeline = scenario_pipeline("sweep", lambda: builder.load(first), folder, first.map_name, first.package_mode)
+        pipeline.map("routes", lambda params: builder.traffic(first.map_name, params), traffic_params)
+        pipeline.add("snapping", lambda: self._snap(
+            builder, variants, dict(zip(traffic_params, pipeline.results["routes"]))
+        ), after=("net_load", "routes"))
+        results = pipeline.run()
+        variant_routes = results["snapping"]
+        metrics.count_vehicles(sum(builder.vehicles(p) for _, p in variants))
+
+        with tracked_stage("ini_ned"):
+            return self._assemble(request, builder, variants, variant_routes, folder, sim_name) + results["map"]
+
+    def _assemble(self, request, builder, variants, variant_routes, folder: str, sim_name: str) -> List[ZipMember]:
+        """Arquivos do pacote (exceto o mapa): rotas/sumocfg/launchd deduplicados, INI com um [Config] por variante, NED e sweep.json."""
+        files: Dict[str, str] = {}
+
+        # Rotas: um arquivo por conteúdo distinto de cada tipo (fixed/random)
+        route_names: List[List[str]] = [[] for _ in variants]
+        for kind in ("fixed", "random"):
+            owners = [(i, content) for i, routes in enumerate(variant_routes) for k, content in routes if k == kind]
+            if not owners:
+                continue
+            names, unique = _dedupe([c for _, c in owners], kind, ".rou.xml")
+            files.update(unique)
+            for (i, _), name in zip(owners, names):
+                route_names[i].append(name)
+
+        cfg_names, unique = _dedupe(
+            [builder.sumocfg(p, route_names[i]) for i, (_, p) in enumerate(variants)], "simulation", ".sumocfg"
+        )
+        files.update(unique)
+        launchd_names, unique = _dedupe(
+            [builder.launchd(p, route_names[i], cfg_names[i]) for i, (_, p) in enumerate(variants)],
+            "simulation", ".launchd.xml",
+        )
+        files.update(unique)
+
+        configs = []
+        manifest = []
+        for i, (overrides, p) in enumerate(variants):
+            name = f"variant_{i:03d}"
+            description = ", ".join(f"{k}={v}" for k, v in overrides.items())
+            configs.append((name, description, builder.ini(p, launchd_names[i])))
+            manifest.append({
+                "config": name,
+                "overrides": overrides,
+                "sumocfg": cfg_names[i],
+                "launchd": launchd_names[i],
+                "route_files": route_names[i],
+            })
+
+        members: List[ZipMember] = [
+            (f"{folder}/simulation.ned", self._merge_ned([builder.ned(p) for _, p in variants])),
+            (f"{folder}/package.ned", f"package simulations.{sim_name};"),
+            (f"{folder}/omnetpp.ini", merge_ini(configs)),
+            (f"{folder}/demo.xml", builder.demo()),
+        ]
+        members += [(f"{folder}/{name}", content) for name, content in files.items()]
+        members.append((f"{folder}/sweep.json", json.dumps({
+            "kind": request.kind,
+            "axes": [axis.model_dump() for axis in request.axes],
+            "variants": manifest,
+        }, indent=2)))
+        return members
+
+    @staticmethod
+    def _snap(builder, variants, traffic: Dict[tuple, str]) -> List[List[Tuple[str, str]]]:
+        """Rotas de cada variante; snapping, checagem de O/D e roteamento das rotas
+        fixas rodam uma vez por conjunto distinto de campos de que dependem."""
+        fixed: Dict[str, Optional[str]] = {}
+        variant_routes = []
+        for _, p in variants:
+            key = builder.route_key(p)
+            if key not in fixed:
+                fixed[key] = builder.fixed_routes(p)
+            variant_routes.append(builder.routes(p, fixed[key], traffic.get(builder.traffic_params(p))))
+        return variant_routes
+
+    @staticmethod
+    def _merge_ned(neds: List[str]) -> str:
+        """Um único .ned para todas as variantes, com o vetor car[] da maior delas."""
+        unique = list(dict.fromkeys(neds))
+        if len(unique) == 1:
+            return unique[0]
+        if len({_CAR_VECTOR.sub("car[]", ned) for ned in unique}) > 1:
+            raise ValueError("Swept parameters change the network topology; generate those variants as separate packages")
+        return max(unique, key=lambda ned: int(_CAR_VECTOR.search(ned).group(1)))
@@ -0,0 +1,100 @@
+import logging
+import subprocess
+import tempfile
+from pathlib import Path
+from xml.sax.saxutils import quoteattr
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.net_cache import net_cache
+from app.core.route_cache import route_cache
+
+# Tentativas de re-sorteio quando origem == destino
+_MAX_RESAMPLE = 100
+# Incrementar sempre que a saída do gerador nativo mudar (invalida o cache de rotas)
+NATIVE_GENERATOR_VERSION = 1
+
+
+def generate_random_trips(net, end: float, period: float, seed: int, begin: float = 0.0) -> str:
+    """Gera o XML de <trip>s aleatórias diretamente sobre a rede compilada.
+
+    Equivalente ao `randomTrips.py -b begin -e end -p period --seed seed --length`:
+    uma partida a cada `period` segundos em [begin, end), origem e destino
+    sorteados com probabilidade proporcional ao comprimento da edge. Só são
+    usadas edges da maior componente fortemente conexa (para carros de passeio),
+    o que garante que toda trip tem rota. Mesmas entradas geram a mesma saída.
+    """
+    candidates = np.flatnonzero(net.largest_scc_mask(passenger_only=True))
+    n_trips = int(np.ceil((end - begin) / period)) if period > 0 and end > begin else 0
+    if n_trips == 0 or len(candidates) < 2:
+        if n_trips:
+            logging.warning("Random trips: network has no connected component with two or more edges.")
+        return "<routes>\n</routes>\n"
+
+    weights = net.arrays["edge_length"][candidates]
+    probs = weights / weights.sum() if weights.sum() > 0 else None
+
+    rng = np.random.default_rng(seed)
+    origins = rng.choice(candidates, size=n_trips, p=probs)
+    dests = rng.choice(candidates, size=n_trips, p=probs)
+    same = np.flatnonzero(origins == dests)
+    for _ in range(_MAX_RESAMPLE):
+        if not same.size:
+            break
+        dests[same] = rng.choice(candidates, size=same.size, p=probs)
+        same = same[origins[same] == dests[same]]
+
+    departs = begin + period * np.arange(n_trips)
+    edge_ids = net.edge_ids
+    lines = ["<routes>"]
+    for i in range(n_trips):
+        if origins[i] == dests[i]:
+            continue
+        lines.append(
+            f'    <trip id="{i}" depart="{departs[i]:.2f}" '
+            f'from={quoteattr(edge_ids[origins[i]])} to={quoteattr(edge_ids[dests[i]])}/>'
+        )
+    lines.append("</routes>\n")
+    return "\n".join(lines)
+
+
+def _random_trips_subprocess(net_file: Path, end: float, period: float, seed: int) -> str:
+    """Modo legado: executa o randomTrips.py do SUMO (com duarouter via --validate)."""
+    with tempfile.TemporaryDirectory(prefix="random_trips_") as tmp:
+        route_file = Path(tmp) / "random.rou.xml"
+        command = [
+            "python", settings.RANDOM_TRIPS_PY,
+            "-n", str(net_file),
+            "-e", str(end),
+            "-p", str(period),
+            "-o", str(route_file),
+            "--seed", str(seed),
+            "--validate"
+        ]
+        subprocess.run(command, check=True, capture_output=True, text=True)
+        return route_file.read_text()
+
+
+def random_trips_xml(net_file: Path, end: float, period: float, seed: int) -> str:
+    """Tráfego de fundo para o mapa, usando o gerador configurado em TRIP_GENERATOR.
+
+    O resultado passa pelo cache de rotas em disco: pedidos idênticos (mesmo
+    conteúdo de mapa, duração, período, seed e gerador) não são recalculados.
+    """
+    net_file = Path(net_file)
+    if settings.TRIP_GENERATOR == "randomtrips":
+        build = lambda: _random_trips_subprocess(net_file, end, period, seed)
+    else:
+        build = lambda: generate_random_trips(net_cache.get(net_file), end, period, seed)
+
+    return route_cache.get_or_create(
+        net_file, build, end=float(end), period=repr(float(period)), seed=int(seed), generator=generator_options()
+    )
+
+
+def generator_options() -> dict:
+    """Identifica o gerador configurado (entra nas chaves dos caches)."""
+    if settings.TRIP_GENERATOR == "randomtrips":
+        return {"name": "randomtrips", "options": ["--validate"]}
+    return {"name": "native", "version": NATIVE_GENERATOR_VERSION}
@@ -0,0 +1,150 @@
+"""Mede a geração do omnetpp.ini/NED do modo expert com 10, 1k e 10k nós.
+
+Compara o emissor atual (IniWriter, parâmetros agrupados em faixas) com a
+emissão antiga de uma linha por nó via `ini +=`, que é reproduzida aqui.
+
+Uso (a partir de backend/):
+    python -m benchmarks.ini_benchmark --maps-dir ../maps
+"""
+import argparse
+import json
+import random
+import time
+from pathlib import Path
+
+DEFAULT_SIZES = [10, 1_000, 10_000]
+# Proporção dos tipos de nó no cenário sintético
+NODE_MIX = ["car"] * 8 + ["drone", "rsu"]
+
+
+def _make_payload(map_name: str, size: int, hetero: bool, seed: int = 42):
+    from app.models.expert_models import ExpertNode, ExpertSimulationPayload
+
+    rng = random.Random(seed)
+    nodes = []
+    for i in range(size):
+        kind = rng.choice(NODE_MIX)
+        params = {"txPower": 23, "packetSize": 300}
+        if hetero:
+            params = {"txPower": rng.choice([20, 23, 26]), "packetSize": rng.choice([300, 600]),
+                      "mitigation": rng.random() < 0.2}
+        nodes.append(ExpertNode(id=i, type=kind, lat=52.52 + rng.random() * 0.01,
+                                lng=13.40 + rng.random() * 0.01, params=params))
+    return ExpertSimulationPayload(simulation_name="bench", map_name=map_name, duration=120,
+                                   seed=seed, num_random_vehicles=size // 10, nodes_list=nodes)
+
+
+def _per_node_car_ini(cars, num_random) -> str:
+    """Emissão antiga: oito linhas por carro manual, concatenadas com +=."""
+    ini = ""
+    for i, c in enumerate(cars):
+        p = c.params
+        ini += f"\n# Car {i} (Manual)\n"
+        ini += f"*.car[{i}].numApps = 1\n"
+        ini += f"*.car[{i}].app[0].typename = \"VoIPSender\"\n"
+        ini += f"*.car[{i}].app[0].destAddress = \"server\"\n"
+        ini += f"*.car[{i}].app[0].destPort = 3000\n"
+        ini += f"*.car[{i}].app[0].startTime = uniform(0s, 1s)\n"
+        ini += f"*.car[{i}].app[0].packetSize = {p.get('packetSize', 300)}B\n"
+        ini += f"*.car[{i}].phy.txPower = {p.get('txPower', 23)}dBm\n"
+        ini += f"*.car[{i}].mitigation.active = {'true' if p.get('mitigation') else 'false'}\n"
+    if num_random > 0:
+        start, end = len(cars), len(cars) + num_random - 1
+        ini += f"\n# Random Cars ({start} to {end})\n"
+        for key, value in [("numApps", 1), ("app[0].typename", '"VoIPSender"'), ("app[0].destAddress", '"server"'),
+                           ("app[0].destPort", 3000), ("app[0].startTime", "uniform(0s, 5s)"),
+                           ("app[0].packetSize", "256B"), ("phy.txPower", "23dBm")]:
+            ini += f"*.car[{start}..{end}].{key} = {value}\n"
+    return ini
+
+
+def _car_nodes(cars, num_random):
+    # Mesmos dicionários que ExpertSimulationService._create_ini monta para os carros
+    nodes = [{
+        "numApps": 1, "app[0].typename": '"VoIPSender"', "app[0].destAddress": '"server"',
+        "app[0].destPort": 3000, "app[0].startTime": "uniform(0s, 1s)",
+        "app[0].packetSize": f"{c.params.get('packetSize', 300)}B",
+        "phy.txPower": f"{c.params.get('txPower', 23)}dBm",
+        "mitigation.active": "true" if c.params.get('mitigation') else "false",
+    } for c in cars]
+    return nodes + [{
+        "numApps": 1, "app[0].typename": '"VoIPSender"', "app[0].destAddress": '"server"',
+        "app[0].destPort": 3000, "app[0].startTime": "uniform(0s, 5s)",
+        "app[0].packetSize": "256B", "phy.txPower": "23dBm",
+    }] * num_random
+
+
+def _best_of(fn, repeat: int):
+    best, out = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, out
+
+
+def run_one(service, map_name: str, size: int, hetero: bool, repeat: int) -> dict:
+    from app.services.ini_writer import IniWriter
+
+    payload = _make_payload(map_name, size, hetero)
+    by_type = {kind: [n for n in payload.nodes_list if n.type == kind] for kind in ("car", "drone", "tower", "rsu")}
+    num_random = payload.num_random_vehicles
+
+    def compact_cars():
+        ini = IniWriter()
+        ini.node_params("car", _car_nodes(by_type["car"], num_random))
+        return ini.getvalue()
+
+    legacy_s, legacy = _best_of(lambda: _per_node_car_ini(by_type["car"], num_random), repeat)
+    compact_s, compact = _best_of(compact_cars, repeat)
+    full_s, full_ini = _best_of(lambda: service._create_ini(
+        "bench", payload, by_type["car"], by_type["drone"], by_type["tower"], by_type["rsu"], num_random), repeat)
+    ned_s, ned = _best_of(lambda: service._create_ned(
+        "bench", len(by_type["car"]) + num_random, by_type["drone"], by_type["tower"], by_type["rsu"]), repeat)
+    return {
+        "nodes": size,
+        "cars_legacy_seconds": legacy_s,
+        "cars_legacy_bytes": len(legacy),
+        "cars_compact_seconds": compact_s,
+        "cars_compact_bytes": len(compact),
+        "ini_seconds": full_s,
+        "ini_bytes": len(full_ini),
+        "ned_seconds": ned_s,
+        "ned_bytes": len(ned),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--maps-dir", type=Path, default=Path("../maps"))
+    parser.add_argument("--map", default="urban_grid.net.xml")
+    parser.add_argument("--sizes", nargs="*", type=int, default=DEFAULT_SIZES)
+    parser.add_argument("--hetero", action="store_true", help="Parâmetros variados entre os nós")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", type=Path, help="Grava os resultados neste arquivo")
+    args = parser.parse_args()
+
+    from app.core.config import settings
+    from app.services.expert_simulation_service import ExpertSimulationService
+
+    settings.SUMO_MAPS_DIR = args.maps_dir
+    service = ExpertSimulationService()
+    service._load_net(args.map)
+
+    results = []
+    print(f"{'nodes':>7} {'cars +=':>10} {'cars compact':>13} {'size +=':>10} {'size compact':>13} {'full ini':>10} {'ini size':>10}")
+    for size in args.sizes:
+        r = run_one(service, args.map, size, args.hetero, args.repeat)
+        results.append(r)
+        print(
+            f"{size:>7} {r['cars_legacy_seconds'] * 1000:>8.1f}ms {r['cars_compact_seconds'] * 1000:>11.1f}ms "
+            f"{r['cars_legacy_bytes'] / 1024:>8.0f}KB {r['cars_compact_bytes'] / 1024:>11.1f}KB "
+            f"{r['ini_seconds'] * 1000:>8.1f}ms {r['ini_bytes'] / 1024:>8.0f}KB"
+        )
+
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Compara o carregamento via sumolib.net.readNet com o .netpack mapeado em memória.
+
+Cada medição roda num processo novo, para que o RSS reflita apenas o mapa carregado.
+
+Uso (a partir de backend/):
+    python -m benchmarks.netpack_benchmark --maps-dir ../maps
+"""
+import argparse
+import json
+import multiprocessing as mp
+import time
+from pathlib import Path
+
+DEFAULT_MAPS = ["rural", "urban_grid", "highway", "suburban", "industrial"]
+
+
+def _rss_bytes() -> int:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+def _measure(loader_name: str, net_file: str, queue):
+    # Imports pesados antes da medição, para não contarem no RSS do mapa
+    import sumolib  # noqa: F401
+    from app.core.netpack import CompiledNet, netpack_path
+
+    rss_before = _rss_bytes()
+    start = time.perf_counter()
+    if loader_name == "readNet":
+        net = sumolib.net.readNet(net_file)
+        n_edges = len(net.getEdges())
+    else:
+        net = CompiledNet.open(netpack_path(Path(net_file)))
+        # Força o acesso aos IDs, que é o que os serviços usam de fato
+        n_edges = len(net.edge_ids)
+    elapsed = time.perf_counter() - start
+    queue.put({"seconds": elapsed, "rss_bytes": _rss_bytes() - rss_before, "edges": n_edges})
+
+
+def run_one(loader_name: str, net_file: Path, repeat: int) -> dict:
+    ctx = mp.get_context("spawn")
+    runs = []
+    for _ in range(repeat):
+        queue = ctx.Queue()
+        proc = ctx.Process(target=_measure, args=(loader_name, str(net_file), queue))
+        proc.start()
+        runs.append(queue.get())
+        proc.join()
+    runs.sort(key=lambda r: r["seconds"])
+    best = runs[0]
+    return {"seconds": best["seconds"], "rss_bytes": max(r["rss_bytes"] for r in runs), "edges": best["edges"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--maps-dir", type=Path, default=Path("../maps"))
+    parser.add_argument("--maps", nargs="*", default=DEFAULT_MAPS)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", type=Path, help="Grava os resultados neste arquivo")
+    args = parser.parse_args()
+
+    from app.core.netpack import load_compiled_net
+
+    results = {}
+    print(f"{'map':<12} {'readNet (s)':>12} {'netpack (s)':>12} {'speedup':>8} {'readNet RSS':>12} {'netpack RSS':>12}")
+    for name in args.maps:
+        net_file = args.maps_dir / f"{name}.net.xml"
+        # Garante que o .netpack existe e está atualizado antes de medir
+        load_compiled_net(net_file)
+        sumo = run_one("readNet", net_file, args.repeat)
+        pack = run_one("netpack", net_file, args.repeat)
+        results[name] = {"readNet": sumo, "netpack": pack}
+        speedup = sumo["seconds"] / pack["seconds"] if pack["seconds"] else float("inf")
+        print(
+            f"{name:<12} {sumo['seconds']:>12.4f} {pack['seconds']:>12.4f} {speedup:>7.0f}x "
+            f"{sumo['rss_bytes'] / 2**20:>10.1f}MB {pack['rss_bytes'] / 2**20:>10.1f}MB"
+        )
+
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
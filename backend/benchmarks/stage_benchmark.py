@@ -0,0 +1,324 @@
+"""Mede cada estágio da geração de cenários (modo expert) nos mapas do repositório.
+
+Estágios: compilação da rede (.net.xml -> .netpack, a frio), abertura do
+.netpack já compilado, conversão geo -> X/Y, snapping (com a validação de O/D),
+roteamento das rotas fixas, tráfego de fundo, emissão do INI/NED e
+empacotamento do ZIP. Para cada mapa e escala (número de nós) roda num processo
+novo e informa o tempo da primeira execução (inclui índices e caches
+construídos sob demanda), p50/p95 das repetições seguintes e o pico de RSS do
+estágio. Não usa rede nem ferramentas externas além do sumolib.
+
+Os resultados podem ser gravados (--json) e comparados com uma execução
+anterior (--compare), por exemplo entre dois commits:
+
+    python -m benchmarks.stage_benchmark --maps-dir ../maps --json /tmp/antes.json
+    git checkout outro-commit
+    python -m benchmarks.stage_benchmark --maps-dir ../maps --compare /tmp/antes.json
+
+Uso (a partir de backend/):
+    python -m benchmarks.stage_benchmark --maps-dir ../maps --sizes 10 1000
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import platform
+import queue
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+DEFAULT_MAPS = ["rural", "urban_grid", "highway", "suburban", "industrial"]
+DEFAULT_SIZES = [10, 100, 1_000, 10_000]
+STAGES = ["net_compile", "net_load", "geo", "snapping", "routing", "random_traffic", "ini_ned", "zip"]
+# Proporção dos tipos de nó no cenário sintético
+NODE_MIX = ["car"] * 8 + ["drone", "rsu"]
+DURATION = 120
+# Tempo máximo de cada mapa/escala (segundos)
+DEFAULT_TIMEOUT = 1800
+
+
+def _status_bytes(field: str) -> int:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+def _reset_peak_rss():
+    # Zera o VmHWM (Linux >= 4.0); sem permissão, o pico fica sendo o do processo
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def _percentile(values, q: float) -> float:
+    values = sorted(values)
+    pos = (len(values) - 1) * q
+    low = int(pos)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (pos - low)
+
+
+def _time_stage(fn, repeat: int, setup=None) -> dict:
+    """`setup` roda antes de cada execução, fora da medição."""
+    _reset_peak_rss()
+    if setup is not None:
+        setup()
+    start = time.perf_counter()
+    fn()
+    first = time.perf_counter() - start
+    runs = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        runs.append(time.perf_counter() - start)
+    runs = runs or [first]
+    return {
+        "first_seconds": first,
+        "p50_seconds": _percentile(runs, 0.50),
+        "p95_seconds": _percentile(runs, 0.95),
+        "peak_rss_bytes": _status_bytes("VmHWM"),
+    }
+
+
+def _make_payload(net, map_name: str, size: int, seed: int = 42):
+    """Nós espalhados uniformemente pela área do mapa (carros com destino)."""
+    from app.models.expert_models import ExpertNode, ExpertSimulationPayload
+
+    rng = random.Random(seed)
+    xmin, ymin, xmax, ymax = net.get_boundary()
+    xs = [rng.uniform(xmin, xmax) for _ in range(2 * size)]
+    ys = [rng.uniform(ymin, ymax) for _ in range(2 * size)]
+    if net.has_geo_proj():
+        lons, lats = net.convert_xy_to_lonlat_batch(xs, ys)
+    else:
+        lons, lats = xs, ys
+    nodes = []
+    for i in range(size):
+        kind = rng.choice(NODE_MIX)
+        dest = {"dest_lat": float(lats[size + i]), "dest_lng": float(lons[size + i])} if kind == "car" else {}
+        nodes.append(ExpertNode(id=i, type=kind, lat=float(lats[i]), lng=float(lons[i]),
+                                params={"txPower": 23, "packetSize": 300}, **dest))
+    return ExpertSimulationPayload(simulation_name="bench", map_name=map_name, duration=DURATION,
+                                   seed=seed, num_random_vehicles=max(1, size // 10), nodes_list=nodes)
+
+
+def _measure(net_file: str, size: int, repeat: int, stages, results_queue):
+    try:
+        results_queue.put(_run_stages(net_file, size, repeat, stages))
+    except Exception as e:
+        results_queue.put({"error": f"{type(e).__name__}: {e}"})
+
+
+def _run_stages(net_file: str, size: int, repeat: int, stages) -> dict:
+    import logging
+
+    # Imports pesados antes da medição
+    import sumolib  # noqa: F401
+    from app.core.config import settings
+    from app.core.netpack import CompiledNet, load_compiled_net, netpack_path
+    from app.core.zip_stream import zip_to_buffer
+    from app.services.expert_simulation_service import ExpertSimulationService
+    from app.services.map_package import map_members
+    from app.services.od_check import check_od
+    from app.services.trip_generator import generate_random_trips
+
+    # Pontos sorteados longe das ruas geram um aviso cada
+    logging.disable(logging.WARNING)
+    net_file = Path(net_file)
+    settings.SUMO_MAPS_DIR = net_file.parent
+    load_compiled_net(net_file)
+
+    service = ExpertSimulationService()
+    service._load_net(net_file.name)
+    net = service.net
+    payload = _make_payload(net, net_file.name, size)
+    cars = [n for n in payload.nodes_list if n.type == "car"]
+    by_type = {kind: [n for n in payload.nodes_list if n.type == kind] for kind in ("drone", "tower", "rsu")}
+    num_random = payload.num_random_vehicles
+    lats = [c.lat for c in cars] + [c.dest_lat for c in cars]
+    lngs = [c.lng for c in cars] + [c.dest_lng for c in cars]
+    xs, ys = service._geo_to_xy_batch(lats, lngs)
+    n = len(cars)
+
+    def snapping():
+        edges = service._get_edge_ids(xs, ys)
+        names = [f"car {c.id}" for c in cars]
+        return check_od(net, edges[:n], edges[n:], (xs[:n], ys[:n]), (xs[n:], ys[n:]), names)
+
+    from_idx, to_idx = snapping()
+
+    def routing():
+        router = net.router()  # A primeira execução inclui a construção do roteador
+        router._memo.clear()
+        return router.routes(from_idx, to_idx)
+
+    def ini_ned():
+        total_cars = n + num_random
+        return (service._create_ned("bench", total_cars, by_type["drone"], by_type["tower"], by_type["rsu"]),
+                service._create_ini("bench", payload, cars, by_type["drone"], by_type["tower"], by_type["rsu"], num_random))
+
+    folder = "simulations/bench"
+
+    def package_members():
+        ned, ini = ini_ned()
+        return [
+            (f"{folder}/simulation.ned", ned),
+            (f"{folder}/omnetpp.ini", ini),
+            (f"{folder}/fixed.rou.xml", service._create_routes_xml(cars)),
+            (f"{folder}/random.rou.xml", generate_random_trips(net, DURATION, DURATION / num_random, payload.seed)),
+        ]
+
+    pack_file = netpack_path(net_file)
+    measured = {
+        "net_load": lambda: CompiledNet.open(pack_file).edge_ids,
+        "geo": lambda: service._geo_to_xy_batch(lats, lngs),
+        "snapping": snapping,
+        "routing": routing,
+        "random_traffic": lambda: generate_random_trips(net, DURATION, DURATION / num_random, payload.seed),
+        "ini_ned": ini_ned,
+    }
+    results = {}
+    for name in stages:
+        if name == "zip":
+            # Arquivos gerados fora da medição; a primeira execução inclui a cópia pré-comprimida do mapa
+            members = package_members()
+            results[name] = _time_stage(lambda: zip_to_buffer(members + map_members(folder, net_file.name)), repeat)
+        elif name == "net_compile":
+            # Sem o .netpack: parse do .net.xml, compilação e abertura
+            results[name] = _time_stage(lambda: load_compiled_net(net_file).num_edges, repeat,
+                                        setup=lambda: pack_file.unlink(missing_ok=True))
+        else:
+            results[name] = _time_stage(measured[name], repeat)
+    return {"edges": net.num_edges, "cars": n, "stages": results}
+
+
+def run_one(net_file: Path, size: int, repeat: int, stages, timeout: float = DEFAULT_TIMEOUT) -> dict:
+    """Mede um mapa/escala num processo novo; levanta RuntimeError se ele falhar ou passar de `timeout`."""
+    ctx = mp.get_context("spawn")
+    results_queue = ctx.Queue()
+    proc = ctx.Process(target=_measure, args=(str(net_file), size, repeat, list(stages), results_queue))
+    proc.start()
+    deadline = time.monotonic() + timeout
+    try:
+        while True:
+            try:
+                result = results_queue.get(timeout=1.0)
+                break
+            except queue.Empty:
+                if not proc.is_alive():
+                    raise RuntimeError(f"benchmark process exited with code {proc.exitcode}")
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"timed out after {timeout:.0f}s")
+    finally:
+        if proc.is_alive():
+            proc.join(timeout=5)
+        if proc.is_alive():
+            proc.terminate()
+            proc.join()
+    if "error" in result:
+        raise RuntimeError(result["error"])
+    return result
+
+
+def _metadata(repeat: int) -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "repeat": repeat,
+    }
+
+
+def compare(rows, baseline: dict, threshold: float) -> int:
+    """Imprime p50 atual x baseline por estágio; retorna quantos ficaram mais lentos que o limite."""
+    old = {(r["map"], r["nodes"], r["stage"]): r for r in baseline["results"]}
+    regressions = 0
+    print(f"\nbaseline: {baseline['meta'].get('commit')} ({baseline['meta'].get('created_at')})")
+    print(f"{'map':<12} {'nodes':>7} {'stage':<15} {'p50 before':>11} {'p50 now':>11} {'change':>8}")
+    for r in rows:
+        before = old.get((r["map"], r["nodes"], r["stage"]))
+        if before is None or not before["p50_seconds"]:
+            continue
+        ratio = r["p50_seconds"] / before["p50_seconds"]
+        slower = ratio > 1 + threshold
+        regressions += slower
+        print(
+            f"{r['map']:<12} {r['nodes']:>7} {r['stage']:<15} {before['p50_seconds'] * 1000:>9.2f}ms "
+            f"{r['p50_seconds'] * 1000:>9.2f}ms {(ratio - 1) * 100:>+7.0f}%{' !' if slower else ''}"
+        )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--maps-dir", type=Path, default=Path("../maps"))
+    parser.add_argument("--maps", nargs="*", default=DEFAULT_MAPS)
+    parser.add_argument("--sizes", nargs="*", type=int, default=DEFAULT_SIZES)
+    parser.add_argument("--stages", nargs="*", choices=STAGES, default=STAGES)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", type=Path, help="Grava os resultados neste arquivo")
+    parser.add_argument("--compare", type=Path, help="Compara com resultados gravados antes com --json")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="Aumento relativo do p50 considerado regressão (padrão 0.10)")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT,
+                        help=f"Tempo máximo por mapa/escala, em segundos (padrão {DEFAULT_TIMEOUT})")
+    args = parser.parse_args()
+
+    # Caches em disco descartáveis, para que uma execução não aqueça a próxima
+    scratch = tempfile.TemporaryDirectory(prefix="stage_benchmark_")
+    for var in ("DEFLATE_CACHE_DIR", "ROUTE_CACHE_DIR", "ARTIFACT_STORE_DIR", "NETPACK_DIR"):
+        os.environ[var] = str(Path(scratch.name) / var.lower())
+
+    rows = []
+    failures = 0
+    print(f"{'map':<12} {'nodes':>7} {'stage':<15} {'first':>10} {'p50':>10} {'p95':>10} {'peak RSS':>10}")
+    for name in args.maps:
+        net_file = args.maps_dir / f"{name}.net.xml"
+        for size in args.sizes:
+            try:
+                result = run_one(net_file, size, args.repeat, args.stages, args.timeout)
+            except RuntimeError as e:
+                failures += 1
+                print(f"{name:<12} {size:>7} failed: {e}")
+                continue
+            for stage in args.stages:
+                r = {"map": name, "nodes": size, "stage": stage, "edges": result["edges"], **result["stages"][stage]}
+                rows.append(r)
+                print(
+                    f"{name:<12} {size:>7} {stage:<15} {r['first_seconds'] * 1000:>8.2f}ms "
+                    f"{r['p50_seconds'] * 1000:>8.2f}ms {r['p95_seconds'] * 1000:>8.2f}ms "
+                    f"{r['peak_rss_bytes'] / 2**20:>8.1f}MB"
+                )
+    scratch.cleanup()
+
+    if args.json:
+        args.json.write_text(json.dumps({"meta": _metadata(args.repeat), "results": rows}, indent=2))
+    if args.compare:
+        regressions = compare(rows, json.loads(args.compare.read_text()), args.threshold)
+        if regressions:
+            print(f"\n{regressions} stage(s) slower than the baseline by more than {args.threshold:.0%}")
+            sys.exit(1)
+    if failures:
+        print(f"\n{failures} map/size run(s) failed")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
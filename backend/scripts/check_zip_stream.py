@@ -0,0 +1,83 @@
+"""Confere que os ZIPs de app.core.zip_stream são lidos pelo zipfile desta versão do Python.
+
+Gera pacotes com todos os métodos de compressão, membros em disco e
+pré-comprimidos (deflate cache), nomes não-ASCII e mais de 65535 membros
+(registros zip64), e compara o conteúdo extraído com o original via testzip().
+Sai com código 1 na primeira divergência.
+
+Uso (a partir de backend/):
+    python scripts/check_zip_stream.py
+"""
+import io
+import os
+import sys
+import tempfile
+import zipfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+METHODS = ["stored", "deflated", "deflated:1", "deflated:9", "bzip2", "bzip2:1", "lzma", "lzma:0", "lzma:9"]
+
+
+def _check(members, expected: dict, compression=None) -> str:
+    from app.core.zip_stream import iter_zip
+
+    data = b"".join(iter_zip(members, compression))
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        bad = zf.testzip()
+        if bad is not None:
+            return f"CRC mismatch in {bad}"
+        names = zf.namelist()
+        if names != list(expected):
+            return f"members {names[:5]}... != {list(expected)[:5]}..."
+        for name, content in expected.items():
+            if zf.read(name) != content:
+                return f"content of {name} differs"
+    return ""
+
+
+def main() -> int:
+    scratch = tempfile.TemporaryDirectory(prefix="check_zip_stream_")
+    os.environ["DEFLATE_CACHE_DIR"] = str(Path(scratch.name) / "deflate")
+    from app.core.config import settings
+    from app.core.deflate_cache import DeflateCache
+
+    source = Path(scratch.name) / "rede.net.xml"
+    source.write_bytes(os.urandom(50_000) + b"<net/>" * 100_000)
+    text = "cenário ünïcode\n" * 20_000
+    failures = []
+
+    for spec in METHODS:
+        settings.ZIP_COMPRESSION = {"*": spec}
+        cache = DeflateCache(Path(scratch.name) / "deflate" / spec.replace(":", "_"))
+        members = [
+            ("simulations/a/omnetpp.ini", text),
+            ("simulations/a/vazio.txt", b""),
+            ("simulations/a/ç/mapa.net.xml", source),
+            ("simulations/a/pre.net.xml", cache.member(source, "pre.net.xml")),
+            # Segunda leitura: vem do cache em disco
+            ("simulations/a/pre2.net.xml", cache.member(source, "pre2.net.xml")),
+        ]
+        expected = {name: source.read_bytes() if isinstance(c, Path) or name.endswith(".net.xml") else
+                    (c.encode() if isinstance(c, str) else c) for name, c in members}
+        error = _check(members, expected)
+        print(f"{spec:<12} {'ok' if not error else error}")
+        if error:
+            failures.append(spec)
+
+    # Mais membros do que cabe no registro de fim clássico
+    settings.ZIP_COMPRESSION = {"*": "stored"}
+    many = [(f"m/{i}.txt", str(i)) for i in range(70_000)]
+    error = _check(many, {name: c.encode() for name, c in many})
+    print(f"{'zip64 count':<12} {'ok' if not error else error}")
+    if error:
+        failures.append("zip64")
+
+    scratch.cleanup()
+    print(f"Python {sys.version.split()[0]}: {'FAILED ' + ', '.join(failures) if failures else 'all ok'}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,69 @@
+import React, { useEffect, useRef, useState } from 'react';
+import { GeoJSON, useMap, useMapEvents } from 'react-leaflet';
+import { createVectorTileLayer } from './vectorTileLayer';
+
+// Faixas de zoom dos níveis de simplificação (backend: app/core/geojson_cache.py, LEVELS)
+const levelForZoom = (zoom) => (zoom >= 17 ? 0 : zoom >= 15 ? 1 : zoom >= 13 ? 2 : 3);
+
+const fitToBounds = (map, [west, south, east, north]) => map.fitBounds([[south, west], [north, east]]);
+
+// --- REDE VIÁRIA: GeoJSON gerado pelo backend, no nível de detalhe do zoom atual ---
+function GeoJsonNetwork({ mapName, style }) {
+  const map = useMap();
+  const [level, setLevel] = useState(() => levelForZoom(map.getZoom()));
+  const [data, setData] = useState(null);
+  const fitted = useRef(null); // mapa já enquadrado (evita refazer o fitBounds a cada nível)
+
+  useMapEvents({ zoomend: () => setLevel(levelForZoom(map.getZoom())) });
+
+  useEffect(() => { setData(null); }, [mapName]); // Limpa o anterior
+
+  useEffect(() => {
+    if (!mapName) return;
+    let active = true;
+    fetch(`http://localhost:8000/api/maps/${mapName}/geojson?level=${level}`)
+      .then(res => res.ok ? res.json() : null)
+      .then(d => {
+        if (!active || !d) return;
+        setData(d);
+        if (fitted.current !== mapName && d.bbox) {
+          fitted.current = mapName;
+          fitToBounds(map, d.bbox);
+        }
+      });
+    return () => { active = false; };
+  }, [mapName, level, map]);
+
+  // key: o <GeoJSON> do react-leaflet não reage a troca de `data`
+  return data ? <GeoJSON key={`${data.properties.name}-${data.properties.level}`} data={data} style={style} /> : null;
+}
+
+// --- REDE VIÁRIA EM VECTOR TILES: payload constante, qualquer que seja o tamanho do mapa ---
+function TiledNetwork({ mapName, style }) {
+  const map = useMap();
+
+  useEffect(() => {
+    if (!mapName) return;
+    let layer = null;
+    let active = true;
+    fetch(`http://localhost:8000/api/maps/${mapName}/tiles.json`)
+      .then(res => res.ok ? res.json() : null)
+      .then(tj => {
+        if (!active || !tj) return;
+        if (tj.bounds) fitToBounds(map, tj.bounds);
+        layer = createVectorTileLayer(tj.tiles[0], style, { maxNativeZoom: tj.maxzoom }).addTo(map);
+      });
+    return () => {
+      active = false;
+      if (layer) map.removeLayer(layer);
+    };
+  }, [mapName, style, map]);
+
+  return null;
+}
+
+const NetworkLayer = React.memo(function NetworkLayer({ mapName, style, tiles = false }) {
+  return tiles ? <TiledNetwork mapName={mapName} style={style} /> : <GeoJsonNetwork mapName={mapName} style={style} />;
+});
+
+export default NetworkLayer;
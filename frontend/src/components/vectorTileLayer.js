@@ -0,0 +1,101 @@
+import L from 'leaflet';
+
+// --- LEITOR MÍNIMO DE MVT (só o que o backend emite: linhas da camada "roads") ---
+function readVarint(buf, pos) {
+  let result = 0, shift = 0, byte;
+  do {
+    byte = buf[pos.i++];
+    result += (byte & 0x7f) * 2 ** shift;
+    shift += 7;
+  } while (byte & 0x80);
+  return result;
+}
+
+// Percorre os campos de uma mensagem protobuf: fn(campo, tipo, pos, fim do campo)
+function eachField(buf, start, end, fn) {
+  const pos = { i: start };
+  while (pos.i < end) {
+    const key = readVarint(buf, pos);
+    const field = key >> 3, wire = key & 7;
+    if (wire === 0) { fn(field, wire, readVarint(buf, pos)); }
+    else if (wire === 1) { pos.i += 8; }
+    else if (wire === 2) { const len = readVarint(buf, pos); fn(field, wire, pos.i, pos.i + len); pos.i += len; }
+    else if (wire === 5) { pos.i += 4; }
+    else break;
+  }
+}
+
+function decodeGeometry(buf, start, end, scale) {
+  const pos = { i: start }, lines = [];
+  let x = 0, y = 0;
+  while (pos.i < end) {
+    const cmd = readVarint(buf, pos), id = cmd & 7, count = cmd >> 3;
+    for (let k = 0; k < count; k++) {
+      const dx = readVarint(buf, pos), dy = readVarint(buf, pos);
+      x += (dx >>> 1) ^ -(dx & 1);
+      y += (dy >>> 1) ^ -(dy & 1);
+      if (id === 1) lines.push([[x * scale, y * scale]]);
+      else lines[lines.length - 1].push([x * scale, y * scale]);
+    }
+  }
+  return lines;
+}
+
+// Linhas de todas as camadas, já na escala do tile em pixels
+function decodeLines(buf, tileSize) {
+  const lines = [];
+  eachField(buf, 0, buf.length, (field, wire, layerStart, layerEnd) => {
+    if (field !== 3 || wire !== 2) return;
+    let extent = 4096;
+    const geometries = [];
+    eachField(buf, layerStart, layerEnd, (f, w, a, b) => {
+      if (f === 5 && w === 0) extent = a;
+      if (f === 2 && w === 2) {
+        eachField(buf, a, b, (ff, ww, ga, gb) => { if (ff === 4 && ww === 2) geometries.push([ga, gb]); });
+      }
+    });
+    for (const [a, b] of geometries) lines.push(...decodeGeometry(buf, a, b, tileSize / extent));
+  });
+  return lines;
+}
+
+// --- CAMADA DE TILES VETORIAIS DESENHADA EM CANVAS ---
+const VectorTileLayer = L.GridLayer.extend({
+  initialize(url, style, options) {
+    this._url = url;
+    this._style = style;
+    L.GridLayer.prototype.initialize.call(this, options);
+  },
+
+  createTile(coords, done) {
+    const tile = L.DomUtil.create('canvas', 'leaflet-tile');
+    const size = this.getTileSize();
+    tile.width = size.x;
+    tile.height = size.y;
+    const url = L.Util.template(this._url, { z: coords.z, x: coords.x, y: coords.y });
+    fetch(url)
+      .then(res => res.ok ? res.arrayBuffer() : new ArrayBuffer(0))
+      .then(data => {
+        const ctx = tile.getContext('2d');
+        const { color = '#3388ff', weight = 2, opacity = 1 } = this._style || {};
+        ctx.strokeStyle = color;
+        ctx.lineWidth = weight;
+        ctx.globalAlpha = opacity;
+        ctx.lineCap = 'round';
+        ctx.lineJoin = 'round';
+        ctx.beginPath();
+        for (const line of decodeLines(new Uint8Array(data), size.x)) {
+          ctx.moveTo(line[0][0], line[0][1]);
+          for (let k = 1; k < line.length; k++) ctx.lineTo(line[k][0], line[k][1]);
+        }
+        ctx.stroke();
+        done(null, tile);
+      })
+      .catch(err => done(err, tile));
+    return tile;
+  },
+});
+
+export function createVectorTileLayer(url, style, options) {
+  return new VectorTileLayer(url, style, options);
+}
@@ -1,7 +1,8 @@
 import axios from 'axios';
 import L from 'leaflet';
-import React, { useEffect, useState } from 'react';
-import { Circle, GeoJSON, MapContainer, Marker, Polyline, Popup, TileLayer, useMapEvents } from 'react-leaflet';
+import { useEffect, useState } from 'react';
+import { Circle, MapContainer, Marker, Polyline, Popup, TileLayer, useMapEvents } from 'react-leaflet';
+import NetworkLayer from '../components/NetworkLayer';
 
 // --- UI HELPERS (ÍCONES) ---
 const createIcon = (emoji, color) => L.divIcon({
@@ -16,30 +17,9 @@ const rsuIcon = createIcon("🗼", "#0288D1");   // Azul forte
 const startIcon = createIcon("🚗", "#00FF00"); // Carro vermelho 
 const endIcon = createIcon("🏁", "#000000");   // Preto
 
-// --- PERFORMANCE: GEOJSON OTIMIZADO ---
-const MemoizedGeoJsonLayer = React.memo(function GeoJsonLayer({ mapName }) {
-  const [geoData, setGeoData] = useState(null);
-  const map = useMapEvents({});
-
-  useEffect(() => {
-    if (!mapName) { setGeoData(null); return; }
-    const geoJsonFile = mapName.replace('.net.xml', '.geojson');
-    setGeoData(null); // Limpa anterior
-
-    fetch(`/maps/${geoJsonFile}`)
-      .then(res => res.ok ? res.json() : null)
-      .then(data => {
-        if(data) {
-            setGeoData(data);
-            const bounds = L.geoJSON(data).getBounds();
-            if (bounds.isValid()) map.fitBounds(bounds);
-        }
-      });
-  }, [mapName, map]);
-
-  // COR ALTERADA: Azul escuro (#1e3a8a) para contrastar com o mapa claro
-  return geoData ? <GeoJSON data={geoData} style={{color:"#1e3a8a", weight:2, opacity: 0.6}} /> : null;
-});
+// --- REDE VIÁRIA ---
+// COR ALTERADA: Azul escuro (#1e3a8a) para contrastar com o mapa claro
+const NETWORK_STYLE = {color:"#1e3a8a", weight:2, opacity: 0.6};
 
 // --- HANDLER DE CLIQUES ---
 function MapClickHandler({ mode, activeType, onClick }) {
@@ -274,7 +254,7 @@ export default function AdvancedJammingPage() {
             {/* VOLTEI PARA O OPENSTREETMAP PADRÃO (CLARO) */}
             {showBg && <TileLayer url="https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png" attribution="&copy; OSM" />}
             
-            <MemoizedGeoJsonLayer mapName={formData.map_name} />
+            <NetworkLayer mapName={formData.map_name} style={NETWORK_STYLE} tiles />
             <MapClickHandler mode={mode} activeType={activeJammerType} onClick={handleMapClick} />
             
             {route.start && route.end && <Polyline positions={[route.start, route.end]} pathOptions={{color: '#2E7D32', weight: 4, dashArray:'10,10', opacity:0.8}} />}
@@ -1,7 +1,8 @@
 import axios from 'axios';
 import L from 'leaflet';
 import React, { useEffect, useState } from 'react';
-import { Circle, GeoJSON, MapContainer, Marker, Polyline, TileLayer, useMapEvents } from 'react-leaflet';
+import { Circle, MapContainer, Marker, Polyline, TileLayer, useMapEvents } from 'react-leaflet';
+import NetworkLayer from '../components/NetworkLayer';
 
 // --- ICONS ---
 const createIcon = (emoji, color) => L.divIcon({
@@ -111,25 +112,9 @@ const ConfigModal = ({ node, onClose, onSave }) => {
   );
 };
 
-// --- MAP LAYER OTIMIZADO (React.memo) ---
-const MemoizedGeoJson = React.memo(({ mapName }) => {
-  const [data, setData] = useState(null);
-  const map = useMapEvents({});
-  useEffect(() => {
-    if(!mapName) { setData(null); return; }
-    fetch(`/maps/${mapName.replace('.net.xml','.geojson')}`)
-        .then(r=>r.ok?r.json():null)
-        .then(d=>{ 
-            if(d){ 
-                setData(d); 
-                map.fitBounds(L.geoJSON(d).getBounds()); 
-            }
-        });
-  }, [mapName, map]);
-  
-  // Cor Azul Escura para contraste no modo claro
-  return data ? <GeoJSON data={data} style={{color:"#1e3a8a", weight:2, opacity:0.5}} /> : null;
-});
+// --- MAP LAYER ---
+// Cor Azul Escura para contraste no modo claro
+const NETWORK_STYLE = {color:"#1e3a8a", weight:2, opacity:0.5};
 
 function MapClickHandler({ activeTool, onClick }) {
   useMapEvents({ click(e) { onClick(activeTool, e.latlng); } });
@@ -335,7 +320,7 @@ export default function ExpertJammingPage() {
             {showBg && <TileLayer url="https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png" attribution="&copy; OSM"/>}
             
             {/* Mapa Renderizado Otimizado */}
-            <MemoizedGeoJson mapName={global.map_name} />
+            <NetworkLayer mapName={global.map_name} style={NETWORK_STYLE} tiles />
             
             <MapClickHandler activeTool={activeTool} onClick={handleMapClick} />
             
@@ -1,22 +1,11 @@
 import axios from 'axios';
-import L from 'leaflet';
-import React, { useEffect, useState } from 'react';
-import { GeoJSON, MapContainer, TileLayer, useMapEvents } from 'react-leaflet';
+import { useEffect, useState } from 'react';
+import { MapContainer, TileLayer } from 'react-leaflet';
+import NetworkLayer from '../components/NetworkLayer';
 
 // --- MAPA SOMENTE LEITURA (Visualização Otimizada Dark) ---
-const MemoizedGeoJsonLayer = React.memo(({ mapName }) => {
-  const [data, setData] = useState(null);
-  const map = useMapEvents({});
-  useEffect(() => {
-    if(!mapName) { setData(null); return; }
-    fetch(`/maps/${mapName.replace('.net.xml','.geojson')}`).then(r=>r.ok?r.json():null).then(d=>{ 
-        if(d){ setData(d); map.fitBounds(L.geoJSON(d).getBounds()); }
-    });
-  }, [mapName, map]);
-  
-  // COR NEON PARA CONTRASTE NO DARK MODE
-  return data ? <GeoJSON data={data} style={{color:"#22d3ee", weight:1.5, opacity:0.7}} /> : null;
-});
+// COR NEON PARA CONTRASTE NO DARK MODE
+const NETWORK_STYLE = {color:"#22d3ee", weight:1.5, opacity:0.7};
 
 export default function SimpleJammingPage() {
   const [maps, setMaps] = useState([]);
@@ -186,7 +175,7 @@ export default function SimpleJammingPage() {
           <MapContainer center={[-15.79, -47.88]} zoom={13} style={{height:'100%', width:'100%', background:'#050505'}} zoomControl={false}>
               {/* CARTODB DARK MATTER TILES */}
               <TileLayer url="https://{s}.basemaps.cartocdn.com/dark_all/{z}/{x}/{y}{r}.png" attribution="&copy; CartoDB" />
-              <MemoizedGeoJsonLayer mapName={config.map_name} />
+              <NetworkLayer mapName={config.map_name} style={NETWORK_STYLE} />
           </MapContainer>
       </div>
       